@@ -3,9 +3,12 @@ from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.conditions import MaxMessageTermination, TextMentionTermination
 from autogen_agentchat.teams import SelectorGroupChat
 
+from agents.context import CompactingChatCompletionContext
+from agents.selector import create_rule_based_selector
 from agents.tools.bing_search import bing_search_tool
 from agents.tools.fetch_webpage import fetch_webpage_tool
-from agents.tools.url_accessiable import url_accessible_valid_tool
+from agents.tools.read_uploaded_pages import read_uploaded_pages_tool
+from agents.tools.url_accessiable import url_batch_validator_tool
 from config import (
     get_advance_model_client,
     get_low_model_client,
@@ -21,6 +24,9 @@ low_model_client = get_low_model_client()
 MAX_MESSAGES  = 50
 max_messages_termination = MaxMessageTermination(max_messages=MAX_MESSAGES)
 
+# History size (tokens) above which old tool results and superseded drafts are elided
+CONTEXT_TOKEN_THRESHOLD = 12000
+
 
 PROMPT_RESERACH = """
 You are a personalized teaching assistant responsible for creating customized teaching content based on specific students' learning records.
@@ -28,8 +34,9 @@ You are a personalized teaching assistant responsible for creating customized te
 Your primary tasks are to analyze the student's learning records and create a personalized teaching plan:
 1. Carefully analyze the student's performance records in the courseware to identify their knowledge gaps and misunderstood concepts.
 2. Pay attention to topics and areas the student shows interest in.
+   If an uploaded document only includes its first pages, start the analysis with them and read the remaining pages with the ReadUploadedPagesTool when they are needed.
 3. Use the bing_search tool to find relevant materials. If more complete content from a webpage is needed, use the fetch_webpage tool to retrieve the full content to supplement the student's knowledge gaps.
-4. Use the bing_search tool to find relevant images and videos to enhance the learning experience. Set `response_filter` to `images` for images and `videos` for videos. Validate the URLs to ensure they are correct, accessible, and point to actual content (not empty or placeholder URLs like https://example.com) before embedding them.
+4. Use the bing_search tool to find relevant images and videos to enhance the learning experience. Set `response_filter` to `images` for images and `videos` for videos. The image and video results of bing_search are already verified to be accessible and are never repeated within the run, so embed them directly; any other media URL must still be checked with the url_batch_validator_tool before embedding it.
 5. IMPORTANT RESTRICTION: You MUST ONLY use image and video URLs that are directly returned from the bing_search tool. Never generate image/video URLs yourself. If you cannot find appropriate multimedia through bing_search, simply note that suitable media was not found rather than creating placeholder URLs. No image or video is better than a placeholder.
 6. Create interactive teaching content with the following structure:
    - Key learning objectives
@@ -38,7 +45,7 @@ Your primary tasks are to analyze the student's learning records and create a pe
    - Video resources (embedded using markdown syntax: [video description](video_url))
    - Interactive elements (discussions, group activities, hands-on exercises)
    - Learning assessments (quizzes, questions, problem sets)
-7. Use the url_accessible_valid_tool to verify that the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
+7. Use the url_batch_validator_tool once, passing the whole markdown content, to verify that all the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
 8. Ensure all the the content of the images and videos are in Simplified Chinese and relevant to the content. Don't include any English or Japanese content in the images and videos.
 
 
@@ -65,7 +72,7 @@ Your tasks are:
 7. Ensure all embedded images use the correct markdown syntax: ![description](image_url), and the URLs are accessible and unique, not duplicated in the content.
 8. Ensure all embedded videos use the correct markdown syntax: [video description](video_url), and the URLs are accessible and unique, not duplicated in the content.
 9. Ensure all the the content of the images and videos are in Simplified Chinese and relevant to the content. Don't include any English or Japanese content in the images and videos.
-10. Use the url_accessible_valid_tool to verify that the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
+10. Use the url_batch_validator_tool once, passing the whole markdown content, to verify that all the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
 
 Your response should include:
 - Targeted assessment (whether the content directly addresses the student's knowledge gaps)
@@ -92,7 +99,7 @@ Please create a well-structured lesson plan tailored to the student's learning s
    - Use the format: [video description](video_url) for videos
    - Ensure all images and videos are directly viewable in markdown
    - Ensure all the the content of the images and videos are in Simplified Chinese and relevant to the content. Don't include any English or Japanese content in the images and videos.
-   - Use the url_accessible_valid_tool to verify that the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
+   - Use the url_batch_validator_tool once, passing the whole markdown content, to verify that all the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
 3. Part 2: Interest point expansion
    - Expanded knowledge content related to topics or questions the student showed interest in during learning
    - Relevant examples or applications of these interest points and questions
@@ -101,8 +108,8 @@ Please create a well-structured lesson plan tailored to the student's learning s
    - Use the format: [video description](video_url) for videos
    - Ensure all images and videos are directly viewable in markdown
    - Ensure all the the content of the images and videos are in Simplified Chinese and relevant to the content. Don't include any English or Japanese content in the images and videos.
-   - Use the url_accessible_valid_tool to verify that the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
-   - Use the url_accessible_valid_tool to verify that the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
+   - Use the url_batch_validator_tool once, passing the whole markdown content, to verify that all the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
+   - Use the url_batch_validator_tool once, passing the whole markdown content, to verify that all the embedded image and video URLs are accessible and ensure they are unique and not duplicated in the content.
 4. Interactive session design (interspersed in both parts)
    - 3-5 short-answer questions to validate whether the interest points are understood in depth
    - Expected answers and evaluation criteria for each question
@@ -204,15 +211,17 @@ def create_catch_up_team()->SelectorGroupChat:
         description="Analyze student learning records and create targeted teaching content and interactive sessions.",
         model_client=advance_model_client,
         model_client_stream=True,
+        model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
         system_message=PROMPT_RESERACH,
-        tools=[fetch_webpage_tool, bing_search_tool, url_accessible_valid_tool])
+        tools=[fetch_webpage_tool, bing_search_tool, url_batch_validator_tool, read_uploaded_pages_tool])
 
     verifier = AssistantAgent(
         "content_reviewer",
         description="Review the targetedness, completeness, and time arrangement of personalized teaching content.",
         model_client=advance_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
+        model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
+        tools=[url_batch_validator_tool],
         system_message=PROMPT_VERIFIER)
 
     summary_agent = AssistantAgent(
@@ -220,7 +229,8 @@ def create_catch_up_team()->SelectorGroupChat:
         description="Integrate all teaching content into a complete 40-minute lesson plan.",
         model_client=moderate_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
+        model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
+        tools=[url_batch_validator_tool],
         system_message=PROMPT_SUMMARY)
     
     markdown_content_formator = AssistantAgent(
@@ -228,6 +238,7 @@ def create_catch_up_team()->SelectorGroupChat:
         description="An agent that formats markdown content by removing query parameters from image and video URLs.",
         model_client=low_model_client,
         model_client_stream=True,
+        model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
         system_message=PROMPT_MARKDOWN_CONTENT_FORMAT)
     
     return SelectorGroupChat(
@@ -235,4 +246,12 @@ def create_catch_up_team()->SelectorGroupChat:
         termination_condition=termination,
         model_client=moderate_model_client,
         selector_prompt=PROMPT_SELECTOR,
+        # Deterministic workflow steps skip the LLM selector, ambiguous ones fall back to it
+        selector_func=create_rule_based_selector(
+            creator=research_assistant.name,
+            reviewer=verifier.name,
+            compiler=summary_agent.name,
+            formatter=markdown_content_formator.name,
+        ),
+        model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
         allow_repeated_speaker=True)
@@ -0,0 +1,6 @@
+from agents.context.compacting_chat_completion_context import (
+    CompactingChatCompletionContext,
+)
+from agents.context.token_counter import count_text_tokens
+
+__all__ = ["CompactingChatCompletionContext", "count_text_tokens"]
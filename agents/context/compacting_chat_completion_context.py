@@ -0,0 +1,193 @@
+import logging
+from typing import Dict, List, Sequence, Set, Tuple
+
+from autogen_core import Component
+from autogen_core.model_context import ChatCompletionContext
+from autogen_core.models import (
+    AssistantMessage,
+    FunctionExecutionResultMessage,
+    LLMMessage,
+    SystemMessage,
+    UserMessage,
+)
+from pydantic import BaseModel
+from typing_extensions import Self
+
+from agents.context.token_counter import count_text_tokens
+
+logger = logging.getLogger("compacting_chat_completion_context")
+
+DEFAULT_TOKEN_THRESHOLD = 12000
+DEFAULT_KEEP_RECENT_MESSAGES = 6
+DEFAULT_EXCERPT_CHARS = 300
+DEFAULT_VERBATIM_KEYWORDS = ["APPROVED", "CONTINUE DEVELOPMENT"]
+
+
+class CompactingChatCompletionContextConfig(BaseModel):
+    token_threshold: int = DEFAULT_TOKEN_THRESHOLD
+    keep_recent_messages: int = DEFAULT_KEEP_RECENT_MESSAGES
+    excerpt_chars: int = DEFAULT_EXCERPT_CHARS
+    verbatim_keywords: List[str] = DEFAULT_VERBATIM_KEYWORDS
+    initial_messages: List[LLMMessage] | None = None
+
+
+class CompactingChatCompletionContext(ChatCompletionContext, Component[CompactingChatCompletionContextConfig]):
+    """A chat completion context that elides old tool results and superseded drafts.
+
+    While the history is below `token_threshold` tokens it is returned unchanged. Once
+    the threshold is crossed, every message that is not protected is cut down to a short
+    excerpt. Protected messages are kept verbatim:
+
+    - system messages and the messages from the user (the task),
+    - the latest non tool-output message of every source (the latest draft, the latest compilation...),
+    - messages containing one of `verbatim_keywords` (the reviewer verdicts),
+    - the last `keep_recent_messages` messages, so in-flight tool calls stay intact.
+
+    Token counts before and after compaction are logged and kept in `token_counts`
+    so prompt savings can be measured per turn.
+
+    Args:
+        token_threshold: Number of history tokens above which compaction starts
+        keep_recent_messages: Number of most recent messages that are never compacted
+        excerpt_chars: Number of characters kept from the start of a compacted message
+        verbatim_keywords: Keywords that mark a message to be always kept verbatim
+        initial_messages: The initial messages
+    """
+
+    component_config_schema = CompactingChatCompletionContextConfig
+    component_provider_override = "agents.context.CompactingChatCompletionContext"
+
+    def __init__(
+        self,
+        *,
+        token_threshold: int = DEFAULT_TOKEN_THRESHOLD,
+        keep_recent_messages: int = DEFAULT_KEEP_RECENT_MESSAGES,
+        excerpt_chars: int = DEFAULT_EXCERPT_CHARS,
+        verbatim_keywords: Sequence[str] = DEFAULT_VERBATIM_KEYWORDS,
+        initial_messages: List[LLMMessage] | None = None,
+    ) -> None:
+        super().__init__(initial_messages)
+        if token_threshold <= 0:
+            raise ValueError("token_threshold must be greater than 0.")
+        self._token_threshold = token_threshold
+        self._keep_recent_messages = keep_recent_messages
+        self._excerpt_chars = excerpt_chars
+        self._verbatim_keywords = list(verbatim_keywords)
+        # Token counts are cached per message object, history messages are immutable
+        self._token_cache: Dict[int, Tuple[LLMMessage, int]] = {}
+        self.token_counts: List[Tuple[int, int]] = []
+
+    def _text_of(self, message: LLMMessage) -> str:
+        if isinstance(message, FunctionExecutionResultMessage):
+            return "\n".join(result.content for result in message.content)
+        if isinstance(message.content, str):
+            return message.content
+        return "\n".join(str(part) for part in message.content)
+
+    def count_tokens(self, messages: Sequence[LLMMessage]) -> int:
+        """Count the tokens of the given messages."""
+        return sum(count_text_tokens(self._text_of(message)) for message in messages)
+
+    def _count_history_tokens(self, messages: List[LLMMessage]) -> int:
+        token_cache: Dict[int, Tuple[LLMMessage, int]] = {}
+        for message in messages:
+            cached = self._token_cache.get(id(message))
+            if cached is None or cached[0] is not message:
+                cached = (message, self.count_tokens([message]))
+            token_cache[id(message)] = cached
+        # Only the current history is cached, so cleared or reloaded messages are released
+        self._token_cache = token_cache
+        return sum(token_cache[id(message)][1] for message in messages)
+
+    def _protected_indexes(self, messages: List[LLMMessage]) -> Set[int]:
+        protected = set(range(max(0, len(messages) - self._keep_recent_messages), len(messages)))
+        latest_by_source: Dict[str, int] = {}
+        for index, message in enumerate(messages):
+            if isinstance(message, SystemMessage):
+                protected.add(index)
+                continue
+            if isinstance(message, (UserMessage, AssistantMessage)):
+                if message.source == "user":
+                    protected.add(index)
+                if isinstance(message.content, str):
+                    if not self._is_tool_output(message.content):
+                        latest_by_source[message.source] = index
+                    if any(keyword in message.content for keyword in self._verbatim_keywords):
+                        protected.add(index)
+                else:
+                    # Function calls are small and must stay paired with their results
+                    protected.add(index)
+        protected.update(latest_by_source.values())
+        return protected
+
+    @staticmethod
+    def _is_tool_output(text: str) -> bool:
+        # Tool call summaries relayed between agents carry the raw tool result repr
+        return text.lstrip().startswith(("[{", "{'", '{"', "[]"))
+
+    def _excerpt(self, text: str) -> str:
+        if len(text) <= self._excerpt_chars:
+            return text
+        elided = len(text) - self._excerpt_chars
+        return f"{text[:self._excerpt_chars]}\n...(elided {elided} characters of earlier content)"
+
+    def _compact(self, message: LLMMessage) -> LLMMessage:
+        if isinstance(message, FunctionExecutionResultMessage):
+            return message.model_copy(
+                update={
+                    "content": [
+                        result.model_copy(update={"content": self._excerpt(result.content)})
+                        for result in message.content
+                    ]
+                }
+            )
+        if isinstance(message.content, str):
+            return message.model_copy(update={"content": self._excerpt(message.content)})
+        return message
+
+    async def get_messages(self) -> List[LLMMessage]:
+        """Get the history, compacted if it exceeds the token threshold."""
+        messages = list(self._messages)
+        tokens_before = self._count_history_tokens(messages)
+        if tokens_before <= self._token_threshold:
+            self.token_counts.append((tokens_before, tokens_before))
+            return messages
+
+        protected = self._protected_indexes(messages)
+        compacted: List[LLMMessage] = []
+        tokens_after = 0
+        for index, message in enumerate(messages):
+            if index in protected:
+                compacted.append(message)
+                tokens_after += self._token_cache[id(message)][1]
+            else:
+                compacted_message = self._compact(message)
+                compacted.append(compacted_message)
+                tokens_after += self.count_tokens([compacted_message])
+        self.token_counts.append((tokens_before, tokens_after))
+        logger.info(f"Compacted context from {tokens_before} to {tokens_after} tokens ({len(messages)} messages)")
+        return compacted
+
+    async def clear(self) -> None:
+        await super().clear()
+        self._token_cache.clear()
+        self.token_counts = []
+
+    def _to_config(self) -> CompactingChatCompletionContextConfig:
+        return CompactingChatCompletionContextConfig(
+            token_threshold=self._token_threshold,
+            keep_recent_messages=self._keep_recent_messages,
+            excerpt_chars=self._excerpt_chars,
+            verbatim_keywords=self._verbatim_keywords,
+            initial_messages=self._initial_messages,
+        )
+
+    @classmethod
+    def _from_config(cls, config: CompactingChatCompletionContextConfig) -> Self:
+        return cls(
+            token_threshold=config.token_threshold,
+            keep_recent_messages=config.keep_recent_messages,
+            excerpt_chars=config.excerpt_chars,
+            verbatim_keywords=config.verbatim_keywords,
+            initial_messages=config.initial_messages,
+        )
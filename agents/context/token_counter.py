@@ -0,0 +1,41 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+logger = logging.getLogger("token_counter")
+
+TOKEN_ENCODING = "o200k_base"
+
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding() -> Optional[tiktoken.Encoding]:
+    """Load the tokenizer once; tiktoken downloads it on first use."""
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        logger.warning(f"Tokenizer {TOKEN_ENCODING} unavailable, estimating token counts: {str(e)}")
+        return None
+
+
+def count_text_tokens(text: str) -> int:
+    """Count the tokens of a text for the GPT-4o / GPT-4.1 family of deployments.
+
+    Falls back to an estimate (one token per CJK character, four characters per token
+    otherwise) when the tokenizer cannot be loaded, e.g. on a machine without network.
+
+    Args:
+        text: The text to count
+
+    Returns:
+        int: The number of tokens
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    return cjk_chars + (len(text) - cjk_chars + 3) // 4
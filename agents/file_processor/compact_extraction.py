@@ -0,0 +1,336 @@
+import os
+import re
+from collections import Counter
+from typing import Iterator, List, Optional, Tuple
+
+# "compact" extracts DOCX and PPTX uploads with the compact extractors, "markdown" with markitdown
+FILE_EXTRACTION_MODE = os.environ.get("FILE_EXTRACTION_MODE", "compact").lower()
+
+# Column headers that identify the student column of a score sheet
+_NAME_HEADERS = ("姓名", "学生", "名字", "name", "student")
+# Columns of identifiers, never summarized as scores
+_ID_HEADER_PATTERN = re.compile(r"学号|编号|序号|座号|^(id|no\.?|number)$", re.IGNORECASE)
+_NUMBER_PATTERN = re.compile(r"^-?\d+(\.\d+)?%?$")
+_HEADING_STYLE_PATTERN = re.compile(r"^(?:Heading|标题)\s*(\d)$", re.IGNORECASE)
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+# Separators of the items of a categorical cell, e.g. "多音字、古诗背诵"
+_ITEM_SEPARATOR_PATTERN = re.compile(r"[、,，;；/]")
+# Score sheets with more students are summarized instead of listed row by row
+SCORE_SHEET_MAX_ROWS = 10
+# Number of best and lowest students named in a summarized score sheet
+RANKED_STUDENTS = 3
+# Number of most frequent items listed per categorical column of a summarized score sheet
+TOP_ITEMS = 8
+
+
+def _clean(text: str) -> str:
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def _to_number(value: str) -> Optional[float]:
+    value = value.strip()
+    if not _NUMBER_PATTERN.match(value):
+        return None
+    return float(value.rstrip("%"))
+
+
+def _docx_table_rows(table) -> List[List[str]]:
+    # A merged cell is returned once per column it spans, so its value is repeated
+    # under every column and the values after it stay under their header
+    return [[cell.text for cell in row.cells] for row in table.rows]
+
+
+def _pptx_table_rows(table) -> List[List[str]]:
+    rows: List[List[str]] = []
+    for row in table.rows:
+        cells = []
+        for column, cell in enumerate(row.cells):
+            # The cells covered by a merged cell repeat its value, like in DOCX tables
+            if cell._tc.hMerge and cells:
+                cells.append(cells[-1])
+            elif cell._tc.vMerge and rows and column < len(rows[-1]):
+                cells.append(rows[-1][column])
+            else:
+                cells.append(cell.text)
+        rows.append(cells)
+    return rows
+
+
+def compact_table(rows: List[List[str]]) -> str:
+    """Render a table as normalized rows, and summarize it when it is a score sheet.
+
+    Markdown tables spend tokens on padding, separator rows and the outer pipes of every
+    row. Rows are written as `a | b | c` lines under a single header line instead, empty
+    rows are dropped and a column with the same value in every row is stated once. A
+    table with a student name column and numeric columns is a score sheet: it is
+    followed by the average, minimum and maximum of every score column, so the team
+    does not have to work them out from the rows. A score sheet of more than
+    `SCORE_SHEET_MAX_ROWS` students is summarized instead of listed: its other columns
+    are counted and the best and lowest students are named, unless a column holds
+    free text per student.
+
+    Args:
+        rows: The cell texts of the table, the first row being the header
+
+    Returns:
+        str: The compact table
+    """
+    rows = [[_clean(cell) for cell in row] for row in rows]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return ""
+    # Short rows are padded, so every value stays under its header
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    header, body = rows[0], rows[1:]
+
+    # A column with the same value in every row is stated once
+    constant = [
+        index
+        for index in range(len(header))
+        if len(body) >= 3
+        and all(len(row) == len(header) for row in body)
+        and body[0][index]
+        and all(row[index] == body[0][index] for row in body)
+    ]
+    if constant and len(constant) < len(header):
+        notes = [f"{header[index]}: {body[0][index]}" for index in constant]
+        header = [title for index, title in enumerate(header) if index not in constant]
+        body = [[cell for index, cell in enumerate(row) if index not in constant] for row in body]
+    else:
+        notes = []
+
+    lines = ["表格: " + " | ".join(header)]
+    lines.extend(" | ".join(row) for row in body)
+    if notes:
+        lines.append("每行相同: " + "; ".join(notes))
+
+    name_column = next(
+        (index for index, title in enumerate(header) if title.lower().startswith(_NAME_HEADERS)), None
+    )
+    if name_column is None or not body:
+        return "\n".join(lines)
+
+    summary, score_columns = [], []
+    for index, title in enumerate(header):
+        if index == name_column or _ID_HEADER_PATTERN.search(title):
+            continue
+        numbers = [_to_number(row[index]) for row in body if index < len(row)]
+        numbers = [number for number in numbers if number is not None]
+        # A score column has a number for most of the students
+        if numbers and len(numbers) >= len(body) / 2:
+            score_columns.append(index)
+            summary.append(f"{title} {sum(numbers) / len(numbers):.1f}/{min(numbers):g}/{max(numbers):g}")
+    if not summary:
+        return "\n".join(lines)
+
+    statistics = "统计 (平均/最低/最高): " + "; ".join(summary)
+    record = None
+    if len(body) > SCORE_SHEET_MAX_ROWS:
+        record = _summarize_score_sheet(header, body, name_column, score_columns)
+    if record is None:
+        lines[0] = f"成绩表 ({len(body)} 名学生): " + " | ".join(header)
+        lines.append(statistics)
+        return "\n".join(lines)
+    lines = [f"成绩表 ({len(body)} 名学生, 已汇总): " + " | ".join(header), statistics, *record]
+    if notes:
+        lines.append("每行相同: " + "; ".join(notes))
+    return "\n".join(lines)
+
+
+def _summarize_score_sheet(
+    header: List[str], body: List[List[str]], name_column: int, score_columns: List[int]
+) -> Optional[List[str]]:
+    """Summarize the rows of a large score sheet, None if it has free text that would be lost.
+
+    The best and lowest students of the total (or first) score column are named, and
+    the items of every other column (e.g. the knowledge points missed) are counted.
+    """
+    lines = []
+    for index, title in enumerate(header):
+        if index == name_column or index in score_columns or _ID_HEADER_PATTERN.search(title):
+            continue
+        items = Counter(
+            item.strip()
+            for row in body
+            if index < len(row)
+            for item in _ITEM_SEPARATOR_PATTERN.split(row[index])
+            if item.strip()
+        )
+        # Comments written per student can't be counted, the rows are kept then
+        if items and len(items) > len(body) / 2:
+            return None
+        if items:
+            counts = "; ".join(f"{item} {count}" for item, count in items.most_common(TOP_ITEMS))
+            lines.append(f"{title} (出现次数): {counts}")
+
+    rank_column = next((index for index in score_columns if "总" in header[index]), score_columns[0])
+    ranked = sorted(
+        (
+            (number, row[name_column])
+            for row in body
+            if max(rank_column, name_column) < len(row) and (number := _to_number(row[rank_column])) is not None
+        ),
+        reverse=True,
+    )
+    count = min(RANKED_STUDENTS, len(ranked) // 2)
+    if count:
+        best = ", ".join(f"{name} {number:g}" for number, name in ranked[:count])
+        lowest = ", ".join(f"{name} {number:g}" for number, name in ranked[-count:])
+        lines.append(f"{header[rank_column]} 最高: {best}")
+        lines.append(f"{header[rank_column]} 最低: {lowest}")
+    return lines
+
+
+def compact_docx(path: str) -> str:
+    """Extract a DOCX as compact markdown: headings, paragraphs and compact tables in document order.
+
+    Args:
+        path: Path of the DOCX file
+
+    Returns:
+        str: The compact content
+    """
+    import docx
+    from docx.table import Table
+
+    document = docx.Document(path)
+    blocks: List[str] = []
+    for item in document.iter_inner_content():
+        if isinstance(item, Table):
+            table = compact_table(_docx_table_rows(item))
+            if table:
+                blocks.append(table)
+            continue
+        text = _clean(item.text)
+        if not text:
+            continue
+        heading = _HEADING_STYLE_PATTERN.match(item.style.name if item.style is not None else "")
+        if heading:
+            blocks.append("#" * int(heading.group(1)) + " " + text)
+        elif item.style is not None and item.style.name == "Title":
+            blocks.append("# " + text)
+        elif item.style is not None and item.style.name.startswith("List"):
+            # Consecutive list items stay on consecutive lines
+            if blocks and blocks[-1].startswith("- "):
+                blocks[-1] += "\n- " + text
+            else:
+                blocks.append("- " + text)
+        else:
+            blocks.append(text)
+    return "\n\n".join(blocks)
+
+
+def _pptx_alt_text(shape) -> str:
+    # The description set in PowerPoint's "Alt Text" pane, e.g. on pictures
+    properties = getattr(getattr(shape._element, "_nvXxPr", None), "cNvPr", None)
+    return _clean(properties.get("descr", "")) if properties is not None else ""
+
+
+def _pptx_chart_lines(chart) -> List[str]:
+    lines = []
+    title = _clean(chart.chart_title.text_frame.text) if chart.has_title and chart.chart_title.has_text_frame else ""
+    lines.append(f"图表: {title}" if title else "图表:")
+    for plot in chart.plots:
+        categories = [_clean(str(category)) for category in plot.categories]
+        if categories:
+            lines.append("  类别: " + " | ".join(categories))
+        for series in plot.series:
+            values = " | ".join("" if value is None else f"{value:g}" for value in series.values)
+            lines.append(f"  {_clean(series.name or '')}: {values}")
+    return lines
+
+
+def _pptx_shape_lines(shape, number: int) -> Iterator[Tuple[str, bool]]:
+    """Yield the lines of a slide shape, with whether they belong to a free text box or picture."""
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+    from pptx.shapes.graphfrm import GraphicFrame
+
+    if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+        for child in shape.shapes:
+            yield from _pptx_shape_lines(child, number)
+        return
+    if shape.has_text_frame:
+        for paragraph in shape.text_frame.paragraphs:
+            text = _clean("".join(run.text for run in paragraph.runs))
+            if not text or (not shape.is_placeholder and text == str(number)):
+                continue
+            yield "  " * paragraph.level + "- " + text, not shape.is_placeholder
+        return
+    if getattr(shape, "has_table", False):
+        table = compact_table(_pptx_table_rows(shape.table))
+        if table:
+            yield table, False
+        return
+    if getattr(shape, "has_chart", False):
+        yield "\n".join(_pptx_chart_lines(shape.chart)), False
+        return
+    alt_text = _pptx_alt_text(shape)
+    if alt_text:
+        yield f"[{'图片' if shape.shape_type == MSO_SHAPE_TYPE.PICTURE else '图形'}: {alt_text}]", True
+    elif isinstance(shape, GraphicFrame):
+        # SmartArt and embedded objects are not read, say so instead of dropping them silently
+        yield f"[未提取的对象: {shape.name}]", False
+
+
+def compact_pptx(path: str) -> str:
+    """Extract a slide deck as an outline: one title line per slide with its indented points.
+
+    Slide number, date and footer placeholders are dropped. So is the text of the free
+    text boxes that is repeated on at least half of the slides (a school name or a
+    hand-made page number), while the body text of the slides is always kept. Group
+    shapes are read through, tables are compacted, charts are written as their
+    categories and series, pictures as their alt text and speaker notes on one line.
+    SmartArt and embedded objects are not read and are marked as such.
+
+    Args:
+        path: Path of the PPTX file
+
+    Returns:
+        str: The outline
+    """
+    from pptx import Presentation
+    from pptx.enum.shapes import PP_PLACEHOLDER
+
+    skipped_placeholders = (PP_PLACEHOLDER.SLIDE_NUMBER, PP_PLACEHOLDER.FOOTER, PP_PLACEHOLDER.DATE)
+    presentation = Presentation(path)
+
+    slides = []
+    for number, slide in enumerate(presentation.slides, start=1):
+        title_shape = slide.shapes.title
+        title = _clean(title_shape.text_frame.text) if title_shape is not None else ""
+        # (line, whether it belongs to a free text box)
+        lines: List[Tuple[str, bool]] = []
+        for shape in slide.shapes:
+            if shape.is_placeholder and shape.placeholder_format.type in skipped_placeholders:
+                continue
+            if title_shape is not None and shape.shape_id == title_shape.shape_id:
+                continue
+            lines.extend(_pptx_shape_lines(shape, number))
+        notes = ""
+        if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+            notes = _clean(slide.notes_slide.notes_text_frame.text)
+        slides.append((number, title, lines, notes))
+
+    # Text boxes repeated on at least half of the slides are layout, not content
+    counts = Counter(line for _, _, lines, _ in slides for line in {line for line, free in lines if free})
+    repeated = {line for line, count in counts.items() if len(slides) >= 4 and count >= len(slides) / 2}
+
+    outline = []
+    for number, title, lines, notes in slides:
+        kept = [line for line, free in lines if not (free and line in repeated)]
+        if not title and not kept and not notes:
+            continue
+        block = [f"## {number}. {title}" if title else f"## {number}."]
+        block.extend(kept)
+        if notes:
+            block.append(f"备注: {notes}")
+        outline.append("\n".join(block))
+    return "\n\n".join(outline)
+
+
+# Compact extractor of each supported extension
+COMPACT_EXTRACTORS = {
+    ".docx": compact_docx,
+    ".pptx": compact_pptx,
+}
@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, SystemMessage, UserMessage
+
+from agents.context.token_counter import count_text_tokens
+from agents.file_processor.conversion_cache import conversion_cache
+from agents.file_processor.pdf_ingestion import uploaded_documents
+from config import get_low_model_client
+
+logger = logging.getLogger("upload_condensation")
+
+# Condense uploads that do not fit the prompt budget before they enter the team conversation
+USE_UPLOAD_CONDENSATION = os.environ.get("USE_UPLOAD_CONDENSATION", "true").lower() == "true"
+
+DEFAULT_TOKEN_BUDGET = 6000
+DEFAULT_CHUNK_TOKENS = 3000
+DEFAULT_CONCURRENCY = 4
+# Smallest note requested for a chunk, however many chunks share the budget
+MIN_NOTE_TOKENS = 150
+# Bump when the prompts change, to drop the notes cached with the older prompts
+CONDENSATION_VERSION = "1"
+
+PROMPT_CONDENSE_CHUNK = """You condense part of a document uploaded by a Chinese elementary school teacher into notes for the teachers who will prepare a personalized lesson from it.
+Write structured notes in Simplified Chinese with only the sections that apply:
+- 学生信息: names, grade, scores, incorrect answers and the knowledge points they reveal, interests
+- 教学要求: objectives, standards, time constraints, required activities or assessments
+- 教学内容: key texts, poems, vocabulary and concepts, quoted exactly when short
+- 其他: anything else a teacher needs to prepare the lesson
+Keep names, numbers, scores and quoted texts exact. Leave out layout, repeated headers and filler.
+Use at most {max_tokens} tokens. Return only the notes.
+"""
+
+PROMPT_REDUCE_NOTES = """You merge notes taken from the consecutive parts of one document uploaded by a Chinese elementary school teacher.
+Merge them into one set of structured notes in Simplified Chinese with the same sections, removing duplicates and keeping names, numbers, scores and quoted texts exact.
+Use at most {max_tokens} tokens. Return only the notes.
+"""
+
+
+@dataclass
+class UploadedDocument:
+    """The converted content of one uploaded file."""
+
+    name: str
+    markdown: str
+    document_id: str
+
+
+def chunk_by_tokens(markdown: str, max_tokens: int) -> List[str]:
+    """Split a document into chunks of at most about `max_tokens` tokens, at paragraph boundaries.
+
+    Args:
+        markdown: The document
+        max_tokens: Maximum number of tokens of a chunk
+
+    Returns:
+        List[str]: The chunks in document order
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for paragraph in markdown.split("\n\n"):
+        tokens = count_text_tokens(paragraph)
+        if tokens > max_tokens:
+            # A single oversized paragraph (e.g. a large table) is cut by characters
+            pieces = max(2, -(-tokens // max_tokens))
+            size = -(-len(paragraph) // pieces)
+            parts = [paragraph[i:i + size] for i in range(0, len(paragraph), size)]
+        else:
+            parts = [paragraph]
+        for part in parts:
+            part_tokens = count_text_tokens(part)
+            if current and current_tokens + part_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a text to at most `max_tokens` tokens."""
+    tokens = count_text_tokens(text)
+    while tokens > max_tokens and text:
+        text = text[: int(len(text) * max_tokens / tokens * 0.95)]
+        tokens = count_text_tokens(text)
+    return text
+
+
+class UploadCondenser:
+    """
+    Map-reduce condensation of uploaded documents into a digest that fits a prompt budget.
+
+    The whole upload becomes the task of the catch-up team and is re-sent on every
+    turn and every selector call, so large uploads overflow the context window. Uploads
+    that fit `token_budget` are passed as they are. Larger ones are split into chunks of
+    about `chunk_tokens` tokens, and every chunk is condensed concurrently on the low
+    tier into structured requirement notes sized to its share of the budget (map).
+    When the notes of a document still exceed its share they are merged into one set
+    of notes (reduce). The digest points to the original of every document, which the
+    team can read page by page with the ReadUploadedPagesTool.
+
+    Notes are cached by chunk content, so re-uploads are condensed without model calls.
+    """
+
+    def __init__(
+        self,
+        model_client: ChatCompletionClient,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+        max_concurrency: int = DEFAULT_CONCURRENCY,
+    ):
+        self._model_client = model_client
+        self._token_budget = token_budget
+        self._chunk_tokens = chunk_tokens
+        self._max_concurrency = max_concurrency
+
+    async def _complete(
+        self,
+        system_message: str,
+        content: str,
+        max_tokens: int,
+        cancellation_token: Optional[CancellationToken],
+    ) -> str:
+        key = "condensed:" + hashlib.sha256(
+            f"{CONDENSATION_VERSION}\n{system_message}\n{content}".encode("utf-8")
+        ).hexdigest()
+        cached = await conversion_cache.get(key)
+        if cached is not None:
+            return cached
+        result = await self._model_client.create(
+            [SystemMessage(content=system_message), UserMessage(content=content, source="user")],
+            extra_create_args={"max_tokens": max_tokens},
+            cancellation_token=cancellation_token,
+        )
+        assert isinstance(result.content, str)
+        notes = result.content.strip()
+        await conversion_cache.put(key, "condensed notes", notes)
+        return notes
+
+    async def _condense_chunk(
+        self,
+        chunk: str,
+        max_tokens: int,
+        semaphore: asyncio.Semaphore,
+        cancellation_token: Optional[CancellationToken],
+    ) -> str:
+        async with semaphore:
+            try:
+                return await self._complete(
+                    PROMPT_CONDENSE_CHUNK.format(max_tokens=max_tokens), chunk, max_tokens, cancellation_token
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep the beginning of the chunk rather than losing it
+                logger.warning(f"Failed to condense a chunk, truncating it: {str(e)}")
+                return truncate_to_tokens(chunk, max_tokens)
+
+    async def _condense_document(
+        self,
+        document: UploadedDocument,
+        chunks: List[str],
+        note_tokens: int,
+        share: int,
+        semaphore: asyncio.Semaphore,
+        cancellation_token: Optional[CancellationToken],
+    ) -> str:
+        notes = await asyncio.gather(
+            *(self._condense_chunk(chunk, note_tokens, semaphore, cancellation_token) for chunk in chunks)
+        )
+        parts = [f"(Part {index}) {note}" for index, note in enumerate(notes, start=1)]
+        merged = "\n\n".join(parts)
+        if count_text_tokens(merged) > share and len(parts) > 1:
+            async with semaphore:
+                try:
+                    merged = await self._complete(
+                        PROMPT_REDUCE_NOTES.format(max_tokens=share), merged, share, cancellation_token
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Failed to merge the notes of {document.name}: {str(e)}")
+        return truncate_to_tokens(merged, share)
+
+    async def condense(
+        self,
+        documents: List[UploadedDocument],
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> str:
+        """
+        Build the content handed to the team from the uploaded documents.
+
+        Args:
+            documents: The converted uploads, in upload order
+            cancellation_token: Token cancelling the model calls
+
+        Returns:
+            str: The documents as they are if they fit the budget, their digest otherwise
+        """
+        sizes = [count_text_tokens(document.markdown) for document in documents]
+        if sum(sizes) <= self._token_budget:
+            return "".join(f"\n\n## Content from {document.name}\n\n{document.markdown}" for document in documents)
+
+        # Every document gets a share of the budget proportional to its size, with a floor
+        floor = min(MIN_NOTE_TOKENS * 2, self._token_budget // len(documents))
+        remaining = self._token_budget - floor * len(documents)
+        shares = [floor + remaining * size // sum(sizes) for size in sizes]
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        condensed = [size > share for size, share in zip(sizes, shares)]
+        tasks = []
+        for document, share, is_condensed in zip(documents, shares, condensed):
+            if not is_condensed:
+                tasks.append(asyncio.sleep(0, result=document.markdown))
+                continue
+            chunks = chunk_by_tokens(document.markdown, self._chunk_tokens)
+            if uploaded_documents.get(document.document_id) is None:
+                # Make the original readable part by part, one page per chunk
+                uploaded_documents.add_text(document.document_id, document.name, chunks)
+            note_tokens = max(MIN_NOTE_TOKENS, share // len(chunks))
+            tasks.append(
+                self._condense_document(document, chunks, note_tokens, share, semaphore, cancellation_token)
+            )
+        contents = await asyncio.gather(*tasks)
+
+        digest = []
+        for document, size, content, is_condensed in zip(documents, sizes, contents, condensed):
+            if not is_condensed:
+                digest.append(f"\n\n## Content from {document.name}\n\n{content}")
+                continue
+            uploaded = uploaded_documents.get(document.document_id)
+            pages = f"pages 1-{uploaded.page_count}" if uploaded is not None else "its pages"
+            digest.append(
+                f"\n\n## Digest of {document.name}\n\n"
+                f"(Condensed from {size} tokens. The original is available with the ReadUploadedPagesTool, "
+                f"document_id \"{document.document_id}\", {pages}; read it when exact details are needed.)\n\n"
+                f"{content}"
+            )
+        logger.info(f"Condensed {len(documents)} uploads from {sum(sizes)} to {sum(count_text_tokens(part) for part in digest)} tokens")
+        return "".join(digest)
+
+
+# Create a singleton instance of the upload condenser, running on the low tier
+upload_condenser = UploadCondenser(
+    model_client=get_low_model_client(),
+    token_budget=int(os.environ.get("UPLOAD_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+    chunk_tokens=int(os.environ.get("UPLOAD_CHUNK_TOKENS", DEFAULT_CHUNK_TOKENS)),
+    max_concurrency=int(os.environ.get("UPLOAD_CONDENSATION_CONCURRENCY", DEFAULT_CONCURRENCY)),
+)
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import importlib.metadata
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from agents.file_processor.compact_extraction import FILE_EXTRACTION_MODE
+
+logger = logging.getLogger("conversion_cache")
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "conversions")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+HASH_CHUNK_BYTES = 1024 * 1024
+# Bump when process_file changes the markdown it produces, to drop the older conversions
+CONVERSION_VERSION = "1"
+
+
+def converter_version() -> str:
+    """Return the version of the conversion, part of every cache key."""
+    try:
+        markitdown_version = importlib.metadata.version("markitdown")
+    except importlib.metadata.PackageNotFoundError:
+        markitdown_version = "unknown"
+    return f"{CONVERSION_VERSION}-markitdown{markitdown_version}-{FILE_EXTRACTION_MODE}"
+
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 of a file, read in chunks so large uploads are never held in memory.
+
+    Args:
+        path: Path of the file
+
+    Returns:
+        str: The hex digest of the content
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """
+    Disk-backed cache of the markdown converted from uploaded files.
+
+    Teachers upload the same syllabi, student records and textbooks again and again,
+    so conversions are stored in SQLite keyed by the SHA-256 of the file content, its
+    extension and the converter version. A re-upload, under any file name, is served
+    from the cache without converting it again, and upgrading markitdown or changing
+    the extraction mode invalidates the older conversions. When the cache grows over `max_bytes` the least recently
+    used conversions are evicted.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._version = converter_version()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(self._directory, exist_ok=True)
+            connection = sqlite3.connect(
+                os.path.join(self._directory, "conversions.sqlite3"), check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS conversions (
+                    key TEXT PRIMARY KEY,
+                    file_name TEXT NOT NULL,
+                    markdown TEXT NOT NULL,
+                    last_access REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )"""
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS conversions_last_access ON conversions (last_access)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def make_key(self, digest: str, file_extension: str) -> str:
+        """Return the cache key of a file content converted as `file_extension`."""
+        return f"{digest}:{file_extension.lower()}:{self._version}"
+
+    def _lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT markdown FROM conversions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE conversions SET last_access = ? WHERE key = ?", (time.time(), key))
+                connection.commit()
+        return row[0] if row else None
+
+    def _store(self, key: str, file_name: str, markdown: str) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO conversions VALUES (?, ?, ?, ?, ?)",
+                (key, file_name, markdown, time.time(), len(markdown.encode("utf-8"))),
+            )
+            self._evict(connection)
+            connection.commit()
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM conversions").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        evicted = 0
+        for key, size in connection.execute("SELECT key, size FROM conversions ORDER BY last_access").fetchall():
+            if total <= self._max_bytes:
+                break
+            connection.execute("DELETE FROM conversions WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} least recently used conversions from the conversion cache")
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached markdown of a key, or None if it has not been converted yet."""
+        try:
+            return await asyncio.to_thread(self._lookup, key)
+        except sqlite3.Error as e:
+            logger.warning(f"Conversion cache lookup failed: {str(e)}")
+            return None
+
+    async def put(self, key: str, file_name: str, markdown: str) -> None:
+        """Store the markdown converted from a file."""
+        try:
+            await asyncio.to_thread(self._store, key, file_name, markdown)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to cache the conversion of {file_name}: {str(e)}")
+
+
+# Create a singleton instance of the conversion cache
+conversion_cache = ConversionCache(
+    directory=os.environ.get("CONVERSION_CACHE_DIR", DEFAULT_CACHE_DIR),
+    max_bytes=int(os.environ.get("CONVERSION_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+)
@@ -0,0 +1,356 @@
+import asyncio
+import logging
+import os
+import threading
+import traceback
+import weakref
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Set, Tuple, TypeVar
+
+from agents.file_processor.compact_extraction import COMPACT_EXTRACTORS, FILE_EXTRACTION_MODE
+
+if TYPE_CHECKING:
+    from markitdown import MarkItDown
+
+logger = logging.getLogger("file_converter")
+
+T = TypeVar("T")
+
+DEFAULT_CONVERSION_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_CONVERSION_TIMEOUT = 120.0
+
+# The MarkItDown converter of each supported extension, registered when a file of that type is first seen
+CONVERTER_NAMES = {
+    ".docx": "DocxConverter",
+    ".doc": "DocxConverter",
+    ".pptx": "PptxConverter",
+    ".ppt": "PptxConverter",
+    ".pdf": "PdfConverter",
+}
+
+# MarkItDown instance of this process, created once and reused for every file
+_markitdown: Optional["MarkItDown"] = None
+_registered_converters: Set[str] = set()
+_markitdown_lock = threading.Lock()
+
+
+def get_markitdown(file_extension: Optional[str] = None) -> "MarkItDown":
+    """Return the MarkItDown instance of this process, ready to convert `file_extension`.
+
+    markitdown and its dependencies (pandas, magika, pdfminer...) take more than a
+    second to import, so they are only imported by the conversion workers, never by
+    the app itself. Each worker creates one instance and reuses it for every file,
+    instead of creating a MarkItDown per conversion. Importing markitdown imports all of
+    its built-in converters anyway; the instance only registers the converters of the
+    file types actually converted, so a file is only offered to its own converter.
+
+    Args:
+        file_extension: The extension of the file about to be converted, e.g. ".pdf"
+
+    Returns:
+        MarkItDown: The shared instance
+    """
+    global _markitdown
+    with _markitdown_lock:
+        if _markitdown is None:
+            from markitdown import MarkItDown
+
+            _markitdown = MarkItDown(enable_builtins=False)
+        converter_name = CONVERTER_NAMES.get(file_extension)
+        if converter_name and converter_name not in _registered_converters:
+            from markitdown import converters
+
+            _markitdown.register_converter(getattr(converters, converter_name)())
+            _registered_converters.add(converter_name)
+        return _markitdown
+
+
+class MarkdownResult:
+    """A conversion result that mimics the markitdown result structure."""
+
+    def __init__(self, content):
+        self.text_content = content
+        self.markdown = content
+
+
+def extract_compact(file_path, file_extension):
+    """Extract a DOCX or PPTX with its compact extractor, or return None to convert it with markitdown
+
+    Tables become normalized rows, score sheets a summarized record and slide decks an
+    outline, which takes far fewer tokens than the markdown of markitdown.
+    """
+    if FILE_EXTRACTION_MODE != "compact" or file_extension not in COMPACT_EXTRACTORS:
+        return None
+    try:
+        content = COMPACT_EXTRACTORS[file_extension](file_path)
+    except Exception as compact_err:
+        print(f"Compact extraction error, falling back to markitdown: {str(compact_err)}")
+        return None
+    if not content.strip():
+        # Nothing recognized, e.g. text in shapes the extractor does not read
+        return None
+    return MarkdownResult(content)
+
+
+def process_file(file_path, file_extension=None):
+    """Convert various file formats to markdown
+
+    The extension of `file_path` selects the converter unless `file_extension` is given,
+    e.g. for uploads stored under a generated name.
+    """
+    # Check if file exists and is readable
+    if not os.path.isfile(file_path):
+        return f"Error: File does not exist at path: {file_path}", None
+    
+    file_extension = (file_extension or Path(file_path).suffix).lower()
+
+    if file_extension in CONVERTER_NAMES:
+        from markitdown import StreamInfo
+
+        markitdown = get_markitdown(file_extension)
+        stream_info = StreamInfo(extension=file_extension)
+
+    try:
+        compact_result = extract_compact(file_path, file_extension)
+        if compact_result is not None:
+            result = compact_result
+        # Use markitdown to convert different formats to markdown
+        elif file_extension in ['.docx', '.doc']:
+            try:
+                result = markitdown.convert(file_path, stream_info=stream_info)
+                if result is None:
+                    return f"Failed to convert DOCX file: {file_path}. Empty result returned.", None
+            except Exception as docx_err:
+                print(f"DOCX conversion error: {str(docx_err)}")
+                print(traceback.format_exc())
+                return f"Error converting DOCX file: {str(docx_err)}", None
+        elif file_extension in ['.pptx', '.ppt']:
+            try:
+                result = markitdown.convert(file_path, stream_info=stream_info)
+                if result is None:
+                    return f"Failed to convert PPTX file: {file_path}. Empty result returned.", None
+            except Exception as pptx_err:
+                print(f"PPTX conversion error: {str(pptx_err)}")
+                print(traceback.format_exc())
+                return f"Error converting PPTX file: {str(pptx_err)}", None
+        elif file_extension == '.pdf':
+            try:
+                result = markitdown.convert(file_path, stream_info=stream_info)
+                if result is None:
+                    return f"Failed to convert PDF file: {file_path}. Empty result returned.", None
+            except Exception as pdf_err:
+                print(f"PDF conversion error: {str(pdf_err)}")
+                print(traceback.format_exc())
+                return f"Error converting PDF file: {str(pdf_err)}", None
+        elif file_extension in ['.md', '.markdown']:
+            # If already markdown, just read the file
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                # Create a simple object that mimics markitdown result structure
+                result = MarkdownResult(content)
+            except UnicodeDecodeError:
+                # Try with a different encoding if utf-8 fails
+                try:
+                    with open(file_path, 'r', encoding='latin-1') as f:
+                        content = f.read()
+                    result = MarkdownResult(content)
+                except Exception as encoding_err:
+                    return f"Error reading file with alternative encoding: {str(encoding_err)}", None
+        else:
+            return f"Unsupported file format: {file_extension}", None
+
+        return None, result
+    except Exception as e:
+        print(f"General file processing error: {str(e)}")
+        print(traceback.format_exc())
+        return f"Error processing file: {str(e)}", None
+
+
+def convert_file(
+    file_path: str,
+    file_extension: Optional[str] = None,
+) -> Tuple[Optional[str], Optional[str]]:
+    """Convert a file to markdown in a worker.
+
+    Wraps `process_file` so that only picklable values cross the process boundary.
+
+    Args:
+        file_path: Path of the file to convert
+        file_extension: The extension to convert the file as, that of `file_path` if None
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The error message, or None and the markdown
+    """
+    error, result = process_file(file_path, file_extension=file_extension)
+    if error:
+        return error, None
+    return None, result.markdown
+
+
+def _initialize_worker() -> None:
+    # Import markitdown and create the instance before the first file reaches the worker
+    get_markitdown()
+
+
+class FileConversionPool:
+    """
+    Worker pool that converts uploaded files to markdown off the event loop.
+
+    Converting a large DOCX, PPTX or PDF takes seconds to minutes of CPU time; run on
+    the event loop it would stall every streaming session of the process. Files are
+    converted in a pool of long-lived worker processes, so several files (and several
+    users' uploads) convert in parallel across cores.
+
+    Jobs wait for a free worker before they are submitted, so every job has its own
+    timeout counted from the moment it starts, never from the time spent queued. A
+    worker stuck on a file is killed with the rest of the pool, which is started again
+    for the next files; the other jobs that were running on it are run again on the new
+    pool. The pool falls back to threads where worker processes cannot be started.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_CONVERSION_WORKERS, timeout: float = DEFAULT_CONVERSION_TIMEOUT):
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._executor: Optional[Executor] = None
+        # The jobs starting the workers of the current pool
+        self._startup: List[Future] = []
+        # One slot per worker, created on the event loop that uses the pool
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Pools killed because one of their jobs timed out
+        self._killed: "weakref.WeakSet[Executor]" = weakref.WeakSet()
+
+    @property
+    def max_workers(self) -> int:
+        """Return the number of jobs that run at the same time."""
+        return self._max_workers
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots, self._slots_loop = asyncio.Semaphore(self._max_workers), loop
+        return self._slots
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers, initializer=_initialize_worker)
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"Process pool unavailable, converting files in threads: {str(e)}")
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+            # Start all the workers now, so the first jobs do not pay for their start
+            self._startup = [self._executor.submit(_initialize_worker) for _ in range(self._max_workers)]
+        return self._executor
+
+    async def _ready_executor(self) -> Executor:
+        # Starting the workers (loading MarkItDown) does not count against the timeout of a job
+        while True:
+            executor, startup = self._get_executor(), self._startup
+            await asyncio.wait([asyncio.wrap_future(future) for future in startup])
+            if executor is self._executor:
+                return executor
+
+    async def convert(
+        self,
+        file_path: str,
+        file_extension: Optional[str] = None,
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Convert a file to markdown in the worker pool.
+
+        Args:
+            file_path: Path of the file to convert
+            file_extension: The extension to convert the file as, that of `file_path` if None
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: The error message, or None and the markdown
+
+        Raises:
+            asyncio.TimeoutError: If the conversion did not finish within the timeout
+        """
+        try:
+            return await self.run(convert_file, file_path, file_extension)
+        except BrokenProcessPool:
+            return "Error converting file: the conversion worker stopped unexpectedly", None
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Run a picklable function in the worker pool, e.g. one extraction step of a document.
+
+        The function is submitted once a worker is free, and the timeout starts then.
+
+        Args:
+            fn: A module-level function
+            *args: The arguments of the function
+
+        Returns:
+            The result of the function
+
+        Raises:
+            asyncio.TimeoutError: If the function did not finish within the timeout, its
+                worker is killed and the pool is restarted for the next tasks
+            BrokenProcessPool: If the worker died, the pool is restarted for the next tasks
+        """
+        loop = asyncio.get_running_loop()
+        async with self._get_slots():
+            for attempt in range(2):
+                executor = await self._ready_executor()
+                future = loop.run_in_executor(executor, fn, *args)
+                try:
+                    return await asyncio.wait_for(future, timeout=self._timeout)
+                except asyncio.TimeoutError:
+                    # The worker keeps running the function after the timeout. As the busy
+                    # worker can't be told apart, the whole pool is killed
+                    logger.warning(
+                        f"File conversion timed out after {self._timeout} seconds, restarting the worker pool"
+                    )
+                    self._recycle(executor, kill=True)
+                    raise
+                except (BrokenProcessPool, asyncio.CancelledError) as e:
+                    if isinstance(e, asyncio.CancelledError) and asyncio.current_task().cancelling():
+                        # The caller itself was cancelled
+                        raise
+                    if executor not in self._killed:
+                        # A worker died (e.g. killed for memory), start a new pool for the next files
+                        logger.warning("File conversion worker pool broke, restarting it")
+                        self._recycle(executor)
+                    elif attempt == 0:
+                        # Killed because another job on the pool timed out, run this one again
+                        continue
+                    raise BrokenProcessPool("The conversion worker stopped unexpectedly") from e
+
+    def prewarm(self) -> None:
+        """Start all the workers in the background, so the first uploads do not pay for their start."""
+        self._get_executor()
+
+    def _recycle(self, executor: Executor, kill: bool = False) -> None:
+        """Stop a pool, and start a new one for the next jobs only if it is still the current pool."""
+        if self._executor is executor:
+            self._executor = None
+        if kill:
+            self._killed.add(executor)
+        # The processes are gone from the executor once it is shut down
+        processes = list((getattr(executor, "_processes", None) or {}).values()) if kill else []
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.kill()
+
+    def shutdown(self, kill: bool = False) -> None:
+        """Stop the worker pool, it is started again on the next conversion.
+
+        Args:
+            kill: Also kill the worker processes instead of letting them finish their
+                current task, threads can't be killed and are left to finish
+        """
+        if self._executor is not None:
+            self._recycle(self._executor, kill=kill)
+
+
+# Create a singleton instance of the file conversion pool
+file_conversion_pool = FileConversionPool(
+    max_workers=int(os.environ.get("FILE_CONVERSION_WORKERS", DEFAULT_CONVERSION_WORKERS)),
+    timeout=float(os.environ.get("FILE_CONVERSION_TIMEOUT", DEFAULT_CONVERSION_TIMEOUT)),
+)
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+from agents.file_processor.converter import file_conversion_pool
+
+logger = logging.getLogger("pdf_ingestion")
+
+# Extract large PDFs page-parallel with PyMuPDF instead of converting them whole with markitdown
+USE_PAGE_PARALLEL_PDF = os.environ.get("USE_PAGE_PARALLEL_PDF", "true").lower() == "true"
+
+DEFAULT_PAGES_PER_TASK = 4
+DEFAULT_MAX_DOCUMENTS = 32
+# Number of first pages handed to the team before the rest of the document is extracted
+PDF_HANDOFF_PAGES = int(os.environ.get("PDF_HANDOFF_PAGES", 5))
+
+
+def count_pdf_pages(path: str) -> int:
+    """Return the number of pages of a PDF."""
+    import pymupdf
+
+    with pymupdf.open(path, filetype="pdf") as document:
+        return document.page_count
+
+
+def extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    """Extract pages `start` to `end` (0-based, end excluded) of a PDF as markdown.
+
+    Runs in the conversion workers, which extract different page ranges of the same
+    document in parallel. Text blocks are kept in reading order, one paragraph each.
+
+    Args:
+        path: Path of the PDF
+        start: Index of the first page
+        end: Index after the last page
+
+    Returns:
+        List[str]: The markdown of every page
+    """
+    import pymupdf
+
+    pages = []
+    with pymupdf.open(path, filetype="pdf") as document:
+        for index in range(start, end):
+            blocks = document[index].get_text("blocks", sort=True)
+            # Block type 0 is text, 1 is an image
+            paragraphs = [block[4].strip() for block in blocks if block[6] == 0 and block[4].strip()]
+            pages.append(f"### Page {index + 1}\n\n" + "\n\n".join(paragraphs))
+    return pages
+
+
+class IngestedDocument:
+    """A PDF whose pages are extracted in the background and can be read as soon as they are ready."""
+
+    def __init__(self, document_id: str, name: str, page_count: int):
+        self.document_id = document_id
+        self.name = name
+        self.page_count = page_count
+        self.pages: List[Optional[str]] = [None] * page_count
+        self.failed = False
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+        self._condition = asyncio.Condition()
+
+    @property
+    def extracted_count(self) -> int:
+        return sum(page is not None for page in self.pages)
+
+    async def _set_pages(self, start: int, pages: List[str]) -> None:
+        async with self._condition:
+            self.pages[start:start + len(pages)] = pages
+            self._condition.notify_all()
+
+    async def read_pages(self, start_page: int, end_page: int) -> str:
+        """
+        Return the markdown of a page range, waiting until its pages are extracted.
+
+        Args:
+            start_page: The first page, starting at 1
+            end_page: The last page, included
+
+        Returns:
+            str: The markdown of the pages
+        """
+        start = max(0, start_page - 1)
+        end = min(self.page_count, end_page)
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: self.done or all(page is not None for page in self.pages[start:end])
+            )
+        return "\n\n".join(
+            page if page is not None else f"### Page {index + 1}\n\n(This page could not be extracted.)"
+            for index, page in enumerate(self.pages[start:end], start=start)
+        )
+
+    def markdown(self) -> str:
+        """Return the markdown of all the pages extracted so far."""
+        return "\n\n".join(page for page in self.pages if page is not None)
+
+
+class UploadedDocumentStore:
+    """
+    Page-parallel ingestion of uploaded PDFs.
+
+    markitdown converts a PDF as a whole, so nothing of a large textbook reaches the
+    team before all of it has been converted. Here the pages are split into ranges
+    that the conversion workers extract in parallel with PyMuPDF, in page order, and
+    the first pages can be handed to the team while the later ones are still being
+    extracted. The team reads the remaining pages on demand with the
+    read_uploaded_pages tool, which waits for them if needed.
+
+    The most recent `max_documents` documents are kept in memory, by document ID.
+    """
+
+    def __init__(self, pages_per_task: int = DEFAULT_PAGES_PER_TASK, max_documents: int = DEFAULT_MAX_DOCUMENTS):
+        self._pages_per_task = pages_per_task
+        self._max_documents = max_documents
+        self._documents: "OrderedDict[str, IngestedDocument]" = OrderedDict()
+
+    def get(self, document_id: str) -> Optional[IngestedDocument]:
+        """Return an ingested document by ID, or None if it is unknown or was evicted."""
+        return self._documents.get(document_id)
+
+    def add_text(self, document_id: str, name: str, pages: List[str]) -> IngestedDocument:
+        """
+        Add an already converted document, split into pages, so it can be read page by page too.
+
+        Args:
+            document_id: ID of the document, e.g. derived from its content hash
+            name: The uploaded file name
+            pages: The markdown of every page
+
+        Returns:
+            IngestedDocument: The document
+        """
+        document = IngestedDocument(document_id, name, len(pages))
+        document.pages = [f"### Page {index}\n\n{page}" for index, page in enumerate(pages, start=1)]
+        document.done = True
+        self._documents[document_id] = document
+        while len(self._documents) > self._max_documents:
+            self._documents.popitem(last=False)
+        return document
+
+    async def _extract(
+        self,
+        document: IngestedDocument,
+        path: str,
+        on_complete: Optional[Callable[[IngestedDocument], Awaitable[None]]],
+    ) -> None:
+        # At most one range per worker in flight, so a long PDF does not fill the pool's queue
+        semaphore = asyncio.Semaphore(file_conversion_pool.max_workers)
+
+        async def extract_range(start: int) -> None:
+            end = min(start + self._pages_per_task, document.page_count)
+            try:
+                async with semaphore:
+                    pages = await file_conversion_pool.run(extract_pdf_pages, path, start, end)
+            except (Exception, asyncio.CancelledError) as e:
+                if isinstance(e, asyncio.CancelledError) and asyncio.current_task().cancelling():
+                    raise
+                logger.warning(f"Failed to extract pages {start + 1}-{end} of {document.name}: {e!r}")
+                document.failed = True
+                return
+            await document._set_pages(start, pages)
+
+        try:
+            # Submitted in page order, so the first pages are extracted first
+            await asyncio.gather(*(extract_range(start) for start in range(0, document.page_count, self._pages_per_task)))
+        finally:
+            async with document._condition:
+                # Pages that failed are not waited for any longer
+                document.done = True
+                document._condition.notify_all()
+        logger.info(f"Extracted {document.extracted_count} of {document.page_count} pages of {document.name}")
+        if on_complete is not None and not document.failed:
+            await on_complete(document)
+
+    async def ingest_pdf(
+        self,
+        path: str,
+        name: str,
+        document_id: str,
+        on_complete: Optional[Callable[[IngestedDocument], Awaitable[None]]] = None,
+    ) -> IngestedDocument:
+        """
+        Start extracting the pages of a PDF in the background.
+
+        Args:
+            path: Path of the PDF
+            name: The uploaded file name
+            document_id: ID of the document, e.g. derived from its content hash
+            on_complete: Coroutine function called once all the pages have been extracted
+
+        Returns:
+            IngestedDocument: The document, whose pages become readable as they are extracted
+
+        Raises:
+            Exception: If the PDF cannot be opened, or PyMuPDF is not installed
+        """
+        document = self._documents.get(document_id)
+        if document is not None and not document.failed:
+            self._documents.move_to_end(document_id)
+            return document
+
+        page_count = await asyncio.to_thread(count_pdf_pages, path)
+        document = IngestedDocument(document_id, name, page_count)
+        document.task = asyncio.create_task(self._extract(document, path, on_complete))
+        self._documents[document_id] = document
+        while len(self._documents) > self._max_documents:
+            self._documents.popitem(last=False)
+        return document
+
+
+# Create a singleton instance of the uploaded document store
+uploaded_documents = UploadedDocumentStore(
+    pages_per_task=int(os.environ.get("PDF_PAGES_PER_TASK", DEFAULT_PAGES_PER_TASK)),
+    max_documents=int(os.environ.get("UPLOADED_DOCUMENTS_MAX", DEFAULT_MAX_DOCUMENTS)),
+)
@@ -0,0 +1,84 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from agents.file_processor.condensation import UploadedDocument
+from agents.file_processor.conversion_cache import conversion_cache, hash_file
+from agents.file_processor.converter import file_conversion_pool
+from agents.file_processor.pdf_ingestion import PDF_HANDOFF_PAGES, USE_PAGE_PARALLEL_PDF, uploaded_documents
+
+# Largest upload accepted, in MB
+MAX_UPLOAD_MB = 50
+
+
+@dataclass
+class UploadConversion:
+    """The result of converting one uploaded file."""
+
+    document: Optional[UploadedDocument] = None
+    error: Optional[str] = None
+    # Served from the conversion cache
+    cached: bool = False
+    # A PDF whose first `handoff_pages` pages are handed off while the rest is being extracted
+    handoff_pages: int = 0
+    page_count: int = 0
+
+
+async def convert_upload(path: str, name: str) -> UploadConversion:
+    """
+    Convert an uploaded file to markdown, shared by the Chainlit app and the HTTP API.
+
+    The content hash is looked up in the conversion cache first. Large PDFs are
+    extracted page-parallel and only their first pages are waited for; the remaining
+    pages can be read with the ReadUploadedPagesTool and the full document is cached
+    once extracted. Other files are converted whole in the conversion pool.
+
+    Args:
+        path: Path of the uploaded file
+        name: The uploaded file name, whose extension selects the converter
+
+    Returns:
+        UploadConversion: The converted document, or the conversion error
+    """
+    file_extension = os.path.splitext(name)[1].lower()
+    digest = await asyncio.to_thread(hash_file, path)
+    document_id = digest[:16]
+    cache_key = conversion_cache.make_key(digest, file_extension)
+
+    markdown = await conversion_cache.get(cache_key)
+    if markdown is not None:
+        return UploadConversion(document=UploadedDocument(name, markdown, document_id), cached=True)
+
+    if file_extension == ".pdf" and USE_PAGE_PARALLEL_PDF:
+        try:
+            ingested = await uploaded_documents.ingest_pdf(
+                path,
+                name,
+                document_id,
+                on_complete=lambda ingested: conversion_cache.put(cache_key, name, ingested.markdown()),
+            )
+        except Exception as pdf_error:
+            print(f"Page-parallel PDF extraction failed, converting the whole file: {str(pdf_error)}")
+        else:
+            handoff_pages = min(PDF_HANDOFF_PAGES, ingested.page_count)
+            markdown = await ingested.read_pages(1, handoff_pages)
+            if ingested.page_count > handoff_pages:
+                markdown += (
+                    f"\n\n(Pages 1-{handoff_pages} of {ingested.page_count}. The remaining pages are still being "
+                    f"extracted: read them with the ReadUploadedPagesTool using document_id \"{document_id}\".)"
+                )
+            return UploadConversion(
+                document=UploadedDocument(name, markdown, document_id) if markdown else None,
+                handoff_pages=handoff_pages,
+                page_count=ingested.page_count,
+            )
+
+    try:
+        error, markdown = await file_conversion_pool.convert(path, file_extension=file_extension)
+    except asyncio.TimeoutError:
+        error, markdown = "转换超时", None
+    if error:
+        return UploadConversion(error=error)
+    await conversion_cache.put(cache_key, name, markdown)
+    return UploadConversion(document=UploadedDocument(name, markdown, document_id) if markdown else None)
@@ -2,10 +2,16 @@ from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.conditions import MaxMessageTermination, TextMentionTermination
 from autogen_agentchat.teams import SelectorGroupChat
 
+from agents.context import CompactingChatCompletionContext
+from agents.open_topic_class_generation.parallel_section_creator import (
+    ParallelSectionCreatorAgent,
+)
+from agents.selector import create_rule_based_selector
 from agents.tools.bing_search import bing_search_tool
 from agents.tools.fetch_webpage import fetch_webpage_tool
-from agents.tools.url_accessiable import url_accessible_valid_tool
+from agents.tools.url_accessiable import url_batch_validator_tool
 from config import (
+    USE_PARALLEL_SECTION_GENERATION,
     get_advance_model_client,
     get_low_model_client,
     get_model_client,
@@ -19,13 +25,21 @@ low_model_client = get_low_model_client()
 
 MAX_MESSAGES  = 50
 
+# History size (tokens) above which old tool results and superseded drafts are elided
+CONTEXT_TOKEN_THRESHOLD = 12000
+
+# Parallel section generation: concurrent section workers, tool calls per worker and tool
+SECTION_MAX_CONCURRENCY = 3
+SECTION_TOOL_BUDGET = 3
+MAX_SECTIONS = 8
+
 PROMPT_RESERACH = """You are an educational content creation assistant focused on developing comprehensive teaching materials.
 
 Your primary role is to create high-quality course materials based on the outline provided by the teacher.
 For each topic in the outline:
 1. Use the bing_search tool to find accurate and up-to-date information.
 2. Search for relevant examples, case studies, and visual references that can be included.
-3. Use bing_search tool to find relevant images and videos that enhance the learning experience. Set `response_filter` to `images` for images and `videos` for videos. Validate the URLs to ensure they are correct, accessible, and point to actual content (not empty or placeholder URLs like https://example.com) before embedding them.
+3. Use bing_search tool to find relevant images and videos that enhance the learning experience. Set `response_filter` to `images` for images and `videos` for videos. The image and video results of bing_search are already verified to be accessible and are never repeated within the run, so embed them directly. You have no URL checking tool: the verifier checks every media URL of your draft.
 4. IMPORTANT RESTRICTION: You MUST ONLY use image and video URLs that are directly returned from the bing_search tool. Never fabricate, modify, or generate image/video URLs yourself. If you cannot find appropriate multimedia through bing_search, simply note that suitable media was not found rather than creating placeholder URLs.
 5. When embedding images or videos in markdown, remove unnecessary URL parameters to ensure they can be successfully previewed in markdown. For image URLs with query parameters (like https://example.com/image.jpg?width=800&height=600), remove everything after the question mark by using only the base URL (https://example.com/image.jpg).
 6. Create engaging educational content structured as:
@@ -54,7 +68,7 @@ Your role is to:
 2. Ensure learning objectives are clearly defined and assessments align with these objectives
 3. Evaluate if interactive elements are appropriate and engaging for the target audience
 4. Check that content is organized logically with clear progression
-5. Verify that multimedia elements (images and videos) are properly embedded in the markdown for direct viewing
+5. Verify that multimedia elements (images and videos) are properly embedded in the markdown for direct viewing. Check all their URLs in one call with the url_batch_validator_tool by passing the whole markdown content
 6. Ensure all embedded images use correct markdown syntax: ![描述](image_url) and the url is accessible. And keep the image url is unique and not duplicated in the content.
 7. Ensure all embedded videos use correct markdown syntax: [视频描述](video_url) and the url is accessible. And keep the video url is unique and not duplicated in the content.
 8. Suggest improvements for clarity, engagement, or pedagogical effectiveness
@@ -85,6 +99,8 @@ Create a well-structured course materials document that includes:
 7. Video resources directly embedded using markdown syntax: [视频描述](video_url). If the video url is not accessible or is not a valid video url for example just a webpage, just remove it.
 8. Additional resources and references
 
+Check all the image and video URLs in one call with the url_batch_validator_tool by passing the whole markdown content, and remove the ones it reports as not accessible.
+
 Ensure all multimedia is directly viewable in the markdown without requiring clicks:
 - Images should use the format: ![描述](image_url)
 - Videos should use the format: [视频描述](video_url)
@@ -182,21 +198,36 @@ text_mention_termination = TextMentionTermination("TERMINATE")
 max_messages_termination = MaxMessageTermination(max_messages=MAX_MESSAGES)
 termination = text_mention_termination | max_messages_termination
 
-def create_team()->SelectorGroupChat:
+def create_team(parallel_sections: bool = USE_PARALLEL_SECTION_GENERATION)->SelectorGroupChat:
     research_assistant = AssistantAgent(
         "course_content_creator",
         description="An agent that creates educational content with interactive elements and learning assessments in Chinese.",
         model_client=advance_model_client,
         model_client_stream=True,
+        model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
         system_message=PROMPT_RESERACH,
         tools=[fetch_webpage_tool, bing_search_tool])
 
+    if parallel_sections:
+        # Fan the outline out to per-section workers, revisions go to the regular creator
+        research_assistant = ParallelSectionCreatorAgent(
+            research_assistant,
+            model_client=advance_model_client,
+            system_message=PROMPT_RESERACH,
+            tools=[fetch_webpage_tool, bing_search_tool],
+            planner_client=low_model_client,
+            max_concurrency=SECTION_MAX_CONCURRENCY,
+            tool_budget=SECTION_TOOL_BUDGET,
+            max_sections=MAX_SECTIONS,
+        )
+
     verifier = AssistantAgent(
         "content_reviewer",
         description="An agent that reviews educational content for accuracy, effectiveness, and alignment with learning goals in Chinese.",
         model_client=advance_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
+        model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
+        tools=[url_batch_validator_tool],
         system_message=PROMPT_VERIFIER)
 
     summary_agent = AssistantAgent(
@@ -204,7 +235,8 @@ def create_team()->SelectorGroupChat:
         description="Compile and format all educational materials into a comprehensive course package in Chinese.",
         model_client=moderate_model_client,
         model_client_stream=True,
-        tools=[url_accessible_valid_tool],
+        model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
+        tools=[url_batch_validator_tool],
         system_message=PROMPT_SUMMARY)
     
     markdown_content_formator = AssistantAgent(
@@ -212,6 +244,7 @@ def create_team()->SelectorGroupChat:
             description="An agent that formats markdown content by removing query parameters from image and video URLs.",
             model_client=model_client,
             model_client_stream=True,
+            model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
             system_message=PROMPT_MARKDOWN_CONTENT_FORMAT)
     
     return SelectorGroupChat(
@@ -219,4 +252,12 @@ def create_team()->SelectorGroupChat:
         termination_condition=termination,
         model_client=moderate_model_client,
         selector_prompt=PROMPT_SELECTOR,
+        # Deterministic workflow steps skip the LLM selector, ambiguous ones fall back to it
+        selector_func=create_rule_based_selector(
+            creator=research_assistant.name,
+            reviewer=verifier.name,
+            compiler=summary_agent.name,
+            formatter=markdown_content_formator.name,
+        ),
+        model_context=CompactingChatCompletionContext(token_threshold=CONTEXT_TOKEN_THRESHOLD),
         allow_repeated_speaker=True)
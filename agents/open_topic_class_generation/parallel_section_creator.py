@@ -0,0 +1,258 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Any, AsyncGenerator, List, Mapping, Sequence
+
+from autogen_agentchat.agents import AssistantAgent, BaseChatAgent
+from autogen_agentchat.base import Response
+from autogen_agentchat.messages import (
+    BaseAgentEvent,
+    BaseChatMessage,
+    ModelClientStreamingChunkEvent,
+    TextMessage,
+    ToolCallSummaryMessage,
+)
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    AssistantMessage,
+    ChatCompletionClient,
+    SystemMessage,
+    UserMessage,
+)
+from autogen_core.tools import BaseTool
+
+from agents.tools.budgeted_tool import BudgetedTool
+
+logger = logging.getLogger("parallel_section_creator")
+
+# Heading lines, always a section: markdown headings and "一、" numbering
+_HEADING_LINE_PATTERN = re.compile(r"^\s*(#{1,6}\s+|[一二三四五六七八九十]+、\s*)(?P<title>\S.*)$")
+# List items, "1." / "1、" numbering and bullets, only sections in a list introduced as an outline
+_LIST_LINE_PATTERN = re.compile(r"^(?P<indent>\s*)(\d+[.、)]\s*|[-*]\s+)(?P<title>\S.*)$")
+# Lines that introduce an outline, e.g. "课程大纲：" or "教学环节如下"
+_OUTLINE_INTRO_PATTERN = re.compile(r"大纲|提纲|目录|章节|教学环节|教学过程|outline", re.IGNORECASE)
+
+PROMPT_SECTION_PLANNER = """You split a teacher's lesson request into the sections of the lesson.
+Return only a JSON array of section titles in Simplified Chinese, in teaching order, for example:
+["诗人简介", "诗词解析", "课堂互动", "课后习题"]
+Return at most {max_sections} sections. Do not add any other text.
+"""
+
+PROMPT_SECTION_TASK = """{task}
+
+You are writing only ONE section of this lesson, the other sections are written in parallel by other assistants.
+Section to write: {section}
+
+Start with the heading "## {section}" and write only the content of this section.
+"""
+
+
+def split_outline(task: str, max_sections: int) -> List[str]:
+    """Split an outline into section titles using its headings, or a list introduced as an outline.
+
+    Any other list, e.g. the requirements of a request ("1. 时长40分钟" "2. 包含小测验"),
+    is not split: the request is left to the planner.
+
+    Args:
+        task: The outline or request provided by the teacher
+        max_sections: Maximum number of sections to return
+
+    Returns:
+        List[str]: The section titles, empty if the outline has fewer than two sections
+    """
+    lines = task.splitlines()
+    sections = [match.group("title").strip() for match in map(_HEADING_LINE_PATTERN.match, lines) if match]
+    if len(sections) < 2:
+        sections, in_outline = [], False
+        for line in lines:
+            match = _LIST_LINE_PATTERN.match(line)
+            if match is None:
+                if line.strip():
+                    # A list is an outline only right after a line introducing it
+                    in_outline = bool(_OUTLINE_INTRO_PATTERN.search(line))
+            elif in_outline and len(match.group("indent")) < 2:
+                # Nested items are the points of a section
+                sections.append(match.group("title").strip())
+    if len(sections) < 2:
+        return []
+    return sections[:max_sections]
+
+
+class ParallelSectionCreatorAgent(BaseChatAgent):
+    """A content creator that writes the sections of a lesson in parallel.
+
+    On its first turn the outline is split into sections, and one worker agent per
+    section researches and writes it with its own search/fetch budget. At most
+    `max_concurrency` workers run at the same time. The sections are merged into a
+    single draft for the reviewer, so the latency follows the longest section instead
+    of the sum of all sections.
+
+    Later turns (revisions requested by the reviewer) and outlines that cannot be split
+    are handled by the regular `delegate` creator, which also receives the merged draft.
+
+    Args:
+        delegate: The regular creator agent, its name is used for this agent
+        model_client: Model client used by the section workers
+        system_message: System message of the section workers
+        tools: Tools available to each section worker
+        planner_client: Model client used to split requests that have no explicit outline
+        max_concurrency: Maximum number of section workers running at the same time
+        tool_budget: Maximum number of tool calls per section worker and tool
+        max_sections: Maximum number of sections to fan out
+    """
+
+    def __init__(
+        self,
+        delegate: AssistantAgent,
+        model_client: ChatCompletionClient,
+        system_message: str,
+        tools: Sequence[BaseTool[Any, Any]],
+        planner_client: ChatCompletionClient,
+        max_concurrency: int = 3,
+        tool_budget: int = 3,
+        max_sections: int = 8,
+    ):
+        super().__init__(delegate.name, delegate.description)
+        self._delegate = delegate
+        self._model_client = model_client
+        self._system_message = system_message
+        self._tools = list(tools)
+        self._planner_client = planner_client
+        self._max_concurrency = max_concurrency
+        self._tool_budget = tool_budget
+        self._max_sections = max_sections
+        self._fanned_out = False
+
+    @property
+    def produced_message_types(self) -> Sequence[type[BaseChatMessage]]:
+        return (TextMessage, ToolCallSummaryMessage)
+
+    async def on_messages(self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken) -> Response:
+        async for message in self.on_messages_stream(messages, cancellation_token):
+            if isinstance(message, Response):
+                return message
+        raise AssertionError("The stream should have returned the final result.")
+
+    async def _plan_sections(self, task: str, cancellation_token: CancellationToken) -> List[str]:
+        sections = split_outline(task, self._max_sections)
+        if sections:
+            return sections
+        try:
+            result = await self._planner_client.create(
+                [
+                    SystemMessage(content=PROMPT_SECTION_PLANNER.format(max_sections=self._max_sections)),
+                    UserMessage(content=task, source="user"),
+                ],
+                cancellation_token=cancellation_token,
+            )
+            assert isinstance(result.content, str)
+            planned = json.loads(result.content.strip().removeprefix("```json").removesuffix("```"))
+            sections = [str(section).strip() for section in planned if str(section).strip()]
+        except Exception as e:
+            logger.warning(f"Error planning lesson sections: {str(e)}")
+            return []
+        return sections[: self._max_sections] if len(sections) >= 2 else []
+
+    async def _write_section(
+        self,
+        index: int,
+        task: str,
+        section: str,
+        semaphore: asyncio.Semaphore,
+        cancellation_token: CancellationToken,
+    ) -> str:
+        async with semaphore:
+            worker = AssistantAgent(
+                f"section_creator_{index}",
+                model_client=self._model_client,
+                system_message=self._system_message,
+                tools=[BudgetedTool(tool, self._tool_budget) for tool in self._tools],
+                reflect_on_tool_use=True,
+            )
+            result = await worker.run(
+                task=PROMPT_SECTION_TASK.format(task=task, section=section),
+                cancellation_token=cancellation_token,
+            )
+            return result.messages[-1].to_text()
+
+    async def on_messages_stream(
+        self, messages: Sequence[BaseChatMessage], cancellation_token: CancellationToken
+    ) -> AsyncGenerator[BaseAgentEvent | BaseChatMessage | Response, None]:
+        task = "\n\n".join(msg.to_text() for msg in messages if msg.source == "user")
+        sections = [] if self._fanned_out or not task else await self._plan_sections(task, cancellation_token)
+
+        if not sections:
+            async for message in self._delegate.on_messages_stream(messages, cancellation_token):
+                yield message
+            return
+
+        self._fanned_out = True
+        yield ModelClientStreamingChunkEvent(
+            content=f"并行生成 {len(sections)} 个章节: {', '.join(sections)}\n\n", source=self.name
+        )
+
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        drafts: List[str | None] = [None] * len(sections)
+        # Sections that failed are written again once, then the delegate writes the whole lesson
+        for attempt in range(2):
+            pending = [index for index, draft in enumerate(drafts) if draft is None]
+            if attempt > 0:
+                logger.warning(f"Writing {len(pending)} failed sections again: {', '.join(sections[index] for index in pending)}")
+                yield ModelClientStreamingChunkEvent(content=f"重新生成 {len(pending)} 个失败的章节\n", source=self.name)
+            section_tasks = {
+                asyncio.ensure_future(self._write_section(index, task, sections[index], semaphore, cancellation_token)): index
+                for index in pending
+            }
+            for future in section_tasks:
+                cancellation_token.link_future(future)
+
+            try:
+                for completed in asyncio.as_completed(section_tasks):
+                    try:
+                        await completed
+                    except asyncio.CancelledError:
+                        if cancellation_token.is_cancelled():
+                            raise
+                    except Exception as e:
+                        # A failing section must not cancel its siblings
+                        logger.warning(f"Error writing a lesson section: {str(e)}")
+                    done = sum(1 for section_task in section_tasks if section_task.done())
+                    yield ModelClientStreamingChunkEvent(
+                        content=f"章节完成 {done}/{len(section_tasks)}\n", source=self.name
+                    )
+            finally:
+                for section_task in section_tasks:
+                    section_task.cancel()
+
+            for section_task, index in section_tasks.items():
+                if not section_task.cancelled() and section_task.exception() is None:
+                    drafts[index] = section_task.result()
+            if all(draft is not None for draft in drafts):
+                break
+        else:
+            logger.warning("Some lesson sections could not be written in parallel, falling back to the regular creator")
+            async for message in self._delegate.on_messages_stream(messages, cancellation_token):
+                yield message
+            return
+
+        draft = "\n\n".join(drafts)
+
+        # Let the regular creator revise the merged draft on later turns
+        for msg in messages:
+            await self._delegate.model_context.add_message(msg.to_model_message())
+        await self._delegate.model_context.add_message(AssistantMessage(content=draft, source=self.name))
+
+        yield Response(chat_message=TextMessage(content=draft, source=self.name))
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        self._fanned_out = False
+        await self._delegate.on_reset(cancellation_token)
+
+    async def save_state(self) -> Mapping[str, Any]:
+        return {"fanned_out": self._fanned_out, "delegate_state": await self._delegate.save_state()}
+
+    async def load_state(self, state: Mapping[str, Any]) -> None:
+        self._fanned_out = state.get("fanned_out", False)
+        if "delegate_state" in state:
+            await self._delegate.load_state(state["delegate_state"])
@@ -0,0 +1,3 @@
+from agents.selector.rule_based_selector import create_rule_based_selector
+
+__all__ = ["create_rule_based_selector"]
@@ -0,0 +1,95 @@
+import re
+from typing import Callable, Optional, Sequence
+
+from autogen_agentchat.messages import (
+    BaseAgentEvent,
+    BaseChatMessage,
+    ToolCallSummaryMessage,
+)
+
+APPROVED_KEYWORD = "APPROVED"
+CONTINUE_KEYWORD = "CONTINUE DEVELOPMENT"
+
+# A verdict line: the keyword alone, optionally after a label such as "Conclusion:" and
+# wrapped in markdown emphasis, quotes or final punctuation
+_VERDICT_LINE_PATTERN = re.compile(
+    r"^(?:[\w ]{0,20}[:：]\s*)?[*_`\"'“”「」\s]*(APPROVED|CONTINUE DEVELOPMENT)[*_`\"'“”「」.!。！\s]*$"
+)
+_NEGATED_APPROVAL_PATTERN = re.compile(r"\b(NOT|NEVER|UN)[\s-]*APPROVED\b|未(通过|批准)|不(通过|批准)", re.IGNORECASE)
+
+SelectorFunc = Callable[[Sequence[BaseAgentEvent | BaseChatMessage]], Optional[str]]
+
+
+def _verdict(content: str) -> Optional[str]:
+    """Return the keyword of the reviewer's final verdict, if it gave one.
+
+    The verdict is the last line of the review that consists of a keyword alone, so an
+    echoed template line ("CONTINUE DEVELOPMENT or APPROVED") or a keyword quoted in the
+    review does not count. A negated approval ("NOT APPROVED") asks for more development.
+    """
+    for line in reversed(content.strip().splitlines()):
+        line = line.strip()
+        if not line or line == "TERMINATE":
+            continue
+        if _NEGATED_APPROVAL_PATTERN.search(line):
+            return CONTINUE_KEYWORD
+        match = _VERDICT_LINE_PATTERN.match(line.upper())
+        if match:
+            return match.group(1)
+        if APPROVED_KEYWORD in line.upper() or CONTINUE_KEYWORD in line.upper():
+            # A keyword in a sentence is not a verdict, let the LLM selector decide
+            return None
+    return None
+
+
+def create_rule_based_selector(
+    creator: str,
+    reviewer: str,
+    compiler: str,
+    formatter: str,
+) -> SelectorFunc:
+    """Create a selector_func that follows the course generation workflow.
+
+    The workflow is creator -> reviewer (until APPROVED) -> compiler -> formatter. The next
+    speaker is decided from the last speaker and the reviewer's verdict keywords, which
+    skips the LLM selector round-trip. When the state is ambiguous the function returns
+    None and SelectorGroupChat falls back to the LLM selector.
+
+    Args:
+        creator: Name of the agent that researches and writes the content
+        reviewer: Name of the agent that reviews the content
+        compiler: Name of the agent that compiles the approved content
+        formatter: Name of the agent that formats the compiled content
+
+    Returns:
+        SelectorFunc: The selector function to pass to SelectorGroupChat
+    """
+
+    def select_next_speaker(thread: Sequence[BaseAgentEvent | BaseChatMessage]) -> Optional[str]:
+        last_message = next((msg for msg in reversed(thread) if isinstance(msg, BaseChatMessage)), None)
+        if last_message is None or last_message.source == "user":
+            return creator
+
+        # An agent that just got tool results back still has to act on them
+        if isinstance(last_message, ToolCallSummaryMessage):
+            if last_message.source in (creator, reviewer, compiler):
+                return last_message.source
+            return None
+
+        if last_message.source == creator:
+            return reviewer
+
+        if last_message.source == reviewer:
+            verdict = _verdict(last_message.to_text())
+            if verdict == APPROVED_KEYWORD:
+                return compiler
+            if verdict == CONTINUE_KEYWORD:
+                return creator
+            return None
+
+        if last_message.source == compiler:
+            return formatter
+
+        return None
+
+    return select_next_speaker
@@ -1,16 +1,30 @@
 import asyncio
 import json
-import os
 from typing import Dict, List, Optional
-from urllib.parse import urljoin
 
 import chainlit as cl
-import html2text
 import httpx
 from autogen_core.tools import FunctionTool
-from bs4 import BeautifulSoup
 
-from agents.tools.fetch_webpage import clean_image_url
+from agents.tools.html_to_markdown import clean_image_url
+from agents.tools.http_cache import http_cache
+from agents.tools.http_client import http_client_pool
+from agents.tools.local_search import USE_LOCAL_SEARCH, local_search_index
+from agents.tools.media_pipeline import verify_media_results
+from agents.tools.passage_extraction import extract_passages
+from agents.tools.search_cache import search_cache
+from bingKeyPool import bing_key_pool, initialize_bing_key_pool_from_env
+
+# Token budget of the query-relevant passages returned as the content of each result
+CONTENT_TOKEN_BUDGET = 1500
+# Maximum length of the raw page markdown that is ranked for passages
+PAGE_MAX_LENGTH = 100000
+# Number of result pages fetched at the same time
+CONTENT_FETCH_CONCURRENCY = 4
+# Seconds to wait for the result pages before returning the ones that arrived
+CONTENT_FETCH_DEADLINE = 15
+# Number of image or video results requested per result returned
+MEDIA_OVERFETCH_FACTOR = 2
 
 
 @cl.step(type="tool", name="bing_search")
@@ -32,7 +46,7 @@ async def bing_search(
         query: Search query string
         num_results: Number of results to return (max 50)
         include_snippets: Include result snippets in output
-        include_content: Include full webpage content in markdown format
+        include_content: Include the webpage passages most relevant to the query in markdown format
         content_max_length: Maximum length of webpage content (if included)
         language: Language code for search results (e.g., 'en', 'es', 'fr', 'zh-CN')
         country: Optional market code for search results (e.g., 'us', 'uk', 'cn')
@@ -45,15 +59,6 @@ async def bing_search(
     Raises:
         ValueError: If API credentials are invalid or request fails
     """
-    # Get and validate API key
-    api_key = os.getenv("BING_SEARCH_KEY", "").strip()
-
-    if not api_key:
-        raise ValueError(
-            "BING_SEARCH_KEY environment variable is not set. "
-            "Please obtain an API key from Azure Portal."
-        )
-
     # Validate safe_search parameter
     valid_safe_search = ["off", "moderate", "strict"]
     if safe_search.lower() not in valid_safe_search:
@@ -68,6 +73,36 @@ async def bing_search(
             f"Invalid response_filter value. Must be one of: {', '.join(valid_filters)}"
         )
 
+    def truncate_content(content: str) -> str:
+        if content_max_length and len(content) > content_max_length:
+            content = content[:content_max_length] + "\n...(truncated)"
+        return content
+
+    # Serve web searches from the local index first, Bing is only used on a miss
+    local_results: List[Dict[str, str]] = []
+    if USE_LOCAL_SEARCH and response_filter == "webpages":
+        local_results = await local_search_index.search(
+            query,
+            num_results,
+            include_snippets=include_snippets,
+            include_content=include_content,
+            content_token_budget=CONTENT_TOKEN_BUDGET,
+        )
+        for result in local_results:
+            if "content" in result:
+                result["content"] = truncate_content(result["content"])
+        if len(local_results) >= num_results:
+            return local_results
+
+    # Load the API keys (BING_SEARCH_KEYS or BING_SEARCH_KEY) on first use
+    if not bing_key_pool.initialized:
+        try:
+            initialize_bing_key_pool_from_env()
+        except ValueError:
+            if local_results:
+                return local_results
+            raise
+
     async def fetch_page_content(url: str, max_length: Optional[int] = 50000) -> str:
         """Helper function to fetch and convert webpage content to markdown"""
         headers = {
@@ -75,42 +110,58 @@ async def bing_search(
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
+            markdown = await http_cache.fetch_markdown(url, headers=headers)
 
-                soup = BeautifulSoup(response.text, "html.parser")
+            if max_length and len(markdown) > max_length:
+                markdown = markdown[:max_length] + "\n...(truncated)"
 
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.decompose()
+            return markdown
 
-                # Convert relative URLs to absolute
-                for tag in soup.find_all(["a", "img"]):
-                    if tag.get("href"):
-                        tag["href"] = urljoin(url, tag["href"])
-                    if tag.get("src"):
-                        tag["src"] = urljoin(url, tag["src"])
+        except Exception as e:
+            return f"Error fetching content: {str(e)}"
 
-                h2t = html2text.HTML2Text()
-                h2t.body_width = 0
-                h2t.ignore_images = False
-                h2t.ignore_emphasis = False
-                h2t.ignore_links = False
-                h2t.ignore_tables = False
+    async def fetch_relevant_content(url: str, title: str) -> str:
+        """Fetch a page and keep only the passages most relevant to the query"""
+        markdown = await fetch_page_content(url, max_length=PAGE_MAX_LENGTH)
+        if markdown.startswith("Error fetching content:"):
+            return markdown
 
-                markdown = h2t.handle(str(soup))
+        if USE_LOCAL_SEARCH:
+            # Later searches on the same topic are answered from the local index
+            await local_search_index.add_page(url, markdown, title=title)
 
-                if max_length and len(markdown) > max_length:
-                    markdown = markdown[:max_length] + "\n...(truncated)"
+        content = extract_passages(markdown, query, token_budget=CONTENT_TOKEN_BUDGET)
+        return truncate_content(content)
 
-                return markdown.strip()
+    async def fetch_result_contents(results: List[Dict[str, str]]) -> None:
+        """Fetch the content of all results concurrently, in place and within the deadline"""
+        semaphore = asyncio.Semaphore(CONTENT_FETCH_CONCURRENCY)
 
-        except Exception as e:
-            return f"Error fetching content: {str(e)}"
+        async def fetch_with_limit(result: Dict[str, str]) -> str:
+            async with semaphore:
+                return await fetch_relevant_content(result["link"], result["title"])
 
-    # Build request headers and parameters
-    headers = {"Ocp-Apim-Subscription-Key": api_key, "Accept": "application/json"}
+        tasks = [asyncio.ensure_future(fetch_with_limit(result)) for result in results]
+        if not tasks:
+            return
+        try:
+            await asyncio.wait(tasks, timeout=CONTENT_FETCH_DEADLINE)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # Results keep their rank order, pages that did not arrive in time are marked as pending
+        for result, task in zip(results, tasks):
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                # Only this result is lost, the other pages are still returned
+                result["content"] = f"Error fetching content: {str(task.exception())}"
+            elif task.done() and not task.cancelled():
+                result["content"] = task.result()
+            else:
+                result["content"] = (
+                    f"Content pending: the page did not load within {CONTENT_FETCH_DEADLINE} seconds. "
+                    "Use the snippet, or fetch the link later if it is needed."
+                )
 
     # Construct the proper market parameter
     # If language already contains a country code (like zh-CN), use it directly
@@ -120,9 +171,11 @@ async def bing_search(
     else:
         market = f"{language}-{country.upper()}" if country else language
     
+    # Ask for more media than needed, as duplicates and broken links are dropped
+    count = max(1, num_results) * (MEDIA_OVERFETCH_FACTOR if response_filter in ["images", "videos"] else 1)
     params = {
         "q": query,
-        "count": min(max(1, num_results), 10),
+        "count": min(count, 10),
         "mkt": market,
         "safeSearch": safe_search.capitalize(),
         "responseFilter": response_filter,
@@ -130,33 +183,39 @@ async def bing_search(
         "setLang": language.split("-")[0],  # Add explicit language parameter
     }
 
-    # Make the request
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
+    async def search_api() -> Dict:
+        """Send the search request, duplicate searches are served by the search cache"""
+        async def send_with_key(api_key: str) -> httpx.Response:
+            return await http_client_pool.get(
                 "https://api.bing.microsoft.com/v7.0/search",
-                headers=headers,
+                headers={"Ocp-Apim-Subscription-Key": api_key, "Accept": "application/json"},
                 params=params,
-                timeout=10,
             )
 
-            # Handle common error cases
-            if response.status_code == 401:
-                raise ValueError(
-                    "Authentication failed. Please verify your Bing Search API key."
-                )
-            elif response.status_code == 403:
-                raise ValueError(
-                    "Access forbidden. This could mean:\n"
-                    "1. The API key is invalid\n"
-                    "2. The API key has expired\n"
-                    "3. You've exceeded your API quota"
-                )
-            elif response.status_code == 429:
-                raise ValueError("API quota exceeded. Please try again later.")
+        # The key pool retries throttled or refused requests with the other keys
+        response = await bing_key_pool.send(send_with_key)
 
-            response.raise_for_status()
-            data = response.json()
+        # Handle common error cases
+        if response.status_code == 401:
+            raise ValueError(
+                "Authentication failed. Please verify your Bing Search API key."
+            )
+        elif response.status_code == 403:
+            raise ValueError(
+                "Access forbidden. This could mean:\n"
+                "1. The API key is invalid\n"
+                "2. The API key has expired\n"
+                "3. You've exceeded your API quota"
+            )
+        elif response.status_code == 429:
+            raise ValueError("API quota exceeded on all keys. Please try again later.")
+
+        response.raise_for_status()
+        return response.json()
+
+    # Make the request
+    try:
+        data = await search_cache.get_or_fetch(search_cache.make_key(params), search_api)
 
         # Process results based on response_filter
         results = []
@@ -181,20 +240,12 @@ async def bing_search(
                 result["link"] = item.get("url", "")
                 if include_snippets:
                     result["snippet"] = item.get("snippet", "")
-                if include_content:
-                    result["content"] = await fetch_page_content(
-                        result["link"], max_length=content_max_length
-                    )
 
             elif response_filter == "news":
                 result["link"] = item.get("url", "")
                 if include_snippets:
                     result["snippet"] = item.get("description", "")
                 result["date"] = item.get("datePublished", "")
-                if include_content:
-                    result["content"] = await fetch_page_content(
-                        result["link"], max_length=content_max_length
-                    )
 
             elif response_filter == "images":
                 result["link"] = clean_image_url(item.get("contentUrl", ""))
@@ -211,9 +262,20 @@ async def bing_search(
 
             results.append(result)
 
-        return results[:num_results]
+        if response_filter in ["images", "videos"]:
+            # Only media that is unique in the run and verified to load is handed to the agents
+            results = await verify_media_results(results, response_filter, num_results)
+
+        results = results[:num_results]
+        if include_content and response_filter in ["webpages", "news"]:
+            await fetch_result_contents(results)
+
+        return results
 
-    except httpx.RequestException as e:
+    except httpx.HTTPError as e:
+        # Without network, the partial local results are better than no results
+        if local_results:
+            return local_results
         error_msg = str(e)
         if "InvalidApiKey" in error_msg:
             raise ValueError(
@@ -229,20 +291,26 @@ async def bing_search(
             "Please verify your API credentials and try again."
         ) from None
     except Exception as e:
+        if local_results:
+            return local_results
         raise ValueError(f"Unexpected error during search: {str(e)}") from e
 
 
 bing_search_tool = FunctionTool(
     bing_search,
     name="bing_search",
-    description="\n    Perform Bing searches using the Bing Web Search API. Requires BING_SEARCH_KEY environment variable.\n    Supports web, news, image, and video searches.\n    See function documentation for detailed setup instructions.\n    ",
+    description="\n    Perform Bing searches using the Bing Web Search API. Requires BING_SEARCH_KEY (or a BING_SEARCH_KEYS pool) environment variable.\n    Supports web, news, image, and video searches.\n    See function documentation for detailed setup instructions.\n    ",
     global_imports=[
         {"module": "typing", "imports": ["List", "Dict", "Optional"]},
-        "os",
         "httpx",
-        "html2text",
-        {"module": "bs4", "imports": ["BeautifulSoup"]},
-        {"module": "urllib.parse", "imports": ["urljoin"]},
+        {"module": "agents.tools.html_to_markdown", "imports": ["clean_image_url"]},
+        {"module": "agents.tools.http_cache", "imports": ["http_cache"]},
+        {"module": "agents.tools.passage_extraction", "imports": ["extract_passages"]},
+        {"module": "agents.tools.local_search", "imports": ["USE_LOCAL_SEARCH", "local_search_index"]},
+        {"module": "agents.tools.media_pipeline", "imports": ["verify_media_results"]},
+        {"module": "agents.tools.http_client", "imports": ["http_client_pool"]},
+        {"module": "agents.tools.search_cache", "imports": ["search_cache"]},
+        {"module": "bingKeyPool", "imports": ["bing_key_pool", "initialize_bing_key_pool_from_env"]},
     ],
 )
 
@@ -0,0 +1,41 @@
+from typing import Any
+
+from autogen_core import CancellationToken
+from autogen_core.tools import BaseTool
+from pydantic import BaseModel
+
+
+class BudgetedTool(BaseTool[BaseModel, Any]):
+    """Wrap a tool so that it can only be called a limited number of times.
+
+    Once the budget is spent, calls return a short notice instead of running the
+    tool, which tells the model to finish with the material it already has.
+
+    Args:
+        tool: The tool to wrap
+        budget: Maximum number of calls that actually run the tool
+    """
+
+    def __init__(self, tool: BaseTool[BaseModel, Any], budget: int):
+        super().__init__(
+            args_type=tool.args_type(),
+            return_type=tool.return_type(),
+            name=tool.name,
+            description=tool.description,
+        )
+        self._tool = tool
+        self._remaining = budget
+
+    @property
+    def remaining(self) -> int:
+        """Return the number of calls left in the budget."""
+        return self._remaining
+
+    def return_value_as_string(self, value: Any) -> str:
+        return self._tool.return_value_as_string(value)
+
+    async def run(self, args: BaseModel, cancellation_token: CancellationToken) -> Any:
+        if self._remaining <= 0:
+            return f"The {self.name} budget for this task is used up. Write the content with the information already gathered."
+        self._remaining -= 1
+        return await self._tool.run(args, cancellation_token)
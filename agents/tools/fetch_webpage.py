@@ -1,25 +1,11 @@
 from typing import Dict, Optional
-from urllib.parse import urljoin, urlparse
 
 import chainlit as cl
-import html2text
 import httpx
 from autogen_core.tools import FunctionTool
-from bs4 import BeautifulSoup
 
-
-def clean_image_url(url: str) -> str:
-    """Remove query parameters from image URLs.
-    
-    Args:
-        url: The image URL that might contain query parameters
-        
-    Returns:
-        str: Clean URL without query parameters
-    """
-    parsed = urlparse(url)
-    clean = parsed.scheme + "://" + parsed.netloc + parsed.path
-    return clean
+from agents.tools.http_cache import http_cache
+from agents.tools.local_search import USE_LOCAL_SEARCH, local_search_index
 
 
 @cl.step(type="tool", name="fetch_webpage")
@@ -43,6 +29,11 @@ async def fetch_webpage(
     Raises:
         ValueError: If the URL is invalid or the page can't be fetched
     """
+    if url.startswith("local://"):
+        raise ValueError(
+            "This is a curated local document, not a webpage: its content is already in the bing_search result"
+        )
+
     # Use default headers if none provided
     if headers is None:
         headers = {
@@ -50,44 +41,20 @@ async def fetch_webpage(
         }
 
     try:
-        # Fetch the webpage
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-
-            # Parse HTML
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-
-            # Convert relative URLs to absolute and clean image URLs
-            for tag in soup.find_all(["a", "img"]):
-                if tag.get("href"):
-                    tag["href"] = urljoin(url, tag["href"])
-                if tag.get("src"):
-                    tag["src"] = urljoin(url, tag["src"])
-                    # Clean image URLs by removing query parameters
-                    if tag.name == "img":
-                        tag["src"] = clean_image_url(tag["src"])
-
-            # Configure HTML to Markdown converter
-            h2t = html2text.HTML2Text()
-            h2t.body_width = 0  # No line wrapping
-            h2t.ignore_images = not include_images
-            h2t.ignore_emphasis = False
-            h2t.ignore_links = False
-            h2t.ignore_tables = False
+        # Fetch the webpage as markdown, from the cache while it is fresh or unchanged
+        markdown = await http_cache.fetch_markdown(
+            url, headers=headers, include_images=include_images, clean_image_urls=True
+        )
 
-            # Convert to markdown
-            markdown = h2t.handle(str(soup))
+        if USE_LOCAL_SEARCH:
+            # Make the page searchable offline by later bing_search calls
+            await local_search_index.add_page(url, markdown)
 
-            # Trim if max_length is specified
-            if max_length and len(markdown) > max_length:
-                markdown = markdown[:max_length] + "\n...(truncated)"
+        # Trim if max_length is specified
+        if max_length and len(markdown) > max_length:
+            markdown = markdown[:max_length] + "\n...(truncated)"
 
-            return markdown.strip()
+        return markdown
 
     except httpx.RequestError as e:
         raise ValueError(f"Failed to fetch webpage: {str(e)}") from e
@@ -100,11 +67,9 @@ fetch_webpage_tool = FunctionTool(
     description="A tool that fetches the content of a webpage and converts it to markdown. Requires the requests and beautifulsoup4 library to function.",
     global_imports=[
         "os",
-        "html2text",
         {"module": "typing", "imports": ["Optional", "Dict"]},
         "httpx",
-        {"module": "bs4", "imports": ["BeautifulSoup"]},
-        {"module": "html2text", "imports": ["HTML2Text"]},
-        {"module": "urllib.parse", "imports": ["urljoin", "urlparse"]},
+        {"module": "agents.tools.http_cache", "imports": ["http_cache"]},
+        {"module": "agents.tools.local_search", "imports": ["USE_LOCAL_SEARCH", "local_search_index"]},
     ],
 )
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+from urllib.parse import urljoin, urlparse
+
+import html2text
+
+logger = logging.getLogger("html_to_markdown")
+
+# "html2text" converts the raw HTML in a single pass. "lxml" and "html.parser" first
+# clean the page with BeautifulSoup, which is slower but repairs badly broken markup.
+HTML_PARSERS = ["html2text", "lxml", "html.parser"]
+DEFAULT_HTML_PARSER = "html2text"
+DEFAULT_CONVERSION_WORKERS = min(4, os.cpu_count() or 1)
+
+# Tags whose content is never part of the page text
+_SKIPPED_TAGS = ["script", "style", "noscript", "template"]
+
+
+def clean_image_url(url: str) -> str:
+    """Remove query parameters from image URLs.
+
+    Args:
+        url: The image URL that might contain query parameters
+
+    Returns:
+        str: Clean URL without query parameters
+    """
+    parsed = urlparse(url)
+    clean = parsed.scheme + "://" + parsed.netloc + parsed.path
+    return clean
+
+
+class _PageHTML2Text(html2text.HTML2Text):
+    """html2text converter that resolves image URLs and optionally strips their query."""
+
+    def __init__(self, base_url: str, clean_image_urls: bool):
+        super().__init__(baseurl=base_url, bodywidth=0)
+        self._clean_image_urls = clean_image_urls
+
+    def handle_tag(self, tag: str, attrs: Dict[str, Optional[str]], start: bool) -> None:
+        if start and tag == "img" and self._clean_image_urls and attrs.get("src"):
+            attrs = dict(attrs)
+            attrs["src"] = clean_image_url(urljoin(self.baseurl, attrs["src"]))
+        super().handle_tag(tag, attrs, start)
+
+
+def _clean_with_soup(html: str, parser: str) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, parser)
+    for tag in soup.find_all(_SKIPPED_TAGS):
+        tag.decompose()
+    return str(soup)
+
+
+def html_to_markdown(
+    html: str,
+    base_url: str,
+    include_images: bool = True,
+    clean_image_urls: bool = False,
+    parser: str = DEFAULT_HTML_PARSER,
+) -> str:
+    """Convert a webpage to markdown with absolute link and image URLs.
+
+    Relative URLs are resolved against `base_url` by html2text while it converts the
+    page, so the links are rewritten in the same pass instead of walking the tree again.
+
+    Args:
+        html: The HTML of the page
+        base_url: The URL of the page, used to resolve relative URLs
+        include_images: Whether to include image references in the markdown
+        clean_image_urls: Whether to remove query parameters from image URLs
+        parser: One of HTML_PARSERS
+
+    Returns:
+        str: The markdown of the page
+    """
+    if parser != "html2text":
+        html = _clean_with_soup(html, parser)
+
+    h2t = _PageHTML2Text(base_url, clean_image_urls)
+    h2t.ignore_images = not include_images
+    h2t.ignore_emphasis = False
+    h2t.ignore_links = False
+    h2t.ignore_tables = False
+    return h2t.handle(html).strip()
+
+
+class HtmlConversionPool:
+    """
+    Worker pool that converts HTML to markdown off the event loop.
+
+    Parsing and converting a large page takes hundreds of milliseconds of pure Python
+    CPU time; run on the event loop it would stall every streaming session of the
+    process. Conversions run in a process pool so they also run in parallel, and fall
+    back to a thread pool where worker processes cannot be started.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_CONVERSION_WORKERS, parser: str = DEFAULT_HTML_PARSER):
+        if parser not in HTML_PARSERS:
+            raise ValueError(f"Invalid HTML parser. Must be one of: {', '.join(HTML_PARSERS)}")
+        if parser == "lxml" and not self._lxml_available():
+            parser = "html.parser"
+        self._max_workers = max_workers
+        self._parser = parser
+        self._executor: Optional[Executor] = None
+
+    @staticmethod
+    def _lxml_available() -> bool:
+        try:
+            import lxml  # noqa: F401
+        except ImportError:
+            logger.warning("lxml is not installed, falling back to html.parser")
+            return False
+        return True
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"Process pool unavailable, converting HTML in threads: {str(e)}")
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        return self._executor
+
+    async def convert(
+        self,
+        html: str,
+        base_url: str,
+        include_images: bool = True,
+        clean_image_urls: bool = False,
+    ) -> str:
+        """
+        Convert a webpage to markdown in the worker pool.
+
+        Args:
+            html: The HTML of the page
+            base_url: The URL of the page, used to resolve relative URLs
+            include_images: Whether to include image references in the markdown
+            clean_image_urls: Whether to remove query parameters from image URLs
+
+        Returns:
+            str: The markdown of the page
+        """
+        loop = asyncio.get_running_loop()
+        args = (html, base_url, include_images, clean_image_urls, self._parser)
+        try:
+            return await loop.run_in_executor(self._get_executor(), html_to_markdown, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory), start a new pool for the next pages
+            logger.warning("HTML conversion worker pool broke, restarting it")
+            self.shutdown()
+            return await loop.run_in_executor(self._get_executor(), html_to_markdown, *args)
+
+    def shutdown(self) -> None:
+        """Stop the worker pool, it is started again on the next conversion."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Create a singleton instance of the HTML conversion pool
+html_conversion_pool = HtmlConversionPool(
+    max_workers=int(os.environ.get("HTML_CONVERSION_WORKERS", DEFAULT_CONVERSION_WORKERS)),
+    parser=os.environ.get("HTML_PARSER", DEFAULT_HTML_PARSER),
+)
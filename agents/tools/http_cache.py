@@ -0,0 +1,334 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Mapping, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from agents.tools.html_to_markdown import html_conversion_pool
+from agents.tools.http_client import http_client_pool
+
+logger = logging.getLogger("http_cache")
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "http")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_TTL = 60 * 60
+# Upper bound of the freshness guessed from Last-Modified when the server sends no lifetime
+MAX_HEURISTIC_TTL = 24 * 60 * 60
+# Maximum number of bytes of a page that are downloaded and converted
+DEFAULT_MAX_PAGE_BYTES = 2 * 1024 * 1024
+# Content types converted to markdown, anything else (PDF, video...) is rejected from the headers
+PAGE_CONTENT_TYPES = ["text/html", "application/xhtml+xml", "text/plain"]
+
+_MAX_AGE_PATTERN = re.compile(r"max-age\s*=\s*\"?(\d+)")
+
+
+@dataclass
+class CachedPage:
+    """A page served by the HTTP cache."""
+
+    url: str
+    text: str
+    status_code: int
+    from_cache: bool
+
+
+class HttpCache:
+    """
+    Disk-backed cache of fetched pages and of their converted markdown.
+
+    Responses are stored in a SQLite database together with their `ETag` and
+    `Last-Modified` validators. While an entry is fresh it is served without touching
+    the network; once it is stale a conditional GET revalidates it, and a
+    `304 Not Modified` answer renews the entry without downloading the page again.
+
+    Freshness follows `Cache-Control: max-age` / `no-cache` / `no-store` and
+    `Expires`, falls back to a heuristic based on `Last-Modified`, and can be
+    overridden per domain (a domain also matches its subdomains). When the cache grows
+    over `max_bytes` the least recently used entries are evicted.
+
+    The markdown converted from a response is cached next to it, per conversion
+    variant, and is dropped whenever the response body changes.
+
+    Pages are streamed and only their first `max_page_bytes` are downloaded, and
+    responses that are not webpages are rejected from their headers.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        default_ttl: int = DEFAULT_TTL,
+        domain_ttls: Optional[Mapping[str, int]] = None,
+        max_page_bytes: int = DEFAULT_MAX_PAGE_BYTES,
+    ):
+        self._directory = directory
+        self._max_page_bytes = max_page_bytes
+        self._max_bytes = max_bytes
+        self._default_ttl = default_ttl
+        self._domain_ttls = {domain.lower().lstrip("."): ttl for domain, ttl in (domain_ttls or {}).items()}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(self._directory, exist_ok=True)
+            connection = sqlite3.connect(
+                os.path.join(self._directory, "http_cache.sqlite3"), check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    status_code INTEGER NOT NULL,
+                    body TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )"""
+            )
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS markdown (
+                    url TEXT NOT NULL,
+                    variant TEXT NOT NULL,
+                    markdown TEXT NOT NULL,
+                    PRIMARY KEY (url, variant)
+                )"""
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _domain_ttl(self, url: str) -> Optional[int]:
+        host = (urlparse(url).hostname or "").lower()
+        while host:
+            if host in self._domain_ttls:
+                return self._domain_ttls[host]
+            host = host.partition(".")[2]
+        return None
+
+    def _freshness(self, url: str, response: httpx.Response) -> Optional[float]:
+        """Return the freshness lifetime in seconds, or None if the response must not be stored."""
+        cache_control = response.headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control:
+            return None
+
+        domain_ttl = self._domain_ttl(url)
+        if domain_ttl is not None:
+            return domain_ttl
+        if "no-cache" in cache_control:
+            return 0
+
+        max_age = _MAX_AGE_PATTERN.search(cache_control)
+        if max_age:
+            return int(max_age.group(1))
+
+        try:
+            if "Expires" in response.headers:
+                expires = parsedate_to_datetime(response.headers["Expires"]).timestamp()
+                return max(0.0, expires - time.time())
+            if "Last-Modified" in response.headers:
+                last_modified = parsedate_to_datetime(response.headers["Last-Modified"]).timestamp()
+                return min(MAX_HEURISTIC_TTL, max(0.0, (time.time() - last_modified) / 10))
+        except (TypeError, ValueError):
+            pass
+        return self._default_ttl
+
+    def _lookup(self, url: str) -> Optional[Tuple[int, str, Optional[str], Optional[str], float]]:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT status_code, body, etag, last_modified, expires_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is not None:
+                connection.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+                connection.commit()
+            return row
+
+    def _store(self, url: str, response: httpx.Response, freshness: float) -> None:
+        body = response.text
+        size = len(body.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    response.status_code,
+                    body,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    now + freshness,
+                    now,
+                    size,
+                ),
+            )
+            connection.execute("DELETE FROM markdown WHERE url = ?", (url,))
+            self._evict(connection)
+            connection.commit()
+
+    def _renew(self, url: str, freshness: float) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute("UPDATE responses SET expires_at = ? WHERE url = ?", (time.time() + freshness, url))
+            connection.commit()
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        evicted = 0
+        for url, size in connection.execute("SELECT url, size FROM responses ORDER BY last_access").fetchall():
+            if total <= self._max_bytes:
+                break
+            connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+            connection.execute("DELETE FROM markdown WHERE url = ?", (url,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} least recently used pages from the HTTP cache")
+
+    def _lookup_markdown(self, url: str, variant: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT markdown FROM markdown WHERE url = ? AND variant = ?", (url, variant)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _store_markdown(self, url: str, variant: str, markdown: str) -> None:
+        with self._lock:
+            connection = self._connect()
+            # Only keep markdown of responses that are still cached
+            inserted = connection.execute(
+                "INSERT OR REPLACE INTO markdown SELECT url, ?, ? FROM responses WHERE url = ?",
+                (variant, markdown, url),
+            ).rowcount
+            if inserted:
+                connection.execute(
+                    "UPDATE responses SET size = size + ? WHERE url = ?", (len(markdown.encode("utf-8")), url)
+                )
+                self._evict(connection)
+            connection.commit()
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> CachedPage:
+        """
+        Fetch a page, from the cache while it is fresh and revalidating it once stale.
+
+        Args:
+            url: The URL of the page
+            headers: Optional HTTP headers for the request
+
+        Returns:
+            CachedPage: The page, `from_cache` tells whether the body was downloaded
+
+        Raises:
+            httpx.HTTPError: If the page can't be fetched
+            UnsupportedContentTypeError: If the URL does not point to a webpage
+        """
+        cached = await asyncio.to_thread(self._lookup, url)
+        if cached is not None and cached[4] > time.time():
+            return CachedPage(url=url, text=cached[1], status_code=cached[0], from_cache=True)
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if cached[2]:
+                request_headers["If-None-Match"] = cached[2]
+            if cached[3]:
+                request_headers["If-Modified-Since"] = cached[3]
+
+        response = await http_client_pool.get_capped(
+            url, self._max_page_bytes, accepted_content_types=PAGE_CONTENT_TYPES, headers=request_headers
+        )
+        if response.extensions.get("truncated"):
+            logger.info(f"Page {url} is larger than {self._max_page_bytes} bytes, only its start is used")
+        if cached is not None and response.status_code == 304:
+            freshness = self._freshness(url, response)
+            await asyncio.to_thread(self._renew, url, freshness or 0)
+            return CachedPage(url=url, text=cached[1], status_code=cached[0], from_cache=True)
+
+        response.raise_for_status()
+        freshness = self._freshness(url, response)
+        if response.status_code == 200 and freshness is not None:
+            await asyncio.to_thread(self._store, url, response, freshness)
+        return CachedPage(url=url, text=response.text, status_code=response.status_code, from_cache=False)
+
+    async def fetch_markdown(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        include_images: bool = True,
+        clean_image_urls: bool = False,
+    ) -> str:
+        """
+        Fetch a page as markdown, reusing the cached conversion while the page is unchanged.
+
+        Args:
+            url: The URL of the page
+            headers: Optional HTTP headers for the request
+            include_images: Whether to include image references in the markdown
+            clean_image_urls: Whether to remove query parameters from image URLs
+
+        Returns:
+            str: The markdown of the page
+
+        Raises:
+            httpx.HTTPError: If the page can't be fetched
+            UnsupportedContentTypeError: If the URL does not point to a webpage
+        """
+        variant = json.dumps([include_images, clean_image_urls])
+        page = await self.fetch(url, headers=headers)
+        if page.from_cache:
+            markdown = await asyncio.to_thread(self._lookup_markdown, url, variant)
+            if markdown is not None:
+                return markdown
+
+        markdown = await html_conversion_pool.convert(
+            page.text, url, include_images=include_images, clean_image_urls=clean_image_urls
+        )
+        await asyncio.to_thread(self._store_markdown, url, variant, markdown)
+        return markdown
+
+
+def load_domain_ttls(env_var: str = "HTTP_CACHE_DOMAIN_TTLS") -> Dict[str, int]:
+    """
+    Load the freshness of each domain from a JSON object, e.g. {"baike.baidu.com": 604800}.
+
+    Args:
+        env_var: Environment variable containing the JSON object
+
+    Returns:
+        Dict[str, int]: The TTL in seconds of each domain, empty if the value is invalid
+    """
+    ttls_str = os.environ.get(env_var)
+    if not ttls_str:
+        return {}
+    try:
+        ttls_data = json.loads(ttls_str)
+        if not isinstance(ttls_data, dict):
+            raise ValueError(f"{env_var} must contain a JSON object")
+        return {str(k): int(v) for k, v in ttls_data.items()}
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Invalid {env_var}, using no domain TTLs: {str(e)}")
+        return {}
+
+
+# Create a singleton instance of the HTTP cache
+http_cache = HttpCache(
+    directory=os.environ.get("HTTP_CACHE_DIR", DEFAULT_CACHE_DIR),
+    max_bytes=int(os.environ.get("HTTP_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+    default_ttl=int(os.environ.get("HTTP_CACHE_DEFAULT_TTL", DEFAULT_TTL)),
+    domain_ttls=load_domain_ttls(),
+    max_page_bytes=int(os.environ.get("FETCH_MAX_BYTES", DEFAULT_MAX_PAGE_BYTES)),
+)
@@ -0,0 +1,223 @@
+import asyncio
+import importlib.util
+import logging
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger("http_client_pool")
+
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_CONNECTIONS_PER_HOST = 8
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+
+# Headers describing the transferred body, which no longer apply to a decoded and capped body
+_BODY_TRANSFER_HEADERS = ["content-encoding", "content-length", "transfer-encoding"]
+
+
+class UnsupportedContentTypeError(Exception):
+    """Raised when a response has a content type that the caller does not accept."""
+
+    def __init__(self, url: str, content_type: str):
+        super().__init__(f"{url} returned {content_type} content, which is not supported")
+        self.url = url
+        self.content_type = content_type
+
+
+@dataclass
+class _LoopClient:
+    """The pooled client and per-host limits owned by one event loop."""
+
+    client: httpx.AsyncClient
+    host_semaphores: Dict[str, asyncio.Semaphore] = field(default_factory=dict)
+
+
+class HttpClientPool:
+    """
+    Process-wide pooled HTTP client shared by all the web tools.
+
+    A single `httpx.AsyncClient` keeps connections alive between searches and page
+    fetches, so repeated requests to the same hosts skip DNS, TCP and TLS setup.
+    Connections to one host are additionally limited to `max_connections_per_host`
+    so a burst of fetches on one site does not starve the others.
+
+    httpx clients are bound to the event loop they first run on, so one client is
+    created lazily per running loop.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_connections_per_host: int = DEFAULT_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections: int = DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        http2: bool = True,
+    ):
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._max_connections_per_host = max_connections_per_host
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._http2 = http2 and self._http2_available()
+        self._loop_clients: Dict[asyncio.AbstractEventLoop, _LoopClient] = {}
+
+    @staticmethod
+    def _http2_available() -> bool:
+        if importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 disabled: the h2 package is not installed (pip install httpx[http2])")
+            return False
+        return True
+
+    def _loop_client(self) -> _LoopClient:
+        loop = asyncio.get_running_loop()
+        loop_client = self._loop_clients.get(loop)
+        if loop_client is None or loop_client.client.is_closed:
+            # Drop the clients of loops that have been closed since
+            self._loop_clients = {
+                other_loop: other_client
+                for other_loop, other_client in self._loop_clients.items()
+                if not other_loop.is_closed()
+            }
+            loop_client = _LoopClient(
+                client=httpx.AsyncClient(limits=self._limits, timeout=self._timeout, http2=self._http2)
+            )
+            self._loop_clients[loop] = loop_client
+        return loop_client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Return the pooled client of the running event loop."""
+        return self._loop_client().client
+
+    @asynccontextmanager
+    async def host_slot(self, url: str) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        Hold one of the connection slots of the URL's host.
+
+        Args:
+            url: The URL that is about to be requested
+
+        Yields:
+            httpx.AsyncClient: The pooled client to send the request with
+        """
+        loop_client = self._loop_client()
+        host = urlparse(url).netloc.lower()
+        semaphore = loop_client.host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._max_connections_per_host)
+            loop_client.host_semaphores[host] = semaphore
+        async with semaphore:
+            yield loop_client.client
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request with the pooled client.
+
+        Args:
+            method: The HTTP method
+            url: The URL to request
+            **kwargs: Additional arguments of `httpx.AsyncClient.request` (headers, params, timeout...)
+
+        Returns:
+            httpx.Response: The response, with its body read
+        """
+        async with self.host_slot(url) as client:
+            return await client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a GET request with the pooled client."""
+        return await self.request("GET", url, **kwargs)
+
+    async def head(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a HEAD request with the pooled client."""
+        return await self.request("HEAD", url, **kwargs)
+
+    async def get_capped(
+        self,
+        url: str,
+        max_bytes: int,
+        accepted_content_types: Optional[Sequence[str]] = None,
+        **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        Send a GET request and stream the body, stopping once `max_bytes` have been read.
+
+        The content type is checked from the headers, before any of the body is
+        downloaded. Only the body of successful responses is read.
+
+        Args:
+            url: The URL to request
+            max_bytes: Maximum number of (decoded) body bytes to read
+            accepted_content_types: Content type prefixes to accept, e.g. "text/html"; all if None
+            **kwargs: Additional arguments of `httpx.AsyncClient.stream` (headers, timeout...)
+
+        Returns:
+            httpx.Response: The response with the capped body, its "truncated" extension
+                tells whether the body was cut
+
+        Raises:
+            UnsupportedContentTypeError: If a successful response has a content type that is not accepted
+        """
+        body = bytearray()
+        truncated = False
+        async with self.host_slot(url) as client:
+            async with client.stream("GET", url, **kwargs) as response:
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if (
+                    response.is_success
+                    and accepted_content_types
+                    and content_type
+                    and not content_type.startswith(tuple(accepted_content_types))
+                ):
+                    raise UnsupportedContentTypeError(url, content_type)
+                if response.is_success:
+                    async for chunk in response.aiter_bytes():
+                        body.extend(chunk)
+                        if len(body) >= max_bytes:
+                            truncated = True
+                            del body[max_bytes:]
+                            break
+
+        headers = [
+            (name, value)
+            for name, value in response.headers.multi_items()
+            if name.lower() not in _BODY_TRANSFER_HEADERS
+        ]
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=bytes(body),
+            request=response.request,
+            extensions={"truncated": truncated},
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled client of the running event loop and forget the others."""
+        loop_clients, self._loop_clients = self._loop_clients, {}
+        loop = asyncio.get_running_loop()
+        loop_client: Optional[_LoopClient] = loop_clients.get(loop)
+        if loop_client is not None:
+            await loop_client.client.aclose()
+
+
+# Create a singleton instance of the HTTP client pool
+http_client_pool = HttpClientPool(
+    max_connections=int(os.environ.get("HTTP_POOL_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+    max_connections_per_host=int(os.environ.get("HTTP_POOL_MAX_CONNECTIONS_PER_HOST", DEFAULT_MAX_CONNECTIONS_PER_HOST)),
+    max_keepalive_connections=int(os.environ.get("HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS", DEFAULT_MAX_KEEPALIVE_CONNECTIONS)),
+    keepalive_expiry=float(os.environ.get("HTTP_POOL_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY)),
+    timeout=float(os.environ.get("HTTP_TIMEOUT", DEFAULT_TIMEOUT)),
+    connect_timeout=float(os.environ.get("HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+    http2=os.environ.get("HTTP2_ENABLED", "true").lower() == "true",
+)
@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from agents.tools.http_client import UnsupportedContentTypeError, http_client_pool
+from agents.tools.url_accessiable import extract_urls
+
+logger = logging.getLogger("image_mirror")
+
+# Use the image mirror for the generated lessons
+USE_IMAGE_MIRROR = os.environ.get("USE_IMAGE_MIRROR", "true").lower() == "true"
+
+# The directory must be under public/ to be served by Chainlit
+DEFAULT_MIRROR_DIR = os.path.join("public", "media")
+DEFAULT_MAX_IMAGE_BYTES = 10 * 1024 * 1024
+DEFAULT_THUMBNAIL_MAX_SIZE = 1024
+DEFAULT_DOWNLOAD_CONCURRENCY = 8
+# Images that are not mirrored by then keep their original URL
+DEFAULT_MIRROR_DEADLINE = 30.0
+DEFAULT_THUMBNAIL_WORKERS = min(4, os.cpu_count() or 1)
+
+# Raster images only: a mirrored SVG would be served from the app origin, where its scripts
+# would run, so SVG images keep their original URL
+_CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/bmp": ".bmp",
+}
+
+DOWNLOAD_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+}
+
+
+def make_thumbnail(source_path: str, thumbnail_dir: str, digest: str, max_size: int) -> Optional[str]:
+    """Write a copy of an image bounded to `max_size` pixels on its longest side.
+
+    Runs in the worker pool. Images that are already small enough, animated or in a
+    format Pillow cannot read are served as they are.
+
+    Args:
+        source_path: Path of the downloaded image
+        thumbnail_dir: Directory of the thumbnails
+        digest: The content hash of the image, used as the thumbnail name
+        max_size: Maximum width and height of the thumbnail
+
+    Returns:
+        Optional[str]: Path of the thumbnail, or None to serve the original
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    for extension in (".jpg", ".png"):
+        thumbnail_path = os.path.join(thumbnail_dir, f"{digest}{extension}")
+        if os.path.exists(thumbnail_path):
+            return thumbnail_path
+
+    try:
+        with Image.open(source_path) as image:
+            if getattr(image, "is_animated", False) or max(image.size) <= max_size:
+                return None
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+            has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+            os.makedirs(thumbnail_dir, exist_ok=True)
+            if has_alpha:
+                thumbnail_path = os.path.join(thumbnail_dir, f"{digest}.png")
+                image.save(thumbnail_path + ".tmp", format="PNG", optimize=True)
+            else:
+                thumbnail_path = os.path.join(thumbnail_dir, f"{digest}.jpg")
+                image.convert("RGB").save(thumbnail_path + ".tmp", format="JPEG", quality=85, optimize=True)
+            os.replace(thumbnail_path + ".tmp", thumbnail_path)
+            return thumbnail_path
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        return None
+
+
+class ImageMirror:
+    """
+    Content-addressed local copies of the images embedded in generated lessons.
+
+    Images are downloaded concurrently with the pooled HTTP client and stored under
+    `originals/` by the SHA-256 of their content, so the same image found at several
+    URLs is stored once. Large images get a size-bounded copy under `thumbnails/`,
+    made in a process pool so resizing never blocks the event loop. The markdown is
+    then rewritten to the local copies, and images that cannot be downloaded in time
+    or are not raster images (SVG can carry scripts) keep their original URL.
+    Downloaded URLs are remembered in `index.json`, so an image is only downloaded
+    once across lessons.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_MIRROR_DIR,
+        max_image_bytes: int = DEFAULT_MAX_IMAGE_BYTES,
+        thumbnail_max_size: int = DEFAULT_THUMBNAIL_MAX_SIZE,
+        download_concurrency: int = DEFAULT_DOWNLOAD_CONCURRENCY,
+        deadline: float = DEFAULT_MIRROR_DEADLINE,
+        max_workers: int = DEFAULT_THUMBNAIL_WORKERS,
+    ):
+        self._directory = directory
+        self._originals_dir = os.path.join(directory, "originals")
+        self._thumbnails_dir = os.path.join(directory, "thumbnails")
+        self._index_path = os.path.join(directory, "index.json")
+        self._max_image_bytes = max_image_bytes
+        self._thumbnail_max_size = thumbnail_max_size
+        self._download_concurrency = download_concurrency
+        self._deadline = deadline
+        self._max_workers = max_workers
+        self._executor: Optional[Executor] = None
+        self._index: Optional[Dict[str, str]] = None
+        self._index_lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"Process pool unavailable, making thumbnails in threads: {str(e)}")
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        return self._executor
+
+    def _load_index(self) -> Dict[str, str]:
+        with self._index_lock:
+            if self._index is None:
+                try:
+                    with open(self._index_path, "r", encoding="utf-8") as f:
+                        self._index = json.load(f)
+                except (OSError, ValueError):
+                    self._index = {}
+            return self._index
+
+    def _save_index(self) -> None:
+        with self._index_lock:
+            os.makedirs(self._directory, exist_ok=True)
+            with open(self._index_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self._index, f, ensure_ascii=False)
+            os.replace(self._index_path + ".tmp", self._index_path)
+
+    def _web_path(self, path: str) -> str:
+        return "/" + os.path.relpath(path).replace(os.sep, "/")
+
+    def _local_path(self, web_path: str) -> str:
+        return os.path.join(*web_path.lstrip("/").split("/"))
+
+    def _store(self, content: bytes, extension: str) -> Tuple[str, str]:
+        digest = hashlib.sha256(content).hexdigest()
+        directory = os.path.join(self._originals_dir, digest[:2])
+        path = os.path.join(directory, f"{digest}{extension}")
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+        return digest, path
+
+    async def _thumbnail(self, source_path: str, digest: str) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        args = (source_path, self._thumbnails_dir, digest, self._thumbnail_max_size)
+        try:
+            return await loop.run_in_executor(self._get_executor(), make_thumbnail, *args)
+        except BrokenProcessPool:
+            logger.warning("Thumbnail worker pool broke, restarting it")
+            self.shutdown()
+            return await loop.run_in_executor(self._get_executor(), make_thumbnail, *args)
+
+    async def mirror_image(self, url: str) -> Optional[str]:
+        """
+        Download an image and return the path it is served from locally.
+
+        Args:
+            url: The URL of the image
+
+        Returns:
+            Optional[str]: The local web path of the image (its thumbnail when it is
+                large), or None if it could not be downloaded
+        """
+        index = self._load_index()
+        web_path = index.get(url)
+        if web_path and not web_path.endswith(".svg") and os.path.exists(self._local_path(web_path)):
+            return web_path
+
+        try:
+            response = await http_client_pool.get_capped(
+                url,
+                self._max_image_bytes,
+                accepted_content_types=list(_CONTENT_TYPE_EXTENSIONS),
+                headers=DOWNLOAD_HEADERS,
+                follow_redirects=True,
+            )
+        except (httpx.HTTPError, UnsupportedContentTypeError) as e:
+            logger.info(f"Not mirroring image {url}: {str(e)}")
+            return None
+        if not response.is_success or response.extensions.get("truncated") or not response.content:
+            logger.info(f"Not mirroring image {url}: status {response.status_code}, {len(response.content)} bytes")
+            return None
+
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type not in _CONTENT_TYPE_EXTENSIONS:
+            # Without a raster content type the file could be SVG or HTML, which must not be served locally
+            logger.info(f"Not mirroring image {url}: content type {content_type or 'missing'}")
+            return None
+        digest, path = await asyncio.to_thread(
+            self._store, response.content, _CONTENT_TYPE_EXTENSIONS[content_type]
+        )
+        thumbnail_path = await self._thumbnail(path, digest)
+        web_path = self._web_path(thumbnail_path or path)
+        with self._index_lock:
+            index[url] = web_path
+        return web_path
+
+    async def mirror_markdown(self, markdown: str) -> str:
+        """
+        Mirror the images of a lesson and rewrite the markdown to the local copies.
+
+        Args:
+            markdown: The markdown of the lesson
+
+        Returns:
+            str: The markdown with the mirrored image URLs replaced by local paths
+        """
+        urls: List[str] = [url for url, kind in extract_urls(markdown).items() if kind == "image"]
+        if not urls:
+            return markdown
+
+        semaphore = asyncio.Semaphore(self._download_concurrency)
+
+        async def mirror(url: str) -> Optional[str]:
+            async with semaphore:
+                return await self.mirror_image(url)
+
+        tasks = {asyncio.create_task(mirror(url)): url for url in urls}
+        done, pending = await asyncio.wait(tasks, timeout=self._deadline)
+        for task in pending:
+            task.cancel()
+
+        replacements: Dict[str, str] = {}
+        for task in done:
+            if task.exception() is not None:
+                logger.warning(f"Error mirroring image {tasks[task]}: {str(task.exception())}")
+            elif task.result():
+                replacements[tasks[task]] = task.result()
+        logger.info(f"Mirrored {len(replacements)} of {len(urls)} images ({len(pending)} timed out)")
+        if not replacements:
+            return markdown
+
+        try:
+            await asyncio.to_thread(self._save_index)
+        except OSError as e:
+            logger.warning(f"Failed to save the image mirror index: {str(e)}")
+
+        # Longest first, and only whole URLs, so a URL is never replaced inside a longer one
+        pattern = re.compile(
+            "(?:" + "|".join(re.escape(url) for url in sorted(replacements, key=len, reverse=True)) + r")(?=[\s)\]\"'>]|$)"
+        )
+        return pattern.sub(lambda match: replacements[match.group(0)], markdown)
+
+    def shutdown(self) -> None:
+        """Stop the thumbnail worker pool, it is started again on the next image."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Create a singleton instance of the image mirror
+image_mirror = ImageMirror(
+    directory=os.environ.get("IMAGE_MIRROR_DIR", DEFAULT_MIRROR_DIR),
+    max_image_bytes=int(os.environ.get("IMAGE_MIRROR_MAX_BYTES", DEFAULT_MAX_IMAGE_BYTES)),
+    thumbnail_max_size=int(os.environ.get("IMAGE_THUMBNAIL_MAX_SIZE", DEFAULT_THUMBNAIL_MAX_SIZE)),
+    download_concurrency=int(os.environ.get("IMAGE_MIRROR_CONCURRENCY", DEFAULT_DOWNLOAD_CONCURRENCY)),
+    deadline=float(os.environ.get("IMAGE_MIRROR_DEADLINE", DEFAULT_MIRROR_DEADLINE)),
+    max_workers=int(os.environ.get("IMAGE_THUMBNAIL_WORKERS", DEFAULT_THUMBNAIL_WORKERS)),
+)
@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from agents.tools.passage_extraction import extract_passages, tokenize
+
+logger = logging.getLogger("local_search")
+
+# Query the local index before Bing, and index the pages fetched from Bing results
+USE_LOCAL_SEARCH = os.environ.get("USE_LOCAL_SEARCH", "true").lower() == "true"
+
+DEFAULT_INDEX_PATH = os.path.join(".cache", "local_search.sqlite3")
+DEFAULT_CORPUS_DIR = "corpus"
+# Fraction of the query terms a document must contain to count as a hit
+DEFAULT_MIN_COVERAGE = 0.8
+# Number of full-text candidates whose query coverage is checked
+CANDIDATE_LIMIT = 50
+CORPUS_EXTENSIONS = (".md", ".markdown", ".txt")
+SNIPPET_LENGTH = 200
+# Fetched pages older than this are no longer returned and are dropped, so they are fetched again
+DEFAULT_PAGE_TTL = 7 * 24 * 60 * 60
+# Maximum number of fetched pages kept in the index, the curated corpus is not counted
+DEFAULT_MAX_PAGES = 5000
+# Added to curated corpus results, whose `local://corpus/` links can't be fetched or cited
+CORPUS_RESULT_NOTE = (
+    "Curated local document: its relevant content is included above. "
+    "Its link can't be opened with fetch_webpage and must not be cited as a source."
+)
+
+_HEADING_PATTERN = re.compile(r"^\s*#{1,6}\s+(.+)$", re.MULTILINE)
+
+
+def _title_of(markdown: str, fallback: str) -> str:
+    match = _HEADING_PATTERN.search(markdown)
+    return match.group(1).strip() if match else fallback
+
+
+class LocalSearchIndex:
+    """
+    Local full-text search over curated teaching content and previously fetched pages.
+
+    Documents are stored in SQLite with an FTS5 index. Chinese has no spaces between
+    words, so documents and queries are indexed with the same tokenizer as the passage
+    ranking of bing_search (CJK character bigrams and lowercase words), and FTS5 only
+    sees space separated terms. Candidates are ranked with FTS5's bm25() and only
+    documents containing at least `min_coverage` of the query terms are returned, so a
+    miss falls back to the web search instead of returning loosely related pages.
+
+    Fetched pages expire after `page_ttl` seconds, so stale copies are fetched again
+    from the web, and only the `max_pages` most recent ones are kept. The curated
+    corpus never expires.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_INDEX_PATH,
+        min_coverage: float = DEFAULT_MIN_COVERAGE,
+        page_ttl: float = DEFAULT_PAGE_TTL,
+        max_pages: int = DEFAULT_MAX_PAGES,
+    ):
+        self._path = path
+        self._min_coverage = min_coverage
+        self._page_ttl = page_ttl
+        self._max_pages = max_pages
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._available: Optional[bool] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self._path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT UNIQUE NOT NULL,
+                    title TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS documents_source ON documents (source, updated_at)")
+            connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(terms)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    @property
+    def available(self) -> bool:
+        """Return whether the index can be opened and SQLite supports FTS5, it is disabled otherwise."""
+        if self._available is None:
+            try:
+                with self._lock:
+                    self._connect()
+                self._available = True
+            except (sqlite3.Error, OSError) as e:
+                # e.g. no FTS5, or a read-only working directory
+                logger.warning(f"Local search disabled: {str(e)}")
+                self._available = False
+        return self._available
+
+    async def _check_available(self) -> bool:
+        if self._available is None:
+            # The first connection creates the database, off the event loop
+            return await asyncio.to_thread(lambda: self.available)
+        return self._available
+
+    def _add(self, url: str, title: str, content: str, source: str) -> None:
+        terms = " ".join(tokenize(f"{title}\n{content}"))
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT id FROM documents WHERE url = ?", (url,)).fetchone()
+            if row is not None:
+                connection.execute("DELETE FROM documents_fts WHERE rowid = ?", (row[0],))
+                connection.execute(
+                    "UPDATE documents SET title = ?, content = ?, source = ?, updated_at = ? WHERE id = ?",
+                    (title, content, source, time.time(), row[0]),
+                )
+                document_id = row[0]
+            else:
+                document_id = connection.execute(
+                    "INSERT INTO documents (url, title, content, source, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (url, title, content, source, time.time()),
+                ).lastrowid
+            connection.execute("INSERT INTO documents_fts (rowid, terms) VALUES (?, ?)", (document_id, terms))
+            if source == "fetched":
+                self._evict(connection)
+            connection.commit()
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """Remove the expired fetched pages and the oldest ones beyond `max_pages`."""
+        expired = [
+            row[0]
+            for row in connection.execute(
+                """SELECT id FROM documents WHERE source = 'fetched' AND (updated_at < ? OR id NOT IN (
+                    SELECT id FROM documents WHERE source = 'fetched' ORDER BY updated_at DESC LIMIT ?
+                ))""",
+                (time.time() - self._page_ttl, self._max_pages),
+            )
+        ]
+        for start in range(0, len(expired), 500):
+            batch = expired[start : start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            connection.execute(f"DELETE FROM documents_fts WHERE rowid IN ({placeholders})", batch)
+            connection.execute(f"DELETE FROM documents WHERE id IN ({placeholders})", batch)
+        if expired:
+            logger.info(f"Removed {len(expired)} expired pages from the local index")
+
+    def _search(self, query: str, num_results: int) -> List[Dict[str, str]]:
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in query_terms)
+        with self._lock:
+            rows = self._connect().execute(
+                """SELECT documents.url, documents.title, documents.content, documents.source, documents_fts.terms
+                FROM documents_fts JOIN documents ON documents.id = documents_fts.rowid
+                WHERE documents_fts MATCH ? AND (documents.source != 'fetched' OR documents.updated_at >= ?)
+                ORDER BY bm25(documents_fts) LIMIT ?""",
+                (match, time.time() - self._page_ttl, CANDIDATE_LIMIT),
+            ).fetchall()
+
+        results = []
+        for url, title, content, source, terms in rows:
+            coverage = len(query_terms.intersection(terms.split())) / len(query_terms)
+            if coverage >= self._min_coverage:
+                results.append({"title": title, "link": url, "content": content, "source": source})
+            if len(results) >= num_results:
+                break
+        return results
+
+    def index_corpus(self, directory: str = DEFAULT_CORPUS_DIR) -> int:
+        """
+        Index the markdown and text files of a curated corpus directory.
+
+        Files are indexed with a `local://corpus/<path>` link and are re-indexed when
+        they have changed since they were last indexed. The link only identifies the
+        file: search results of the corpus carry a note that it can't be fetched.
+
+        Args:
+            directory: The corpus directory
+
+        Returns:
+            int: The number of files indexed
+        """
+        if not self.available:
+            return 0
+        indexed = 0
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                if not name.lower().endswith(CORPUS_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                url = f"local://corpus/{os.path.relpath(path, directory).replace(os.sep, '/')}"
+                with self._lock:
+                    row = self._connect().execute(
+                        "SELECT updated_at FROM documents WHERE url = ?", (url,)
+                    ).fetchone()
+                if row is not None and row[0] >= os.path.getmtime(path):
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                self._add(url, _title_of(content, os.path.splitext(name)[0]), content, "corpus")
+                indexed += 1
+        logger.info(f"Indexed {indexed} corpus files from {directory}")
+        return indexed
+
+    async def add_page(self, url: str, markdown: str, title: Optional[str] = None) -> None:
+        """
+        Add a fetched page to the index, replacing an earlier version of it.
+
+        Args:
+            url: The URL of the page
+            markdown: The content of the page in markdown
+            title: The title of the page, the first heading is used if not given
+        """
+        if not markdown.strip() or not await self._check_available():
+            return
+        try:
+            await asyncio.to_thread(self._add, url, title or _title_of(markdown, url), markdown, "fetched")
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to index page {url}: {str(e)}")
+
+    async def search(
+        self,
+        query: str,
+        num_results: int,
+        include_snippets: bool = True,
+        include_content: bool = True,
+        content_token_budget: int = 1500,
+    ) -> List[Dict[str, str]]:
+        """
+        Search the index, returning results in the same format as bing_search.
+
+        Results of the curated corpus have a `note` telling that their link can't be
+        fetched or cited, their content being the relevant passages of the file.
+
+        Args:
+            query: Search query string
+            num_results: Maximum number of results
+            include_snippets: Include a snippet of the most relevant passage
+            include_content: Include the passages most relevant to the query
+            content_token_budget: Token budget of the content of each result
+
+        Returns:
+            List[Dict[str, str]]: The results, best first
+        """
+        if not await self._check_available():
+            return []
+        try:
+            documents = await asyncio.to_thread(self._search, query, num_results)
+        except sqlite3.Error as e:
+            logger.warning(f"Local search failed for {query}: {str(e)}")
+            return []
+
+        results = []
+        for document in documents:
+            passages = extract_passages(document["content"], query, token_budget=content_token_budget)
+            result = {"title": document["title"], "link": document["link"]}
+            if include_snippets:
+                result["snippet"] = passages[:SNIPPET_LENGTH]
+            if include_content:
+                result["content"] = passages
+            if document["source"] == "corpus":
+                result["note"] = CORPUS_RESULT_NOTE
+            results.append(result)
+        return results
+
+
+# Create a singleton instance of the local search index
+local_search_index = LocalSearchIndex(
+    path=os.environ.get("LOCAL_SEARCH_INDEX_PATH", DEFAULT_INDEX_PATH),
+    min_coverage=float(os.environ.get("LOCAL_SEARCH_MIN_COVERAGE", DEFAULT_MIN_COVERAGE)),
+    page_ttl=float(os.environ.get("LOCAL_SEARCH_PAGE_TTL", DEFAULT_PAGE_TTL)),
+    max_pages=int(os.environ.get("LOCAL_SEARCH_MAX_PAGES", DEFAULT_MAX_PAGES)),
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local search index from a curated corpus.")
+    parser.add_argument("directory", nargs="?", default=os.environ.get("LOCAL_SEARCH_CORPUS_DIR", DEFAULT_CORPUS_DIR))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    print(f"Indexed {local_search_index.index_corpus(args.directory)} files")
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from agents.tools.url_accessiable import check_url
+
+logger = logging.getLogger("media_pipeline")
+
+MEDIA_VERIFICATION_CONCURRENCY = 8
+
+# Query parameters that only resize, re-encode or track a media URL, ignored when deduping
+IGNORED_QUERY_PARAMETERS = {"w", "h", "width", "height", "size", "quality", "format", "fm", "fit", "crop", "dpr", "auto", "x-oss-process", "imageview2", "imagemogr2"}
+
+# Video sites whose watch pages are HTML but play in the browser, accepted as video links
+VIDEO_PAGE_HOSTS = [
+    "bilibili.com",
+    "youtube.com",
+    "youtu.be",
+    "ixigua.com",
+    "haokan.baidu.com",
+    "v.qq.com",
+    "youku.com",
+    "iqiyi.com",
+    "douyin.com",
+]
+
+
+class MediaRegistry:
+    """The media URLs already handed to the agents during one team run."""
+
+    def __init__(self):
+        self._keys: Set[str] = set()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def add(self, key: str) -> None:
+        self._keys.add(key)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+_current_media_registry: ContextVar[Optional[MediaRegistry]] = ContextVar("current_media_registry", default=None)
+
+
+@asynccontextmanager
+async def media_run_scope() -> AsyncIterator[MediaRegistry]:
+    """
+    Dedupe media across a whole team run.
+
+    Every tool call made by the agents while the scope is active (including from the
+    tasks the run starts) shares the same registry, so an image or video returned once
+    is not returned again to another agent or in a later turn.
+
+    Yields:
+        MediaRegistry: The registry of the run
+    """
+    registry = MediaRegistry()
+    token = _current_media_registry.set(registry)
+    try:
+        yield registry
+    finally:
+        _current_media_registry.reset(token)
+
+
+def normalize_media_url(url: str) -> str:
+    """Return the dedupe key of a media URL.
+
+    The scheme, case of the host, default ports, fragment, order of the query
+    parameters and the resizing and tracking parameters are ignored, so the same image
+    served in another size or over http and https is recognized as a duplicate.
+
+    Args:
+        url: The media URL
+
+    Returns:
+        str: The normalized URL
+    """
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    if parsed.port and parsed.port not in (80, 443):
+        host = f"{host}:{parsed.port}"
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if name.lower() not in IGNORED_QUERY_PARAMETERS and not name.lower().startswith("utm_")
+    )
+    key = f"{host}{parsed.path.rstrip('/')}"
+    return f"{key}?{urlencode(query)}" if query else key
+
+
+def _expected_kind(url: str, response_filter: str) -> str:
+    if response_filter == "images":
+        return "image"
+    host = (urlparse(url).hostname or "").lower()
+    if any(host == video_host or host.endswith(f".{video_host}") for video_host in VIDEO_PAGE_HOSTS):
+        return "any"
+    return "video"
+
+
+async def verify_media_results(
+    results: List[Dict[str, str]], response_filter: str, num_results: int
+) -> List[Dict[str, str]]:
+    """
+    Keep only the image or video results that are unique and verified.
+
+    Results are deduped by normalized URL within the call and against the media
+    already returned during the current run. The remaining links are checked
+    concurrently: an image must return an image content type and a video a video
+    content type, or be a page of a known video site. Checks are cached. Only the
+    `num_results` results returned are registered as used, so the other verified
+    results of the over-fetched list stay available to later searches.
+
+    Args:
+        results: The image or video results of bing_search, in rank order
+        response_filter: "images" or "videos"
+        num_results: Maximum number of results to return
+
+    Returns:
+        List[Dict[str, str]]: At most `num_results` verified unique results, in rank order
+    """
+    registry = _current_media_registry.get()
+    candidates = []
+    seen_keys: Set[str] = set()
+    for result in results:
+        link = result.get("link", "")
+        key = normalize_media_url(link)
+        if not link or key in seen_keys or (registry is not None and key in registry):
+            continue
+        seen_keys.add(key)
+        candidates.append((key, result))
+
+    semaphore = asyncio.Semaphore(MEDIA_VERIFICATION_CONCURRENCY)
+
+    async def verify(result: Dict[str, str]) -> bool:
+        async with semaphore:
+            check = await check_url(result["link"], _expected_kind(result["link"], response_filter))
+        return check["accessible"]
+
+    verified = await asyncio.gather(*(verify(result) for _, result in candidates))
+
+    accepted = []
+    for (key, result), ok in zip(candidates, verified):
+        if not ok:
+            continue
+        if len(accepted) >= num_results:
+            break
+        if registry is not None:
+            # Checked again here as concurrent calls of the same run may have added it meanwhile
+            if key in registry:
+                continue
+            registry.add(key)
+        accepted.append(result)
+
+    logger.info(
+        f"Media pipeline kept {len(accepted)} of {len(results)} {response_filter} results "
+        f"({len(results) - len(candidates)} duplicates, {verified.count(False)} unverified)"
+    )
+    return accepted
@@ -0,0 +1,146 @@
+import math
+import re
+from collections import Counter
+from typing import List
+
+from agents.context.token_counter import count_text_tokens
+
+# CJK ideographs are indexed as overlapping character bigrams, which works as a
+# dictionary-free segmentation for Chinese; other scripts are indexed by word.
+_CJK_RUN_PATTERN = re.compile(r"[㐀-䶿一-鿿]+")
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+CHUNK_MAX_CHARS = 600
+CHUNK_MERGE_CHARS = 100
+PASSAGE_SEPARATOR = "\n\n...\n\n"
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into BM25 terms: CJK character bigrams and lowercase words.
+
+    Args:
+        text: The text to tokenize
+
+    Returns:
+        List[str]: The terms of the text
+    """
+    text = text.lower()
+    terms: List[str] = []
+    for run in _CJK_RUN_PATTERN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    terms.extend(_WORD_PATTERN.findall(_CJK_RUN_PATTERN.sub(" ", text)))
+    return terms
+
+
+def chunk_markdown(markdown: str, max_chars: int = CHUNK_MAX_CHARS) -> List[str]:
+    """Split page markdown into passages of at most about max_chars characters.
+
+    Paragraphs are kept whole where possible, and runs of short paragraphs (menus,
+    link lists, headings) are merged together.
+
+    Args:
+        markdown: The page content in markdown
+        max_chars: Target maximum size of a passage
+
+    Returns:
+        List[str]: The passages in document order
+    """
+    chunks: List[str] = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", markdown):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) >= CHUNK_MERGE_CHARS:
+            # Long paragraphs stand on their own so relevant text is not diluted by its neighbours
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(paragraph[start:start + max_chars] for start in range(0, len(paragraph), max_chars))
+        elif current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def rank_passages(passages: List[str], query: str, k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Score passages against a query with BM25.
+
+    Args:
+        passages: The passages to score
+        query: The search query
+        k1: BM25 term frequency saturation
+        b: BM25 length normalisation
+
+    Returns:
+        List[float]: The score of each passage, in the same order
+    """
+    query_terms = set(tokenize(query))
+    passage_terms = [Counter(tokenize(passage)) for passage in passages]
+    if not passages or not query_terms:
+        return [0.0] * len(passages)
+
+    lengths = [sum(terms.values()) for terms in passage_terms]
+    avg_length = sum(lengths) / len(lengths) or 1.0
+    document_frequency = {term: sum(1 for terms in passage_terms if term in terms) for term in query_terms}
+
+    scores = []
+    for terms, length in zip(passage_terms, lengths):
+        score = 0.0
+        for term in query_terms:
+            frequency = terms.get(term, 0)
+            if not frequency:
+                continue
+            df = document_frequency[term]
+            idf = math.log(1 + (len(passages) - df + 0.5) / (df + 0.5))
+            score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / avg_length))
+        scores.append(score)
+    return scores
+
+
+def extract_passages(markdown: str, query: str, token_budget: int) -> str:
+    """Return the passages of a page most relevant to the query within a token budget.
+
+    The page is chunked, the chunks are ranked with BM25 against the query, and the best
+    chunks are kept until the token budget is spent. The kept passages are returned in
+    document order so the text still reads naturally.
+
+    Args:
+        markdown: The page content in markdown
+        query: The search query
+        token_budget: Maximum number of tokens of the returned passages
+
+    Returns:
+        str: The selected passages joined with a separator
+    """
+    passages = chunk_markdown(markdown)
+    if not passages:
+        return ""
+
+    scores = rank_passages(passages, query)
+    ranked = sorted(range(len(passages)), key=lambda index: scores[index], reverse=True)
+    if scores[ranked[0]] > 0:
+        # Passages sharing no term with the query are boilerplate for this search
+        ranked = [index for index in ranked if scores[index] > 0]
+
+    selected = []
+    used_tokens = 0
+    for index in ranked:
+        tokens = count_text_tokens(passages[index])
+        if used_tokens + tokens > token_budget:
+            if selected:
+                continue
+            # Always return something, even if the best passage alone is over budget
+        selected.append(index)
+        used_tokens += tokens
+        if used_tokens >= token_budget:
+            break
+
+    return PASSAGE_SEPARATOR.join(passages[index] for index in sorted(selected))
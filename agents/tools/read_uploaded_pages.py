@@ -0,0 +1,48 @@
+import asyncio
+
+import chainlit as cl
+from autogen_core.tools import FunctionTool
+
+from agents.file_processor.pdf_ingestion import uploaded_documents
+
+# Maximum number of pages returned by one call
+MAX_PAGES_PER_READ = 20
+# Maximum number of seconds to wait for pages that are still being extracted
+READ_TIMEOUT = 120
+
+
+@cl.step(type="tool", name="read_uploaded_pages")
+async def read_uploaded_pages(document_id: str, start_page: int, end_page: int) -> str:
+    """Read pages of an uploaded document, waiting for them if they are still being extracted.
+
+    Args:
+        document_id: The ID of the uploaded document, given with its first pages
+        start_page: The first page to read, starting at 1
+        end_page: The last page to read, included
+
+    Returns:
+        str: The markdown of the pages
+    """
+    document = uploaded_documents.get(document_id)
+    if document is None:
+        return f"Error: unknown document ID {document_id}"
+    if start_page < 1 or start_page > document.page_count or end_page < start_page:
+        return f"Error: invalid page range, {document.name} has pages 1 to {document.page_count}"
+
+    end_page = min(end_page, document.page_count, start_page + MAX_PAGES_PER_READ - 1)
+    try:
+        pages = await asyncio.wait_for(document.read_pages(start_page, end_page), timeout=READ_TIMEOUT)
+    except asyncio.TimeoutError:
+        return f"Error: pages {start_page}-{end_page} of {document.name} are still being extracted, try again later"
+    return f"{document.name}, pages {start_page}-{end_page} of {document.page_count}\n\n{pages}"
+
+
+read_uploaded_pages_tool = FunctionTool(
+    read_uploaded_pages,
+    name="ReadUploadedPagesTool",
+    description=f"Read the pages of an uploaded document that were not included in the conversation, at most {MAX_PAGES_PER_READ} pages per call.",
+    global_imports=[
+        "asyncio",
+        {"module": "agents.file_processor.pdf_ingestion", "imports": ["uploaded_documents"]},
+    ],
+)
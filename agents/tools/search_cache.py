@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Mapping, Tuple
+
+logger = logging.getLogger("search_cache")
+
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+
+# Punctuation and symbols that do not change what a search engine returns
+_QUERY_NOISE_PATTERN = re.compile(r"[\s\"'“”‘’《》「」『』,，.。!！?？:：;；、()（）\[\]]+")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so near-identical queries share a cache entry.
+
+    Full-width characters are folded, case is ignored, and whitespace and punctuation
+    (quotes, book title marks, commas...) are collapsed to single spaces.
+
+    Args:
+        query: The search query
+
+    Returns:
+        str: The normalized query
+    """
+    query = unicodedata.normalize("NFKC", query).lower()
+    return _QUERY_NOISE_PATTERN.sub(" ", query).strip()
+
+
+class SearchCache:
+    """
+    In-process cache of search API responses with single-flight coalescing.
+
+    Entries are keyed by the normalized query and the search parameters (market,
+    filter, count...) and expire after `ttl_seconds`. When the same search is issued
+    again while the first request is still in flight, the callers share that request
+    instead of sending another one, so duplicate searches cost neither latency nor quota.
+    Failed searches are not cached.
+    """
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    @staticmethod
+    def make_key(params: Mapping[str, Any]) -> str:
+        """
+        Build the cache key of a search.
+
+        Args:
+            params: The search API parameters, the query is read from "q"
+
+        Returns:
+            str: The cache key
+        """
+        normalized = {key: str(value).lower() for key, value in params.items() if key != "q"}
+        normalized["q"] = normalize_query(str(params.get("q", "")))
+        return json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+    def _get_fresh(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _put(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.time() + self._ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached response of a search, or fetch it once for all concurrent callers.
+
+        Args:
+            key: The cache key from make_key()
+            fetch: Coroutine function sending the search request
+
+        Returns:
+            Any: The search response
+        """
+        found, value = self._get_fresh(key)
+        if found:
+            self._hits += 1
+            return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._coalesced += 1
+        else:
+            self._misses += 1
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+
+            def on_done(done: asyncio.Task) -> None:
+                self._in_flight.pop(key, None)
+                if not done.cancelled() and done.exception() is None:
+                    self._put(key, done.result())
+
+            task.add_done_callback(on_done)
+
+        # A caller that is cancelled must not cancel the request shared with the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache counters."""
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+        }
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        self._entries.clear()
+
+
+# Create a singleton instance of the search cache
+search_cache = SearchCache(
+    ttl_seconds=int(os.environ.get("SEARCH_CACHE_TTL", DEFAULT_TTL)),
+    max_entries=int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+)
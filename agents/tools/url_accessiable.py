@@ -1,7 +1,8 @@
 import asyncio
 import json
 import os
-from typing import Dict, List, Optional
+import re
+from typing import Any, Dict, List, Optional
 from urllib.parse import urljoin, urlparse
 
 import chainlit as cl
@@ -10,6 +11,28 @@ import httpx
 from autogen_core.tools import FunctionTool
 from bs4 import BeautifulSoup
 
+from agents.tools.http_client import http_client_pool
+from agents.tools.search_cache import SearchCache
+
+URL_VALIDATION_TIMEOUT = 5
+URL_VALIDATION_CONCURRENCY = 16
+URL_VALIDATION_CACHE_TTL = 30 * 60
+
+# Status codes of servers that do not support HEAD, retried with a one byte ranged GET
+HEAD_UNSUPPORTED_STATUS_CODES = [400, 403, 405, 501]
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".svg")
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".ogg", ".ogv", ".mov", ".m4v", ".m3u8")
+VIDEO_CONTENT_TYPES = ("video/", "application/vnd.apple.mpegurl", "application/x-mpegurl")
+
+_MARKDOWN_IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)>?")
+_MARKDOWN_LINK_PATTERN = re.compile(r"(?<!!)\[[^\]]*\]\(\s*<?([^)\s>]+)>?")
+_HTML_MEDIA_PATTERN = re.compile(r"<(img|video|source)\b[^>]*?\bsrc=[\"']([^\"']+)[\"']", re.IGNORECASE)
+_BARE_URL_PATTERN = re.compile(r"https?://[^\s<>()\[\]\"']+")
+
+# Validation results are cached per URL and expected kind
+url_validation_cache = SearchCache(ttl_seconds=URL_VALIDATION_CACHE_TTL)
+
 
 def clean_url(url: str) -> str:
     """Clean URL by removing query parameters.
@@ -26,7 +49,7 @@ def clean_url(url: str) -> str:
 
 
 @cl.step(type="tool", name="is_url_accessible")
-def is_url_accessible_with_chainlit(url: str) -> bool:
+async def is_url_accessible_with_chainlit(url: str) -> bool:
     """Check if a URL is accessible with Chainlit context.
 
     Args:
@@ -36,13 +59,13 @@ def is_url_accessible_with_chainlit(url: str) -> bool:
         bool: True if the URL is accessible, False otherwise.
     """
     try:
-        response = httpx.head(clean_url(url), timeout=5)
+        response = await http_client_pool.head(clean_url(url), timeout=5)
         return response.status_code == 200
     except Exception:
         return False
 
 
-def is_url_accessible(url: str) -> bool:
+async def is_url_accessible(url: str) -> bool:
     """Check if a URL is accessible without Chainlit context.
 
     Args:
@@ -52,7 +75,7 @@ def is_url_accessible(url: str) -> bool:
         bool: True if the URL is accessible, False otherwise.
     """
     try:
-        response = httpx.head(clean_url(url), timeout=5)
+        response = await http_client_pool.head(clean_url(url), timeout=5)
         return response.status_code == 200
     except Exception:
         return False
@@ -64,5 +87,153 @@ url_accessible_valid_tool = FunctionTool(
     description="A tool that validates the url is accessible and valid.",
     global_imports=[
         "httpx",
+        {"module": "agents.tools.http_client", "imports": ["http_client_pool"]},
+    ],
+)
+
+
+def _kind_from_extension(url: str) -> str:
+    path = urlparse(url).path.lower()
+    if path.endswith(IMAGE_EXTENSIONS):
+        return "image"
+    if path.endswith(VIDEO_EXTENSIONS):
+        return "video"
+    return "any"
+
+
+def extract_urls(markdown: str) -> Dict[str, str]:
+    """Extract the URLs of a markdown document with the kind of content they should point to.
+
+    Args:
+        markdown: The markdown document
+
+    Returns:
+        Dict[str, str]: The URLs in document order, mapped to "image", "video" or "any"
+    """
+    found = []
+    for match in _MARKDOWN_IMAGE_PATTERN.finditer(markdown):
+        found.append((match.start(), match.group(1), "image"))
+    for match in _MARKDOWN_LINK_PATTERN.finditer(markdown):
+        found.append((match.start(), match.group(1), _kind_from_extension(match.group(1))))
+    for match in _HTML_MEDIA_PATTERN.finditer(markdown):
+        kind = "image" if match.group(1).lower() == "img" else "video"
+        found.append((match.start(), match.group(2), kind))
+    for match in _BARE_URL_PATTERN.finditer(markdown):
+        found.append((match.start(), match.group(0).rstrip(".,;:!?，。；：！？"), None))
+
+    urls: Dict[str, str] = {}
+    for _, url, kind in sorted(found, key=lambda item: item[0]):
+        if not url.startswith(("http://", "https://")):
+            continue
+        if kind is not None:
+            urls[url] = kind if urls.get(url, "any") == "any" else urls[url]
+        elif url not in urls:
+            # Bare URLs are also matched inside the markdown links above
+            urls[url] = _kind_from_extension(url)
+    return urls
+
+
+def _content_type_matches(kind: str, content_type: str) -> bool:
+    if kind == "image":
+        return content_type.startswith("image/")
+    if kind == "video":
+        return content_type.startswith(VIDEO_CONTENT_TYPES)
+    return True
+
+
+async def _check_url(url: str, kind: str) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"url": url, "kind": kind, "accessible": False}
+    try:
+        response = await http_client_pool.head(url, timeout=URL_VALIDATION_TIMEOUT, follow_redirects=True)
+        if response.status_code in HEAD_UNSUPPORTED_STATUS_CODES:
+            # Only the headers are needed, the body of the ranged GET is never read
+            async with http_client_pool.host_slot(url) as client:
+                async with client.stream(
+                    "GET",
+                    url,
+                    headers={"Range": "bytes=0-0"},
+                    timeout=URL_VALIDATION_TIMEOUT,
+                    follow_redirects=True,
+                ) as response:
+                    pass
+    except Exception as e:
+        result["reason"] = f"request failed: {type(e).__name__}"
+        return result
+
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    result["status"] = response.status_code
+    result["content_type"] = content_type
+    if response.status_code not in (200, 206):
+        result["reason"] = f"HTTP status {response.status_code}"
+    elif not _content_type_matches(kind, content_type):
+        result["reason"] = f"expected {'an image' if kind == 'image' else 'a video'} but got {content_type or 'no content type'}"
+    else:
+        result["accessible"] = True
+    return result
+
+
+async def check_url(url: str, kind: str = "any") -> Dict[str, Any]:
+    """Check that a URL is accessible and points to the expected content, using the result cache.
+
+    Args:
+        url: The URL to check
+        kind: Expected content: "image", "video" or "any"
+
+    Returns:
+        Dict[str, Any]: The check result with "accessible", "status", "content_type" and the "reason" of the failure
+    """
+    return await url_validation_cache.get_or_fetch(f"{kind} {url}", lambda: _check_url(url, kind))
+
+
+@cl.step(type="tool", name="validate_urls")
+async def validate_urls(
+    urls: Optional[List[str]] = None,
+    markdown: Optional[str] = None,
+    expect: str = "auto",
+) -> List[Dict[str, Any]]:
+    """Check many URLs at once, concurrently, and verify they point to the expected content.
+
+    Args:
+        urls: The URLs to check
+        markdown: A markdown document whose image, video and link URLs are checked
+        expect: Expected content of the `urls`: "image", "video", "any", or "auto" to infer it from the extension.
+            Markdown images are always expected to be images.
+
+    Returns:
+        List[Dict[str, Any]]: One result per unique URL with "accessible", "status", "content_type"
+            and the "reason" of the failure
+    """
+    valid_expects = ["auto", "image", "video", "any"]
+    if expect not in valid_expects:
+        raise ValueError(f"Invalid expect value. Must be one of: {', '.join(valid_expects)}")
+
+    targets = extract_urls(markdown) if markdown else {}
+    for url in urls or []:
+        url = url.strip()
+        if url and url not in targets:
+            targets[url] = _kind_from_extension(url) if expect == "auto" else expect
+
+    semaphore = asyncio.Semaphore(URL_VALIDATION_CONCURRENCY)
+
+    async def check(url: str, kind: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await check_url(url, kind)
+
+    results = await asyncio.gather(*(check(url, kind) for url, kind in targets.items()))
+    return [dict(result) for result in results]
+
+
+url_batch_validator_tool = FunctionTool(
+    validate_urls,
+    name="urlBatchValidatorTool",
+    description=(
+        "Validate many image, video and webpage URLs in one call. Pass a list of URLs, or the whole markdown "
+        "content to check every embedded URL. Returns for each URL whether it is accessible and points to the "
+        "expected content (an image URL must return an image, a video URL must return a video, not a webpage)."
+    ),
+    global_imports=[
+        "asyncio",
+        {"module": "typing", "imports": ["Any", "Dict", "List", "Optional"]},
+        {"module": "agents.tools.http_client", "imports": ["http_client_pool"]},
     ],
 )
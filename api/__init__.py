@@ -0,0 +1,19 @@
+"""
+Lesson API.
+
+This module provides a headless HTTP entry point for lesson generation. It runs the agent
+teams directly and streams their output as Server-Sent Events, for machine-to-machine
+clients such as an LMS. The Chainlit app mounts it under /api with `mount_lesson_api`.
+"""
+
+from .lessonApi import (
+    LessonApi,
+    create_api_app,
+    mount_lesson_api,
+)
+
+__all__ = [
+    "LessonApi",
+    "create_api_app",
+    "mount_lesson_api",
+]
@@ -0,0 +1,340 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import shutil
+import tempfile
+import traceback
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import (
+    BaseChatMessage,
+    ModelClientStreamingChunkEvent,
+    StopMessage,
+    TextMessage,
+)
+from autogen_core import CancellationToken
+from chainlit.context import init_http_context
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from agents.catch_up_and_explore_by_AI.catch_up_and_explore_by_AI_agents import (
+    create_catch_up_team,
+)
+from agents.file_processor.condensation import USE_UPLOAD_CONDENSATION, UploadedDocument, upload_condenser
+from agents.file_processor.uploads import MAX_UPLOAD_MB, convert_upload
+from agents.open_topic_class_generation.open_topic_class_generation_agents import (
+    create_team,
+)
+from agents.tools.image_mirror import USE_IMAGE_MIRROR, image_mirror
+from agents.tools.media_pipeline import media_run_scope
+from config import CATCH_UP_AND_EXPLORE_BY_AI_AGENT, OPEN_TOPIC_CLASS_GENERATION_AGENT, TEAM_RUN_TIERS
+from lessonRun import cancellable_stream, save_lesson_artifacts
+from scheduler import team_run_scheduler
+
+logger = logging.getLogger("lesson_api")
+
+# Team of each `team` request field, with the formatter agent whose output is the lesson
+# itself, streamed as final tokens; requests with uploads default to the catch-up team
+TEAMS = {
+    "open_topic": (OPEN_TOPIC_CLASS_GENERATION_AGENT, create_team, "markdwon_content_formator"),
+    "catch_up": (CATCH_UP_AND_EXPLORE_BY_AI_AGENT, create_catch_up_team, "markdown_content_formator"),
+}
+
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def strip_terminate(content: str) -> str:
+    """Remove the TERMINATE keyword and everything after it."""
+    return content.split("TERMINATE")[0].strip() if "TERMINATE" in content else content
+
+
+class LessonApi:
+    """
+    Headless HTTP API for lesson generation, for machine-to-machine clients such as an LMS.
+
+    A request runs the open topic or the catch-up team directly, without the Chainlit
+    websocket stack and its per-session overhead, and streams the run as Server-Sent
+    Events: queue updates, agent tokens, completed agent turns, the tokens of the
+    lesson, then the links of its markdown and PDF artifacts. The API is mounted on the
+    Chainlit server by `mount_lesson_api`, so its runs go through the same scheduler as
+    the Chainlit sessions and share their caches, client pools and worker pools. A
+    client that disconnects cancels its run.
+
+    Every request is authenticated with the `api_key` bearer token. Runs are queued in
+    the fair scheduler under an identity derived from the key, so a client can't choose
+    the user its runs are queued for.
+    """
+
+    def __init__(self, api_key: str):
+        if not api_key:
+            raise ValueError("The lesson API requires an API key")
+        self._api_key = api_key
+        self._user_id = f"api:{hashlib.sha256(api_key.encode()).hexdigest()[:12]}"
+
+    def _authorized(self, request: Request) -> bool:
+        authorization = request.headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        return scheme.lower() == "bearer" and secrets.compare_digest(token, self._api_key)
+
+    async def health(self, request: Request) -> JSONResponse:
+        return JSONResponse({"status": "ok"})
+
+    async def create_lesson(self, request: Request):
+        """
+        Generate a lesson, streamed as Server-Sent Events.
+
+        Accepts a JSON body, or a multipart form to upload student records, syllabi or
+        textbooks, with the fields:
+            task: The lesson request
+            team: "open_topic" or "catch_up", "catch_up" by default when files are uploaded
+            files: The uploaded files (multipart only)
+
+        Events: `queued` {position, eta}, `started`, `agent_token` {source, content},
+        `agent_message` {source, content}, `final_token` {content},
+        `artifacts` {markdown, pdf, content}, `error` {message} and `done` {stop_reason}.
+        """
+        if not self._authorized(request):
+            return JSONResponse({"error": "unauthorized"}, status_code=401)
+
+        upload_dir = None
+        try:
+            if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                form = await request.form()
+                fields = {key: value for key, value in form.items() if isinstance(value, str)}
+                files = [value for value in form.getlist("files") if isinstance(value, UploadFile)]
+                if files:
+                    upload_dir = tempfile.mkdtemp(prefix="lesson_api_")
+                    paths = await self._save_uploads(files, upload_dir)
+                    if paths is None:
+                        shutil.rmtree(upload_dir, ignore_errors=True)
+                        return JSONResponse(
+                            {"error": f"files must be smaller than {MAX_UPLOAD_MB}MB"}, status_code=413
+                        )
+                else:
+                    paths = []
+            else:
+                fields = await request.json()
+                if not isinstance(fields, dict):
+                    raise ValueError("the body must be a JSON object")
+                paths = []
+        except Exception as e:
+            if upload_dir:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+            return JSONResponse({"error": f"invalid request: {str(e)}"}, status_code=400)
+
+        task = str(fields.get("task") or "").strip()
+        team_key = str(fields.get("team") or ("catch_up" if paths else "open_topic"))
+        if team_key not in TEAMS or not (task or paths):
+            if upload_dir:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+            return JSONResponse(
+                {"error": f"a task or files and a team among {', '.join(TEAMS)} are required"}, status_code=400
+            )
+
+        run_id = str(uuid.uuid4())
+        base_url = str(request.base_url).rstrip("/")
+        events = self._stream_events(
+            lambda emit: self._run_lesson(emit, team_key, task, paths, self._user_id, run_id, base_url, upload_dir)
+        )
+        return StreamingResponse(
+            events,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Run-Id": run_id},
+        )
+
+    async def _save_uploads(self, files: List[UploadFile], directory: str) -> Optional[List[Tuple[str, str]]]:
+        paths = []
+        for index, file in enumerate(files):
+            if file.size is not None and file.size > MAX_UPLOAD_MB * 1024 * 1024:
+                return None
+            # Keep the uploaded extension, it selects the converter
+            name = os.path.basename(file.filename or f"upload_{index}")
+            path = os.path.join(directory, f"{index}_{name}")
+            with open(path, "wb") as f:
+                await asyncio.to_thread(shutil.copyfileobj, file.file, f)
+            paths.append((path, name))
+        return paths
+
+    async def _build_task(self, task: str, paths: List[Tuple[str, str]]) -> str:
+        conversions = await asyncio.gather(*(convert_upload(path, name) for path, name in paths))
+        documents: List[UploadedDocument] = []
+        for (_, name), conversion in zip(paths, conversions):
+            if conversion.error:
+                logger.warning(f"Failed to convert {name}: {conversion.error}")
+            elif conversion.document is not None:
+                documents.append(conversion.document)
+        if documents and USE_UPLOAD_CONDENSATION:
+            content = await upload_condenser.condense(documents)
+        else:
+            content = "".join(f"\n\n## Content from {document.name}\n\n{document.markdown}" for document in documents)
+        return f"{task}{content}".strip()
+
+    async def _stream_events(self, run: Callable[[Callable[..., Awaitable[None]]], Awaitable[None]]) -> AsyncIterator[str]:
+        # The run is a task of its own, so that a disconnecting client only has to cancel it
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def emit(event: str, data: Dict[str, Any]) -> None:
+            await queue.put(format_event(event, data))
+
+        task = asyncio.create_task(run(emit))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+        finally:
+            if not task.done():
+                # The client disconnected, cancel the run and its model and tool calls. The run
+                # is not awaited: the server keeps cancelling whatever this generator waits for,
+                # which would cut short the team's own cleanup.
+                task.cancel()
+
+    async def _run_lesson(
+        self,
+        emit: Callable[..., Awaitable[None]],
+        team_key: str,
+        task: str,
+        paths: List[Tuple[str, str]],
+        user_id: str,
+        run_id: str,
+        base_url: str,
+        upload_dir: Optional[str],
+    ) -> None:
+        # The tools report their steps to Chainlit, an HTTP context drops them
+        init_http_context(thread_id=run_id, client_type="copilot")
+        cancellation_token = CancellationToken()
+        team_name, create, final_answer_source = TEAMS[team_key]
+
+        async def report_queue_position(position: int, eta: int):
+            await emit("queued", {"position": position, "eta": eta})
+
+        try:
+            if paths:
+                try:
+                    task = await self._build_task(task, paths)
+                except Exception as e:
+                    logger.error(f"Error processing the uploads of run {run_id}: {traceback.format_exc()}")
+                    await emit("error", {"message": f"file processing failed: {str(e)}"})
+                    return
+                if not task:
+                    await emit("error", {"message": "no content could be extracted from the files"})
+                    return
+
+            final_content = ""
+            stop_reason = None
+            async with team_run_scheduler.slot(
+                TEAM_RUN_TIERS.get(team_name, "default"),
+                user_id,
+                run_id,
+                on_queue_update=report_queue_position,
+                cancellation_token=cancellation_token,
+            ), media_run_scope():
+                await emit("started", {"run_id": run_id, "team": team_key})
+                team = create()
+                stream = team.run_stream(
+                    task=[TextMessage(content=task, source="user")], cancellation_token=cancellation_token
+                )
+                async for msg in cancellable_stream(stream, cancellation_token):
+                    if isinstance(msg, ModelClientStreamingChunkEvent):
+                        content = strip_terminate(msg.content or "")
+                        if not content:
+                            continue
+                        if msg.source == final_answer_source:
+                            final_content += content
+                            await emit("final_token", {"content": content})
+                        else:
+                            await emit("agent_token", {"source": msg.source, "content": content})
+                    elif isinstance(msg, StopMessage):
+                        stop_reason = strip_terminate(msg.content) or "stopped"
+                        break
+                    elif isinstance(msg, TaskResult):
+                        stop_reason = msg.stop_reason
+                        if not final_content and msg.messages:
+                            # Nothing was streamed by the formatter, use the last turn instead
+                            final_content = strip_terminate(msg.messages[-1].to_text())
+                            if not final_content and len(msg.messages) >= 2:
+                                final_content = msg.messages[-2].to_text()
+                    elif isinstance(msg, BaseChatMessage) and msg.source != "user":
+                        await emit("agent_message", {"source": msg.source, "content": msg.to_text()})
+
+            if final_content:
+                if USE_IMAGE_MIRROR:
+                    try:
+                        final_content = await image_mirror.mirror_markdown(final_content)
+                    except Exception as mirror_error:
+                        logger.warning(f"Error mirroring images: {str(mirror_error)}")
+                md_filename, pdf_file = await asyncio.to_thread(save_lesson_artifacts, final_content, run_id)
+                await emit(
+                    "artifacts",
+                    {
+                        "markdown": f"{base_url}/{md_filename}",
+                        "pdf": f"{base_url}/{pdf_file}",
+                        "content": final_content,
+                    },
+                )
+            await emit("done", {"stop_reason": stop_reason})
+
+        except asyncio.CancelledError:
+            logger.info(f"Lesson run {run_id} cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Error in lesson run {run_id}: {traceback.format_exc()}")
+            await emit("error", {"message": str(e)})
+        finally:
+            if upload_dir:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def create_api_app(api_key: str) -> Starlette:
+    """
+    Create the ASGI application of the lesson API.
+
+    It has no lifespan of its own: the shared resources are started and closed by the
+    startup and shutdown hooks of the Chainlit app it is mounted on, and the generated
+    artifacts are served by its /public route.
+
+    Args:
+        api_key: Bearer token required by every request
+
+    Returns:
+        Starlette: The application
+    """
+    lesson_api = LessonApi(api_key=api_key)
+    return Starlette(
+        routes=[
+            Route("/health", lesson_api.health, methods=["GET"]),
+            Route("/lessons", lesson_api.create_lesson, methods=["POST"]),
+        ],
+    )
+
+
+def mount_lesson_api(server_app: Starlette, path: str = "/api", api_key: Optional[str] = None) -> None:
+    """
+    Mount the lesson API on the Chainlit server, in the process of the Chainlit sessions.
+
+    The API is added before Chainlit's catch-all route of the web UI, which would
+    answer its GET requests otherwise. Mounting again, e.g. when Chainlit reloads the
+    app module, replaces the earlier mount. Without an API key the API is not mounted,
+    as anyone reaching the UI could start runs through it.
+
+    Args:
+        server_app: The Chainlit server application, `chainlit.server.app`
+        path: The path the API is served under
+        api_key: Bearer token required by every request, the API is not mounted if None
+    """
+    routes = server_app.router.routes
+    routes[:] = [route for route in routes if not (isinstance(route, Mount) and route.path == path)]
+    if not api_key:
+        logger.info("LESSON_API_KEY is not set, the lesson API is not served")
+        return
+    routes.insert(0, Mount(path, app=create_api_app(api_key=api_key), name="lesson_api"))
@@ -12,12 +12,11 @@ logging.getLogger().setLevel(logging.WARNING)
 import asyncio
 import json
 import os
-import tempfile
 import time
 import traceback
-from datetime import datetime, timezone
 
 import chainlit as cl
+from chainlit.server import app as chainlit_server_app
 from autogen_agentchat.base import TaskResult
 from autogen_agentchat.messages import (
     ModelClientStreamingChunkEvent,
@@ -31,12 +30,27 @@ from autogen_core import CancellationToken
 from agents.catch_up_and_explore_by_AI.catch_up_and_explore_by_AI_agents import (
     create_catch_up_team,
 )
-from agents.file_processor.main import process_file
+from agents.context.token_counter import count_text_tokens
+from agents.file_processor.condensation import USE_UPLOAD_CONDENSATION, UploadedDocument, upload_condenser
+from agents.file_processor.uploads import MAX_UPLOAD_MB, convert_upload
 from agents.open_topic_class_generation.open_topic_class_generation_agents import (
     create_team,
 )
-from config import CATCH_UP_AND_EXPLORE_BY_AI_AGENT, OPEN_TOPIC_CLASS_GENERATION_AGENT,CURRENT_AGENT_TEAM_NAME
+from config import CATCH_UP_AND_EXPLORE_BY_AI_AGENT, OPEN_TOPIC_CLASS_GENERATION_AGENT,CURRENT_AGENT_TEAM_NAME,CURRENT_CANCELLATION_TOKEN,CURRENT_CHECKPOINT_KEY,CURRENT_RUN_STOPPED,TEAM_RUN_TIERS
+from agents.tools.image_mirror import USE_IMAGE_MIRROR, image_mirror
+from agents.tools.media_pipeline import media_run_scope
+from api import mount_lesson_api
+from checkpoint import team_checkpoint_store
+from lessonRun import (
+    cancellable_stream,
+    close_shared_resources,
+    save_lesson_artifacts,
+    start_shared_resources,
+)
+from scheduler import team_run_scheduler
 
+# 将无界面的 HTTP API 挂载到 Chainlit 服务的 /api 下，与界面会话在同一进程中共享调度器、缓存和连接池
+mount_lesson_api(chainlit_server_app, api_key=os.environ.get("LESSON_API_KEY") or None)
 
 # Add serialization helper function
 def ensure_serializable(obj):
@@ -103,6 +117,58 @@ async def on_chat_start():
     cl.user_session.set(CATCH_UP_AND_EXPLORE_BY_AI_AGENT, catch_up_team)
     cl.user_session.set(CURRENT_AGENT_TEAM_NAME,"")
 
+    # A restarted worker or a reconnecting client lands here again for the same
+    # chat thread; pick up its unfinished run from the last completed turn.
+    pending = await team_checkpoint_store.find_latest(thread_id=cl.context.session.thread_id)
+    if pending and cl.user_session.get(pending["team_name"]) is not None:
+        cl.user_session.set(CURRENT_AGENT_TEAM_NAME, pending["team_name"])
+        await cl.Message(content="检测到未完成的课程生成任务，正在从上次中断处继续...").send()
+        await run_stream_team(
+            cl.user_session.get(pending["team_name"]),
+            cl.Message(content=pending["task"]),
+        )
+
+
+def get_checkpoint_owner() -> str:
+    """Return the identity that owns checkpoints created in the current session."""
+    user = cl.user_session.get("user")
+    return user.identifier if user else cl.context.session.thread_id
+
+
+def cancel_current_run():
+    """Cancel the team run of the current session, if one is in progress."""
+    cancellation_token = cl.user_session.get(CURRENT_CANCELLATION_TOKEN)
+    if cancellation_token is not None:
+        cancellation_token.cancel()
+
+
+@cl.on_stop
+async def on_stop():
+    # 用户点击停止：取消正在进行的LLM请求和工具调用，并删除检查点，刷新页面或重发相同任务时不再自动续跑
+    cl.user_session.set(CURRENT_RUN_STOPPED, True)
+    cancel_current_run()
+    checkpoint_key = cl.user_session.get(CURRENT_CHECKPOINT_KEY)
+    if checkpoint_key:
+        await team_checkpoint_store.delete(checkpoint_key)
+
+
+@cl.on_chat_end
+async def on_chat_end():
+    # 用户关闭页面或断开连接：停止团队运行并释放调度槽位
+    cancel_current_run()
+    if cl.context.session.current_task:
+        cl.context.session.current_task.cancel()
+
+@cl.on_app_startup
+async def on_app_startup():
+    # 在后台启动文件转换进程并预先加载 MarkItDown，首次上传无需等待；将精选教学资料加入本地搜索索引
+    await start_shared_resources()
+
+@cl.on_app_shutdown
+async def on_app_shutdown():
+    # 关闭所有会话共享的 HTTP 连接池、HTML 转换进程池、缩略图进程池和文件转换进程池
+    await close_shared_resources()
+
 @cl.on_message  # type: ignore
 async def chat(message: cl.Message) -> None:
     # Check if there are files uploaded
@@ -112,10 +178,8 @@ async def chat(message: cl.Message) -> None:
         try:
             # Process uploaded files with timeout handling
             await cl.Message(content="正在处理上传的文件，请稍候...").send()
-            # Use a longer timeout for file processing
-            await asyncio.wait_for(process_uploaded_files(files, message), timeout=120.0)
-        except asyncio.TimeoutError:
-            await cl.Message(content="文件处理超时，请尝试将文件拆分为较小的部分或减少文件数量。").send()
+            # Each file conversion has its own timeout, see FILE_CONVERSION_TIMEOUT
+            await process_uploaded_files(files, message)
         except Exception as e:
             error_msg = f"文件处理失败: {str(e)}\n\n"
             error_trace = traceback.format_exc()
@@ -135,69 +199,64 @@ async def process_uploaded_files(files, message: cl.Message):
     catch_up_team = cl.user_session.get(CATCH_UP_AND_EXPLORE_BY_AI_AGENT)
     cl.user_session.set(CURRENT_AGENT_TEAM_NAME,CATCH_UP_AND_EXPLORE_BY_AI_AGENT)
     
-    combined_content = ""
     file_count = len(files)
     
     await cl.Message(content=f"开始处理 {file_count} 个文件...").send()
-    
-    # Process each file
-    for i, file in enumerate(files):
+    progress_message = cl.Message(content=f"文件处理进度：0/{file_count}")
+    await progress_message.send()
+    completed_count = 0
+
+    async def process_one_file(file) -> UploadedDocument | None:
+        nonlocal completed_count
         try:
-            temp_dir = tempfile.mkdtemp()
-            temp_file_path = os.path.join(temp_dir, file.name)
-                        
-            # Save the uploaded file directly to temp directory
-            try:
-                # Use the file's path attribute instead of trying to get bytes
-                original_file_path = None
-                if hasattr(file, 'path') and file.path:
-                    # Option 1: Copy the file from its current location to our temp path
-                    import shutil
-                    shutil.copy(file.path, temp_file_path)
-                    # Store the original file path for saving markdown alongside it
-                    original_file_path = file.path
-                else:
-                    # Fallback for versions where path might not be available
-                    raise Exception(f"Cannot access file: File path not available")
-                
-                # Get file size for limit check
-                file_size = os.path.getsize(temp_file_path) / (1024 * 1024)  # Size in MB
-                
-            except Exception as e:
-                error_msg = f"无法保存文件: {str(e)}"
-                print(f"File saving error: {traceback.format_exc()}")
-                await cl.Message(content=error_msg).send()
-                continue
-                
+            # Convert the uploaded file in place, without copying it
+            if not (hasattr(file, 'path') and file.path and os.path.isfile(file.path)):
+                await cl.Message(content=f"无法读取文件 {file.name}: File path not available").send()
+                return None
+
             # Check if file is too large
-            if file_size > 50:  # 50MB limit
-                await cl.Message(content=f"文件 {file.name} 太大 ({file_size:.1f}MB)，请上传50MB以下的文件。").send()
-                continue
-            
-            # Process the file and convert to markdown - pass the original file path
-            # First step: 处理文件内容
-            from pathlib import Path
-            file_name = Path(temp_file_path).name
-            async with cl.Step(name=f" 处理文件:{file_name}") as step:
-                error, content = process_file(temp_file_path, original_file_path=original_file_path)
-                if error:
-                    # Add message to the step instead of sending separately
-                    step.set_name(f"处理文件 {file.name} 时发生错误: {str(e)}")
-                else:
-                    step.set_name(f"处理文件 {file.name} 成功")    
-                    # Add success message to the step instead of sending separately
-                    combined_content += f"\n\n## Content from {file.name}\n\n{content.markdown}"
+            file_size = os.path.getsize(file.path) / (1024 * 1024)  # Size in MB
+            if file_size > MAX_UPLOAD_MB:
+                await cl.Message(content=f"文件 {file.name} 太大 ({file_size:.1f}MB)，请上传{MAX_UPLOAD_MB}MB以下的文件。").send()
+                return None
 
+            # 在转换进程池中处理文件，不阻塞其他会话的流式输出；相同内容的文件直接使用缓存的转换结果
+            # Chainlit stores uploads under a generated name, the converter is chosen from the uploaded name
+            async with cl.Step(name=f"处理文件 {file.name}：转换中") as step:
+                start = time.time()
+                conversion = await convert_upload(file.path, file.name)
+                if conversion.error:
+                    step.name = f"处理文件 {file.name} 时发生错误: {conversion.error}"
+                elif conversion.cached:
+                    step.name = f"处理文件 {file.name} 成功（已缓存）"
+                elif conversion.handoff_pages:
+                    # 前几页提取完成后立即交给团队分析，其余页面在后台继续提取，可通过工具按页读取
+                    step.name = f"处理文件 {file.name}：已提取前 {conversion.handoff_pages} 页（共 {conversion.page_count} 页），用时 {round(time.time() - start)}s"
+                else:
+                    step.name = f"处理文件 {file.name} 成功，用时 {round(time.time() - start)}s"
                 # Update the step to refresh its content in the UI
                 await step.update()
-                
-            # Clean up
-            os.remove(temp_file_path)
-            os.rmdir(temp_dir)
+            return conversion.document
                         
         except Exception as e:
             await cl.Message(content=f"处理文件 {file.name} 时发生错误: {str(e)}").send()
             print(f"Error processing file {file.name}: {traceback.format_exc()}")
+            return None
+        finally:
+            completed_count += 1
+            progress_message.content = f"文件处理进度：{completed_count}/{file_count}"
+            await progress_message.update()
+
+    # 并发处理所有文件，按上传顺序合并内容
+    documents = [document for document in await asyncio.gather(*(process_one_file(file) for file in files)) if document]
+    if documents and USE_UPLOAD_CONDENSATION:
+        # 内容超过提示词预算时，用低成本模型并发压缩为结构化的需求摘要
+        async with cl.Step(name="整理上传内容") as step:
+            combined_content = await upload_condenser.condense(documents)
+            step.name = f"整理上传内容：{count_text_tokens(combined_content)} tokens"
+            await step.update()
+    else:
+        combined_content = "".join(f"\n\n## Content from {document.name}\n\n{document.markdown}" for document in documents)
     
     if combined_content:
         # Create a message with the combined content
@@ -218,116 +277,121 @@ async def process_uploaded_files(files, message: cl.Message):
 async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = None):
     executing = False
 
+    # Cancelled by on_stop / on_chat_end, aborts in-flight LLM and tool calls
+    cancellation_token = CancellationToken()
+    cl.user_session.set(CURRENT_CANCELLATION_TOKEN, cancellation_token)
+
+    team_name = cl.user_session.get(CURRENT_AGENT_TEAM_NAME)
+    checkpoint_key = team_checkpoint_store.make_key(team_name, get_checkpoint_owner(), message.content)
+    checkpoint = await team_checkpoint_store.load(checkpoint_key)
+    # Only runs interrupted by a disconnect or a restart are resumed, not the ones the user stopped
+    cl.user_session.set(CURRENT_CHECKPOINT_KEY, checkpoint_key)
+    cl.user_session.set(CURRENT_RUN_STOPPED, False)
+
     async with cl.Step(name= cl.user_session.get(CURRENT_AGENT_TEAM_NAME)) as executing_step:
-        start = time.time()
+
+        # 排队等待时在步骤中显示排队位置和预计等待时间
+        async def show_queue_position(position: int, eta: int):
+            executing_step.name = f"{team_name} 排队中：第 {position} 位，预计等待 {eta}s"
+            await executing_step.update()
+
+        user = cl.user_session.get("user")
+        session_id = cl.context.session.id
+        user_id = user.identifier if user else session_id
+
+        async with team_run_scheduler.slot(
+            TEAM_RUN_TIERS.get(team_name, "default"),
+            user_id,
+            session_id,
+            on_queue_update=show_queue_position,
+            cancellation_token=cancellation_token,
+        ), media_run_scope():
+            start = time.time()
         
-        # 添加时间更新任务
-        update_time_task = None
+            # 添加时间更新任务
+            update_time_task = None
         
-        # 定义时间更新函数
-        async def update_step_time():
-            try:
-                while True:
-                    elapsed = round(time.time() - start)
-                    executing_step.name = f"{cl.user_session.get(CURRENT_AGENT_TEAM_NAME)} Executing for {elapsed}s"
-                    await executing_step.update()
-                    await asyncio.sleep(1)  # 每秒更新一次
-            except asyncio.CancelledError:
-                # 任务取消时正常退出
-                pass
-            except Exception as e:
-                print(f"Error updating time: {str(e)}")
+            # 定义时间更新函数
+            async def update_step_time():
+                try:
+                    while True:
+                        elapsed = round(time.time() - start)
+                        executing_step.name = f"{cl.user_session.get(CURRENT_AGENT_TEAM_NAME)} Executing for {elapsed}s"
+                        await executing_step.update()
+                        await asyncio.sleep(1)  # 每秒更新一次
+                except asyncio.CancelledError:
+                    # 任务取消时正常退出
+                    pass
+                except Exception as e:
+                    print(f"Error updating time: {str(e)}")
 
-        # 启动时间更新任务
-        update_time_task = asyncio.create_task(update_step_time())
+            # 启动时间更新任务
+            update_time_task = asyncio.create_task(update_step_time())
 
-        final_answer = cl.Message(content="")
+            final_answer = cl.Message(content="")
 
-        try:
-            # Create a clean cancellation token
-            cancellation_token = CancellationToken()
-            
-            # Use the async generator directly instead of trying to wrap it in a task
-            async for msg in team.run_stream(task=[TextMessage(content=message.content, source="user")],cancellation_token=cancellation_token,):
-                try:
-                    if isinstance(msg, ModelClientStreamingChunkEvent):
-                        # Ensure content is properly serializable
-                        if not hasattr(msg, 'content'):
-                            continue
+            try:
+                completed_turns = 0
+                if checkpoint:
+                    # Continue the interrupted run instead of starting from the first search
+                    try:
+                        await team.load_state(checkpoint["state"])
+                    except Exception as load_error:
+                        print(f"Error loading checkpoint, starting over: {str(load_error)}")
+                        await team_checkpoint_store.delete(checkpoint_key)
+                        checkpoint = None
+                if checkpoint:
+                    completed_turns = checkpoint["turns"]
+                    print(f"Resuming team run from turn {completed_turns}")
+                    await executing_step.stream_token(f"从第 {completed_turns} 轮继续生成...\n\n")
+                    stream = team.run_stream(cancellation_token=cancellation_token)
+                else:
+                    stream = team.run_stream(task=[TextMessage(content=message.content, source="user")],cancellation_token=cancellation_token,)
+
+                async for msg in cancellable_stream(stream, cancellation_token):
+                    try:
+                        if isinstance(msg, ModelClientStreamingChunkEvent):
+                            # Ensure content is properly serializable
+                            if not hasattr(msg, 'content'):
+                                continue
                             
-                        # Make sure content is serializable
-                        content = msg.content
-                        if content is not None:
-                            if not isinstance(content, str):
-                                # Convert non-string content to string safely
-                                try:
-                                    content = ensure_serializable(content)
-                                    if not isinstance(content, str):
-                                        content = str(content)
-                                except Exception as e:
-                                    print(f"Error converting content to string: {str(e)}")
-                                    content = str(content) if content is not None else ""
-                        else:
-                            content = ""
-                        
-                        # Handle TERMINATE keyword
-                        if isinstance(content, str) and "TERMINATE" in content:
-                            # Remove TERMINATE and everything after it
-                            content = content.split("TERMINATE")[0].strip()
-                                
-                        # Process based on source
-                        if msg.source != "markdown_content_formator":
-                            executing = True
-                            if content:  # Only stream non-empty content
-                                await executing_step.stream_token(content)
-                        else:
-                            executing = False
-                            executed_for = round(time.time() - start)
-                            executing_step.name = f"Executed for {executed_for}s"
-                            await executing_step.update()
-                            if content:  # Only stream non-empty content
-                                await final_answer.stream_token(content)
-                    
-                    elif isinstance(msg, StopMessage):
-                        # Handle stop messages properly
-                        print(f"Received StopMessage")
-                        # Extract content if available, or use empty string
-                        content = ""
-                        if hasattr(msg, 'content'):
-                            if isinstance(msg.content, str):
-                                content = msg.content
+                            # Make sure content is serializable
+                            content = msg.content
+                            if content is not None:
+                                if not isinstance(content, str):
+                                    # Convert non-string content to string safely
+                                    try:
+                                        content = ensure_serializable(content)
+                                        if not isinstance(content, str):
+                                            content = str(content)
+                                    except Exception as e:
+                                        print(f"Error converting content to string: {str(e)}")
+                                        content = str(content) if content is not None else ""
                             else:
-                                try:
-                                    content = ensure_serializable(msg.content)
-                                    if not isinstance(content, str):
-                                        content = str(content)
-                                except Exception as e:
-                                    print(f"Error handling StopMessage content: {str(e)}")
-                                    content = str(msg.content) if msg.content is not None else ""
-                                    
-                        if content and "TERMINATE" in content:
-                            content = content.split("TERMINATE")[0].strip()
-                        if content:
-                            final_answer.content += content
+                                content = ""
                         
-                        break
+                            # Handle TERMINATE keyword
+                            if isinstance(content, str) and "TERMINATE" in content:
+                                # Remove TERMINATE and everything after it
+                                content = content.split("TERMINATE")[0].strip()
                                 
-                    elif isinstance(msg, TaskResult):
-                        print("Received TaskResult")
-                        print(f"Received TaskResult with stop reason: {msg.stop_reason}")
-                        # Process task results if needed
-                        if msg.stop_reason is not None:
-                            finalAgentContent = msg.messages[-1].content
-                            content = finalAgentContent.split("TERMINATE")[0].strip()
-                            if len(content) > 0:
-                                final_answer.content += content
-                            elif len(msg.messages) >=2 :
-                                final_answer.content += msg.messages[-2].content
+                            # Process based on source
+                            if msg.source != "markdown_content_formator":
+                                executing = True
+                                if content:  # Only stream non-empty content
+                                    await executing_step.stream_token(content)
+                            else:
+                                executing = False
+                                executed_for = round(time.time() - start)
+                                executing_step.name = f"Executed for {executed_for}s"
+                                await executing_step.update()
+                                if content:  # Only stream non-empty content
+                                    await final_answer.stream_token(content)
                     
-                    elif executing_step is not None and msg is not None and not isinstance(msg, BaseChatMessage):
-                        # Handle any other message types safely
-                        try:
-                            # Extract content if possible
+                        elif isinstance(msg, StopMessage):
+                            # Handle stop messages properly
+                            print(f"Received StopMessage")
+                            # Extract content if available, or use empty string
                             content = ""
                             if hasattr(msg, 'content'):
                                 if isinstance(msg.content, str):
@@ -338,60 +402,128 @@ async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = N
                                         if not isinstance(content, str):
                                             content = str(content)
                                     except Exception as e:
-                                        print(f"Error handling generic message content: {str(e)}")
+                                        print(f"Error handling StopMessage content: {str(e)}")
                                         content = str(msg.content) if msg.content is not None else ""
-                                        
+                                    
+                            if content and "TERMINATE" in content:
+                                content = content.split("TERMINATE")[0].strip()
                             if content:
-                                await executing_step.stream_token(content)
+                                final_answer.content += content
+                        
+                            break
                                 
-                        except Exception as send_error:
-                            print(f"Error sending executing step: {str(send_error)}")
-                            print(traceback.format_exc())
+                        elif isinstance(msg, TaskResult):
+                            print("Received TaskResult")
+                            print(f"Received TaskResult with stop reason: {msg.stop_reason}")
+                            # Process task results if needed
+                            if msg.stop_reason is not None:
+                                finalAgentContent = msg.messages[-1].content
+                                content = finalAgentContent.split("TERMINATE")[0].strip()
+                                if len(content) > 0:
+                                    final_answer.content += content
+                                elif len(msg.messages) >=2 :
+                                    final_answer.content += msg.messages[-2].content
+
+                        elif isinstance(msg, BaseChatMessage) and msg.source != "user":
+                            # Checkpoint after each completed agent turn
+                            completed_turns += 1
+                            if cl.user_session.get(CURRENT_RUN_STOPPED):
+                                continue
+                            try:
+                                await team_checkpoint_store.save(
+                                    checkpoint_key,
+                                    await team.save_state(),
+                                    team_name=team_name,
+                                    task=message.content,
+                                    owner=get_checkpoint_owner(),
+                                    thread_id=cl.context.session.thread_id,
+                                    turns=completed_turns,
+                                )
+                            except Exception as checkpoint_error:
+                                print(f"Error saving checkpoint: {str(checkpoint_error)}")
+                    
+                        elif executing_step is not None and msg is not None and not isinstance(msg, BaseChatMessage):
+                            # Handle any other message types safely
+                            try:
+                                # Extract content if possible
+                                content = ""
+                                if hasattr(msg, 'content'):
+                                    if isinstance(msg.content, str):
+                                        content = msg.content
+                                    else:
+                                        try:
+                                            content = ensure_serializable(msg.content)
+                                            if not isinstance(content, str):
+                                                content = str(content)
+                                        except Exception as e:
+                                            print(f"Error handling generic message content: {str(e)}")
+                                            content = str(msg.content) if msg.content is not None else ""
+                                        
+                                if content:
+                                    await executing_step.stream_token(content)
+                                
+                            except Exception as send_error:
+                                print(f"Error sending executing step: {str(send_error)}")
+                                print(traceback.format_exc())
                         
-                except Exception as token_error:
-                    # Log the error but continue processing
-                    print(f"Error processing message chunk: {str(token_error)}")
-                    print(traceback.format_exc())
-                    continue
+                    except Exception as token_error:
+                        # Log the error but continue processing
+                        print(f"Error processing message chunk: {str(token_error)}")
+                        print(traceback.format_exc())
+                        continue
+
+                # The run completed, its checkpoint is no longer needed
+                await team_checkpoint_store.delete(checkpoint_key)
                     
-        except Exception as stream_error:
-            # Handle other stream errors
-            print(f"Error in message stream: {str(stream_error)}")
-            print(traceback.format_exc())
-            await cl.Message(content=f"生成内容时出错: {str(stream_error)}").send()
-        
-        finally:
-            # 无论如何都要取消时间更新任务
-            if update_time_task:
-                update_time_task.cancel()
+            except asyncio.CancelledError:
+                executing_step.name = f"{team_name} 已停止"
+                print("Team run cancelled")
+                if cl.user_session.get(CURRENT_RUN_STOPPED):
+                    # Stopped by the user: a checkpoint saved while stopping must not be resumed either
+                    try:
+                        await team_checkpoint_store.delete(checkpoint_key)
+                    except Exception as delete_error:
+                        print(f"Error deleting checkpoint: {str(delete_error)}")
+                # Drop the partial conversation so the next request starts clean
                 try:
-                    await update_time_task
-                except asyncio.CancelledError:
-                    pass
+                    await team.reset()
+                except Exception as reset_error:
+                    print(f"Error resetting team: {str(reset_error)}")
+                raise
+
+            except Exception as stream_error:
+                # Handle other stream errors
+                print(f"Error in message stream: {str(stream_error)}")
+                print(traceback.format_exc())
+                await cl.Message(content=f"生成内容时出错: {str(stream_error)}").send()
+        
+            finally:
+                # 无论如何都要取消时间更新任务
+                if update_time_task:
+                    update_time_task.cancel()
+                    try:
+                        await update_time_task
+                    except asyncio.CancelledError:
+                        pass
             
     # Send the final answer message to the UI
     if final_answer.content:
         # Send the final answer to the UI
         await final_answer.send()
+
+        if USE_IMAGE_MIRROR:
+            # 将课程中的图片下载到本地并替换链接，页面和 PDF 不再依赖外部图片站点
+            try:
+                mirrored_content = await image_mirror.mirror_markdown(final_answer.content)
+                if mirrored_content != final_answer.content:
+                    final_answer.content = mirrored_content
+                    await final_answer.update()
+            except Exception as mirror_error:
+                print(f"Error mirroring images: {str(mirror_error)}")
         
         try:
-            # Clean up content before saving
-            clean_content = final_answer.content
-            if "TERMINATE" in clean_content:
-                clean_content = clean_content.split("TERMINATE")[0].strip()
-            
-            # Create timestamp for filenames
-            timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-            
-            # Save markdown to public/md directory
-            os.makedirs("public/md", exist_ok=True)
-            md_filename = f"public/md/course_materials_{timestamp}.md"
-            with open(md_filename, "w", encoding="utf-8") as md_file:
-                md_file.write(clean_content)
-            
-            # Generate PDF
-            pdf_file = md_to_pdf(clean_content)
-            
+            md_filename, pdf_file = save_lesson_artifacts(final_answer.content, run_id=final_answer.id)
+
             # Add both links to the response
             await cl.Message(content=f"\n\nMarkdown: [{os.path.basename(md_filename)}]({md_filename})").send()
             await cl.Message(content=f"\n\nPDF: [{os.path.basename(pdf_file)}]({pdf_file})").send()
@@ -399,127 +531,3 @@ async def run_stream_team(team=SelectorGroupChat, message: cl.Message | None = N
             print(f"Error creating files: {file_error}")
             print(traceback.format_exc())
             await cl.Message(content="\n\n无法创建文件，请检查生成的内容。").send()
-
-def md_to_pdf(md: str) -> str:
-    import base64
-    import os  # Import os at the beginning of the function
-    import re
-    import urllib.request
-    from io import BytesIO
-
-    os.makedirs("public/pdfs", exist_ok=True)
-    os.makedirs("public/fonts", exist_ok=True)
-
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-
-    filename = f"public/pdfs/course_materials_{timestamp}.pdf"
-
-    # Clean up the content
-    content = md
-    
-    # Ensure we have content
-    if not content:
-        content = "# 无内容 \n\n请检查生成过程，内容生成失败。"
-
-    # Add a title if there isn't one
-    if not content.startswith('# '):
-        content = f"# 中国小学语文教学内容\n\n{content}"
-    
-    # Download a Chinese font if we don't have one already
-    chinese_font_path = "public/fonts/NotoSansSC-Regular.ttf"
-    if not os.path.exists(chinese_font_path):
-        try:
-            print("Downloading Chinese font...")
-            # Fix: Updated URL to direct download link instead of GitHub blob page
-            font_url = "https://github.com/jsntn/webfonts/raw/master/NotoSansSC-Regular.ttf"
-            urllib.request.urlretrieve(font_url, chinese_font_path)
-            print(f"Downloaded font to {chinese_font_path}")
-        except Exception as font_error:
-            print(f"Error downloading font: {str(font_error)}")
-            # Create a fallback font
-            chinese_font_path = None
-    
-    # Create PDF with reportlab
-    try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-        from reportlab.pdfgen import canvas
-
-        # Try to register the Chinese font
-        has_chinese_font = False
-        if chinese_font_path and os.path.exists(chinese_font_path):
-            try:
-                pdfmetrics.registerFont(TTFont("NotoSansSC", chinese_font_path))
-                has_chinese_font = True
-            except Exception as font_register_error:
-                print(f"Error registering font: {str(font_register_error)}")
-        
-        # Create a basic PDF with title
-        c = canvas.Canvas(filename, pagesize=A4)
-        width, height = A4
-        
-        # Draw a title - use Chinese font if available
-        font_name = "NotoSansSC" if has_chinese_font else "Helvetica-Bold"
-        c.setFont(font_name, 16)
-        c.drawString(50, height - 50, "中国小学语文教学内容")
-        
-        # Draw content
-        font_name = "NotoSansSC" if has_chinese_font else "Helvetica"
-        c.setFont(font_name, 10)
-        y_position = height - 80
-        line_height = 14
-        
-        # Simplify content to plain text - use 'content' instead of undefined 'plain_text'
-        plain_text = content  # Initialize plain_text with content
-        plain_text = re.sub(r'#+ (.*)', r'\1', plain_text)  # Headers to plain text
-        plain_text = re.sub(r'\*\*(.*?)\*\*', r'\1', plain_text)  # Remove bold
-        plain_text = re.sub(r'\*(.*?)\*', r'\1', plain_text)  # Remove italics
-        
-        # Add text by lines
-        for line in plain_text.split('\n'):
-            if not line.strip():
-                y_position -= line_height * 0.5
-                continue
-            
-            # Check if we need a new page
-            if y_position < 50:
-                c.showPage()
-                c.setFont(font_name, 10)
-                y_position = height - 50
-            
-            # Simple word wrap with better handling for Chinese text
-            if len(line) * 5 > width - 100:  # Rough estimate of line width
-                # For Chinese text, we need shorter chunks
-                chunk_size = 40 if has_chinese_font else 80
-                chunks = [line[i:i+chunk_size] for i in range(0, len(line), chunk_size)]
-                for chunk in chunks:
-                    c.drawString(50, y_position, chunk)
-                    y_position -= line_height
-            else:
-                c.drawString(50, y_position, line)
-                y_position -= line_height
-        
-        c.save()
-        print(f"Successfully created PDF with reportlab: {filename}")
-        
-        # If we couldn't display Chinese characters, add a note to the markdown file
-        if not has_chinese_font:
-            md_note_filename = f"public/md/course_materials_{timestamp}_no_chinese_font.md"
-            with open(md_note_filename, "w", encoding="utf-8") as f:
-                f.write(content)
-            print(f"Created fallback markdown file with full content: {md_note_filename}")
-        
-        return filename
-        
-    except Exception as reportlab_error:
-        print(f"ReportLab failed: {str(reportlab_error)}")
-        print(traceback.format_exc())
-        
-        # Last resort: PDF-named text file
-        print("PDF generation failed, creating a text file with .pdf extension")
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write("# 中国小学语文教学内容\n\n")
-            f.write(content)
-        print(f"Created text file with PDF extension: {filename}")
-        return filename
@@ -0,0 +1,164 @@
+"""
+Token-count report of the compact extraction of uploaded files.
+
+Every DOCX and PPTX of a directory is converted with markitdown and with its compact
+extractor, and the tokens of both results are counted as they would be sent to the
+model. The generated samples are a class score sheet, a lesson plan with a schedule
+table and a slide deck with the usual footers and slide numbers, a chart, a group of
+text boxes and a picture with alt text.
+
+Usage:
+    # Generate the sample files, then report on them
+    python -m benchmarks.compact_extraction_report --generate samples
+    python -m benchmarks.compact_extraction_report samples --show
+"""
+
+import argparse
+import os
+import random
+
+from agents.context.token_counter import count_text_tokens
+from agents.file_processor.compact_extraction import COMPACT_EXTRACTORS
+from agents.file_processor.converter import get_markitdown
+
+STUDENT_NAMES = ["张小明", "李华", "王芳", "赵磊", "陈静", "刘洋", "杨帆", "黄丽", "周杰", "吴敏",
+                 "徐晨", "孙悦", "马超", "朱琳", "胡斌", "郭婷", "何欢", "高翔", "林雪", "罗宇"]
+SCORE_COLUMNS = ["姓名", "学号", "语文", "数学", "英语", "古诗默写", "阅读理解", "作文", "总分", "错题知识点"]
+KNOWLEDGE_POINTS = ["多音字", "古诗背诵", "修辞手法", "近义词", "标点符号", "段落大意"]
+
+
+def generate_samples(directory: str) -> None:
+    import io
+
+    import docx
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from PIL import Image
+    from pptx import Presentation
+    from pptx.chart.data import CategoryChartData
+    from pptx.enum.chart import XL_CHART_TYPE
+    from pptx.util import Inches
+
+    random.seed(0)
+    os.makedirs(directory, exist_ok=True)
+
+    # A class score sheet, the student records teachers upload most often
+    document = docx.Document()
+    document.add_heading("三年级二班 期中考试成绩单", level=1)
+    document.add_paragraph("考试时间：2024年11月  任课教师：王老师").alignment = WD_ALIGN_PARAGRAPH.CENTER
+    table = document.add_table(rows=1, cols=len(SCORE_COLUMNS))
+    table.style = "Table Grid"
+    for cell, title in zip(table.rows[0].cells, SCORE_COLUMNS):
+        cell.text = title
+    for number, name in enumerate(STUDENT_NAMES, start=1):
+        scores = [random.randint(60, 100) for _ in range(6)]
+        values = [name, f"2023{number:03d}", *map(str, scores[:3]), *map(str, scores[3:]),
+                  str(sum(scores[:3])), "、".join(random.sample(KNOWLEDGE_POINTS, 2))]
+        for cell, value in zip(table.add_row().cells, values):
+            cell.text = value
+    document.save(os.path.join(directory, "score_sheet.docx"))
+
+    # A lesson plan with a merged-cell schedule table
+    document = docx.Document()
+    document.add_heading("《静夜思》教学设计", level=1)
+    document.add_heading("教学目标", level=2)
+    for goal in ["会认“静、夜、思”等生字", "正确、流利地朗读并背诵古诗", "体会诗人思念家乡的感情"]:
+        document.add_paragraph(goal, style="List Bullet")
+    document.add_heading("教学过程", level=2)
+    table = document.add_table(rows=1, cols=4)
+    table.style = "Table Grid"
+    for cell, title in zip(table.rows[0].cells, ["环节", "时间", "教师活动", "学生活动"]):
+        cell.text = title
+    for stage in ["导入", "初读", "精读", "背诵", "拓展"]:
+        for step in range(2):
+            row = table.add_row().cells
+            if step == 0:
+                row[0].text = stage
+            row[1].text = "5分钟"
+            row[2].text = f"{stage}：教师出示月夜图片，引导学生观察并说一说（第{step + 1}步）"
+            row[3].text = "观察图片，自由发言，朗读诗句"
+        # Merge the stage cell over its two steps
+        table.rows[-2].cells[0].merge(table.rows[-1].cells[0])
+    document.save(os.path.join(directory, "lesson_plan.docx"))
+
+    # A slide deck with footers, slide numbers and a repeated school name
+    presentation = Presentation()
+    verses = ["床前明月光", "疑是地上霜", "举头望明月", "低头思故乡"]
+    for number in range(1, 16):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        verse = verses[number % len(verses)]
+        slide.shapes.title.text = f"学习任务{number}：{verse}"
+        body = slide.placeholders[1].text_frame
+        body.text = f"读准字音：{'、'.join(verse)}"
+        for level, text in [(1, f"注意“{verse[1]}”的读音"), (0, "说一说：诗人看到了什么？"), (1, f"想象“{verse}”的画面")]:
+            paragraph = body.add_paragraph()
+            paragraph.text = text
+            paragraph.level = level
+        footer = slide.shapes.add_textbox(Inches(0.3), Inches(7), Inches(4), Inches(0.4))
+        footer.text_frame.text = "阳光小学 语文组 2024"
+        page_number = slide.shapes.add_textbox(Inches(9), Inches(7), Inches(0.8), Inches(0.4))
+        page_number.text_frame.text = str(number)
+        slide.notes_slide.notes_text_frame.text = "提醒学生边读边想象画面。"
+
+    # A summary slide with a chart, grouped text boxes and a picture
+    slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+    slide.shapes.title.text = "课堂小结"
+    chart_data = CategoryChartData()
+    chart_data.categories = ["朗读", "背诵", "默写"]
+    chart_data.add_series("达标人数", (18, 15, 12))
+    chart = slide.shapes.add_chart(
+        XL_CHART_TYPE.COLUMN_CLUSTERED, Inches(0.5), Inches(1.5), Inches(5), Inches(3), chart_data
+    ).chart
+    chart.has_title = True
+    chart.chart_title.text_frame.text = "本课目标达成情况"
+    group = slide.shapes.add_group_shape()
+    for index, text in enumerate(["静：安静", "思：思念"]):
+        group.shapes.add_textbox(Inches(6), Inches(1.5 + index), Inches(3), Inches(0.8)).text_frame.text = text
+    image = io.BytesIO()
+    Image.new("RGB", (64, 64), "navy").save(image, format="PNG")
+    picture = slide.shapes.add_picture(image, Inches(6), Inches(4), Inches(1), Inches(1))
+    picture._element._nvXxPr.cNvPr.set("descr", "李白画像")
+    presentation.save(os.path.join(directory, "lesson_slides.pptx"))
+    print(f"Generated samples in {directory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directory of sample files")
+    parser.add_argument("--generate", action="store_true", help="Generate the sample files first")
+    parser.add_argument("--show", action="store_true", help="Print the compact extraction of every file")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_samples(args.directory)
+
+    files = [
+        os.path.join(args.directory, name)
+        for name in sorted(os.listdir(args.directory))
+        if os.path.splitext(name)[1].lower() in COMPACT_EXTRACTORS
+    ]
+    if not files:
+        print(f"No supported files ({', '.join(COMPACT_EXTRACTORS)}) found in {args.directory}")
+        return
+
+    from markitdown import StreamInfo
+
+    print(f"{'file':<24} {'markitdown':>11} {'compact':>9} {'saved':>7}")
+    total_markdown = total_compact = 0
+    for path in files:
+        extension = os.path.splitext(path)[1].lower()
+        markdown = get_markitdown(extension).convert(path, stream_info=StreamInfo(extension=extension)).markdown
+        compact = COMPACT_EXTRACTORS[extension](path)
+        markdown_tokens, compact_tokens = count_text_tokens(markdown), count_text_tokens(compact)
+        total_markdown += markdown_tokens
+        total_compact += compact_tokens
+        print(
+            f"{os.path.basename(path):<24} {markdown_tokens:11d} {compact_tokens:9d} "
+            f"{1 - compact_tokens / max(1, markdown_tokens):6.1%}"
+        )
+        if args.show:
+            print(f"\n{compact}\n")
+    print(f"{'total':<24} {total_markdown:11d} {total_compact:9d} {1 - total_compact / max(1, total_markdown):6.1%}")
+
+
+if __name__ == "__main__":
+    main()
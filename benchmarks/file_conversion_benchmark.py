@@ -0,0 +1,154 @@
+"""
+Benchmark of cold versus warm conversion of uploaded files.
+
+A cold conversion is what every upload paid before the converter service: a new
+process imports markitdown, creates a `MarkItDown()` with all the built-in
+converters and converts the file. A warm conversion reuses the worker's shared
+instance from `get_markitdown`, as the conversion pool does after its first file.
+
+Usage:
+    # Generate a sample file of every supported type, then benchmark them
+    python -m benchmarks.file_conversion_benchmark --generate samples
+    python -m benchmarks.file_conversion_benchmark samples
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+from agents.file_processor.converter import CONVERTER_NAMES, get_markitdown, process_file
+
+SUPPORTED_EXTENSIONS = sorted(set(CONVERTER_NAMES) | {".md", ".markdown"})
+
+# Run in a fresh interpreter, prints the import, instance and conversion times in ms
+COLD_CONVERSION_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from markitdown import MarkItDown
+imported = time.perf_counter()
+markitdown = MarkItDown()
+created = time.perf_counter()
+markitdown.convert(sys.argv[1])
+converted = time.perf_counter()
+print(json.dumps([(imported - start) * 1000, (created - imported) * 1000, (converted - created) * 1000]))
+"""
+
+# Run in a fresh interpreter, prints how long the app takes to import the converter module in ms
+APP_IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print((time.perf_counter() - start) * 1000)
+"""
+
+SAMPLE_PARAGRAPH = "床前明月光，疑是地上霜。举头望明月，低头思故乡。这首诗表达了诗人对故乡的思念之情。"
+
+
+def generate_samples(directory: str, pages: int = 20) -> None:
+    import docx
+    import pymupdf
+    from pptx import Presentation
+
+    os.makedirs(directory, exist_ok=True)
+
+    document = docx.Document()
+    for page in range(pages):
+        document.add_heading(f"第{page + 1}课 静夜思", level=1)
+        for _ in range(10):
+            document.add_paragraph(SAMPLE_PARAGRAPH)
+        table = document.add_table(rows=5, cols=3)
+        for row in table.rows:
+            for cell, text in zip(row.cells, ["学生", "成绩", "评语"]):
+                cell.text = text
+    document.save(os.path.join(directory, "sample.docx"))
+
+    presentation = Presentation()
+    for page in range(pages):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"第{page + 1}课 静夜思"
+        slide.placeholders[1].text = "\n".join([SAMPLE_PARAGRAPH] * 3)
+    presentation.save(os.path.join(directory, "sample.pptx"))
+
+    pdf = pymupdf.open()
+    for page in range(pages):
+        pdf_page = pdf.new_page()
+        pdf_page.insert_text((72, 72), f"Lesson {page + 1}\n" + "The quiet night thoughts. " * 40, fontsize=10)
+    pdf.save(os.path.join(directory, "sample.pdf"))
+
+    with open(os.path.join(directory, "sample.md"), "w", encoding="utf-8") as f:
+        for page in range(pages):
+            f.write(f"# 第{page + 1}课 静夜思\n\n" + f"{SAMPLE_PARAGRAPH}\n\n" * 10)
+    print(f"Generated samples in {directory}")
+
+
+def time_cold(path: str) -> List[float]:
+    output = subprocess.run(
+        [sys.executable, "-c", COLD_CONVERSION_SCRIPT, path], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def time_warm(path: str, runs: int) -> float:
+    # The first conversion registers the converter of the extension
+    process_file(path)
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        error, _ = process_file(path)
+        durations.append((time.perf_counter() - start) * 1000)
+        if error:
+            raise RuntimeError(error)
+    return statistics.median(durations)
+
+
+def time_app_import(module: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", APP_IMPORT_SCRIPT.format(module=module)], capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directory of sample files")
+    parser.add_argument("--generate", action="store_true", help="Generate a sample file of every supported type first")
+    parser.add_argument("--runs", type=int, default=5, help="Number of warm conversions per file")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_samples(args.directory)
+
+    files = [
+        os.path.join(args.directory, name)
+        for name in sorted(os.listdir(args.directory))
+        if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+    ]
+    if not files:
+        print(f"No supported files ({', '.join(SUPPORTED_EXTENSIONS)}) found in {args.directory}")
+        return
+
+    print("App import time")
+    print(f"{'markitdown':<36} {time_app_import('markitdown'):8.1f} ms")
+    print(f"{'agents.file_processor.converter':<36} {time_app_import('agents.file_processor.converter'):8.1f} ms\n")
+
+    start = time.perf_counter()
+    get_markitdown()
+    print(f"Worker warm-up (import and instance): {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+    print(f"{'file':<24} {'cold import':>12} {'cold init':>10} {'cold convert':>13} {'cold total':>11} {'warm':>9}")
+    for path in files:
+        import_ms, init_ms, convert_ms = time_cold(path)
+        warm_ms = time_warm(path, args.runs)
+        print(
+            f"{os.path.basename(path):<24} {import_ms:9.1f} ms {init_ms:7.1f} ms {convert_ms:10.1f} ms "
+            f"{import_ms + init_ms + convert_ms:8.1f} ms {warm_ms:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark of the HTML to markdown conversion used by the web tools.
+
+Compares the original conversion (BeautifulSoup with html.parser, a second pass over
+the links and images, then html2text) with every parser of `html_to_markdown`, and
+measures how long the event loop stalls when pages are converted on the loop versus
+in the worker pool.
+
+Usage:
+    # Save a corpus of pages, then benchmark it
+    python -m benchmarks.html_to_markdown_benchmark --save pages https://example.com/a https://example.com/b
+    python -m benchmarks.html_to_markdown_benchmark pages
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Callable, List, Tuple
+from urllib.parse import urljoin
+
+import html2text
+import httpx
+from bs4 import BeautifulSoup
+
+from agents.tools.html_to_markdown import (
+    HTML_PARSERS,
+    HtmlConversionPool,
+    html_to_markdown,
+)
+
+# Base URL used to resolve the relative URLs of saved pages
+BASE_URL = "https://example.com/page.html"
+
+
+def legacy_html_to_markdown(html: str, base_url: str) -> str:
+    """The conversion the tools used before the worker pool."""
+    soup = BeautifulSoup(html, "html.parser")
+    for script in soup(["script", "style"]):
+        script.decompose()
+    for tag in soup.find_all(["a", "img"]):
+        if tag.get("href"):
+            tag["href"] = urljoin(base_url, tag["href"])
+        if tag.get("src"):
+            tag["src"] = urljoin(base_url, tag["src"])
+    h2t = html2text.HTML2Text()
+    h2t.body_width = 0
+    return h2t.handle(str(soup)).strip()
+
+
+def load_corpus(directory: str) -> List[Tuple[str, str]]:
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".html", ".htm")):
+            with open(os.path.join(directory, name), "r", encoding="utf-8", errors="replace") as f:
+                pages.append((name, f.read()))
+    return pages
+
+
+async def save_corpus(directory: str, urls: List[str]) -> None:
+    os.makedirs(directory, exist_ok=True)
+    async with httpx.AsyncClient(follow_redirects=True, timeout=20) as client:
+        for index, url in enumerate(urls):
+            try:
+                response = await client.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                print(f"Skipping {url}: {str(e)}")
+                continue
+            path = os.path.join(directory, f"page_{index:03d}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(response.text)
+            print(f"Saved {url} to {path} ({len(response.text)} characters)")
+
+
+def time_conversion(pages: List[Tuple[str, str]], convert: Callable[[str, str], str]) -> List[float]:
+    durations = []
+    for _, html in pages:
+        start = time.process_time()
+        convert(html, BASE_URL)
+        durations.append((time.process_time() - start) * 1000)
+    return durations
+
+
+async def measure_loop_stall(pages: List[Tuple[str, str]], in_pool: bool) -> float:
+    """Convert all pages while a ticker runs on the loop, return the longest tick gap in ms."""
+    longest_gap = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal longest_gap
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            longest_gap = max(longest_gap, (now - last) * 1000)
+            last = now
+
+    pool = HtmlConversionPool()
+    if in_pool:
+        # Start the workers before measuring
+        await pool.convert("<p></p>", BASE_URL)
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    if in_pool:
+        await asyncio.gather(*(pool.convert(html, BASE_URL) for _, html in pages))
+    else:
+        for _, html in pages:
+            legacy_html_to_markdown(html, BASE_URL)
+            await asyncio.sleep(0)
+    done = True
+    await ticker_task
+    pool.shutdown()
+    return longest_gap
+
+
+def report(label: str, durations: List[float]) -> None:
+    p95 = sorted(durations)[max(0, int(len(durations) * 0.95) - 1)]
+    print(f"{label:<22} mean {statistics.mean(durations):8.1f} ms   p95 {p95:8.1f} ms   total {sum(durations):9.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directory of saved .html pages")
+    parser.add_argument("--save", nargs="+", metavar="URL", help="Download these pages into the directory first")
+    args = parser.parse_args()
+
+    if args.save:
+        await save_corpus(args.directory, args.save)
+
+    pages = load_corpus(args.directory)
+    if not pages:
+        print(f"No .html pages found in {args.directory}")
+        return
+    print(f"{len(pages)} pages, {sum(len(html) for _, html in pages)} characters\n")
+
+    print("CPU time per page")
+    report("legacy", time_conversion(pages, legacy_html_to_markdown))
+    for html_parser in HTML_PARSERS:
+        report(html_parser, time_conversion(pages, lambda html, url: html_to_markdown(html, url, parser=html_parser)))
+
+    print("\nLongest event loop stall")
+    print(f"{'on the event loop':<22} {await measure_loop_stall(pages, in_pool=False):8.1f} ms")
+    print(f"{'in the worker pool':<22} {await measure_loop_stall(pages, in_pool=True):8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,20 @@
+"""
+Bing Search API key pool.
+
+This module provides a pool of Bing Search API keys that spreads searches across the
+keys, paces each key to its rate limit and rotates away from throttled keys.
+"""
+
+from .bingSearchKeyPool import (
+    BingSearchKeyPool,
+    SearchKeyConfig,
+    bing_key_pool,
+    initialize_bing_key_pool_from_env,
+)
+
+__all__ = [
+    "BingSearchKeyPool",
+    "SearchKeyConfig",
+    "bing_key_pool",
+    "initialize_bing_key_pool_from_env",
+]
\ No newline at end of file
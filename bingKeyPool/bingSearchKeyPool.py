@@ -0,0 +1,268 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger("bing_search_key_pool")
+
+DEFAULT_RATE_LIMIT_PER_SECOND = 3.0
+DEFAULT_MAX_WAIT = 30.0
+# Backoff of a throttled key that did not send Retry-After, doubled on every consecutive 429
+INITIAL_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+# A 403 means the key's quota is used up or the key is not allowed, it is retried much later
+FORBIDDEN_COOLDOWN = 60 * 60
+# A 401 means the key is invalid, it is effectively removed from the rotation
+UNAUTHORIZED_COOLDOWN = 24 * 60 * 60
+
+# Callback sending one search request with the given API key
+SendWithKey = Callable[[str], Awaitable[httpx.Response]]
+
+
+class SearchKeyConfig(BaseModel):
+    """Configuration model for a Bing Search API key"""
+    api_key: str = Field(..., description="Bing Search API key")
+    rate_limit_per_second: float = Field(DEFAULT_RATE_LIMIT_PER_SECOND, description="Maximum requests per second of the key's pricing tier")
+
+
+class _KeyState:
+    """Rate limiting, backoff and usage counters of a single key."""
+
+    def __init__(self, config: SearchKeyConfig):
+        self.config = config
+        self.interval = 1.0 / config.rate_limit_per_second if config.rate_limit_per_second > 0 else 0.0
+        self.next_request_at = 0.0
+        self.cooldown_until = 0.0
+        self.backoff = INITIAL_BACKOFF
+        self.requests = 0
+        self.throttled = 0
+        self.forbidden = 0
+        self.unauthorized = 0
+        self.errors = 0
+
+    @property
+    def name(self) -> str:
+        # Never log or report the full key
+        return f"...{self.config.api_key[-4:]}"
+
+    def ready_at(self) -> float:
+        return max(self.next_request_at, self.cooldown_until)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header, given in seconds or as an HTTP date, into seconds to wait."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class BingSearchKeyPool:
+    """
+    Manages multiple Bing Search API keys and spreads the searches across them.
+
+    Every key is paced to its own requests-per-second limit, and the next search uses
+    the key that is available first, rotating between keys that are equally available.
+    A key that answers 429 is benched for its `Retry-After` (or an exponential backoff)
+    and the search is retried immediately with another key; a key that answers 403 is
+    benched for an hour and one that answers 401 for a day. Searches only fail once no
+    key becomes available within `max_wait` seconds.
+    """
+
+    def __init__(self, max_wait: float = DEFAULT_MAX_WAIT):
+        self._keys: List[_KeyState] = []
+        self._current_index = 0
+        self._lock = asyncio.Lock()
+        self._max_wait = max_wait
+        self._initialized = False
+
+    def initialize(self, key_configs: List[SearchKeyConfig], max_wait: Optional[float] = None):
+        """
+        Initialize the pool with the given keys, replacing any previous keys.
+
+        Args:
+            key_configs: The keys and their rate limits
+            max_wait: Maximum number of seconds a search waits for an available key
+        """
+        if not key_configs:
+            raise ValueError("No Bing Search API keys provided")
+        self._keys = [_KeyState(config) for config in key_configs]
+        self._current_index = 0
+        if max_wait is not None:
+            self._max_wait = max_wait
+        self._initialized = True
+        logger.info(f"Initialized BingSearchKeyPool with {len(self._keys)} keys")
+
+    @property
+    def key_count(self) -> int:
+        """Return the number of keys in the pool."""
+        return len(self._keys)
+
+    @property
+    def initialized(self) -> bool:
+        """Return whether the pool has been initialized."""
+        return self._initialized
+
+    async def _acquire(self, deadline: float) -> Optional[_KeyState]:
+        """Reserve the next request slot of the first available key, or None if none is available in time."""
+        async with self._lock:
+            candidates = [
+                self._keys[(self._current_index + offset) % len(self._keys)] for offset in range(len(self._keys))
+            ]
+            # min() keeps the rotation order among keys that are ready at the same time
+            now = time.monotonic()
+            key = min(candidates, key=lambda state: max(now, state.ready_at()))
+            start_at = max(now, key.ready_at())
+            if start_at > deadline:
+                return None
+            key.next_request_at = start_at + key.interval
+            self._current_index = (self._keys.index(key) + 1) % len(self._keys)
+
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+        return key
+
+    def _record(self, key: _KeyState, response: httpx.Response) -> None:
+        key.requests += 1
+        now = time.monotonic()
+        if response.status_code == 429:
+            key.throttled += 1
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            wait = retry_after if retry_after is not None else key.backoff
+            key.backoff = min(MAX_BACKOFF, key.backoff * 2)
+            key.cooldown_until = now + wait
+            logger.warning(f"Bing Search key {key.name} throttled, retrying other keys for {wait:.1f}s")
+        elif response.status_code == 403:
+            key.forbidden += 1
+            key.cooldown_until = now + FORBIDDEN_COOLDOWN
+            logger.warning(f"Bing Search key {key.name} forbidden (quota exhausted?), benched for {FORBIDDEN_COOLDOWN}s")
+        elif response.status_code == 401:
+            key.unauthorized += 1
+            key.cooldown_until = now + UNAUTHORIZED_COOLDOWN
+            logger.warning(f"Bing Search key {key.name} rejected as invalid, benched for {UNAUTHORIZED_COOLDOWN}s")
+        else:
+            key.backoff = INITIAL_BACKOFF
+
+    async def send(self, send_with_key: SendWithKey) -> httpx.Response:
+        """
+        Send a search request, rotating to another key when a key is throttled or refused.
+
+        Args:
+            send_with_key: Coroutine function sending the request with the given API key
+
+        Returns:
+            httpx.Response: The first response that is not a 401, 403 or 429, or the
+                last refused response if no key became available within `max_wait`
+
+        Raises:
+            ValueError: If the pool has not been initialized
+        """
+        if not self._initialized:
+            raise ValueError("BingSearchKeyPool not initialized")
+
+        deadline = time.monotonic() + self._max_wait
+        response: Optional[httpx.Response] = None
+        while True:
+            key = await self._acquire(deadline)
+            if key is None:
+                if response is None:
+                    raise ValueError("No Bing Search API key is available. Please try again later.")
+                return response
+            try:
+                response = await send_with_key(key.config.api_key)
+            except httpx.HTTPError:
+                key.errors += 1
+                raise
+            self._record(key, response)
+            if response.status_code not in (401, 403, 429):
+                return response
+
+    def usage(self) -> Dict[str, Dict[str, float]]:
+        """Return the usage counters and state of every key, by masked key."""
+        now = time.monotonic()
+        return {
+            key.name: {
+                "requests": key.requests,
+                "throttled": key.throttled,
+                "forbidden": key.forbidden,
+                "unauthorized": key.unauthorized,
+                "errors": key.errors,
+                "cooldown": round(max(0.0, key.cooldown_until - now), 1),
+            }
+            for key in self._keys
+        }
+
+
+# Create a singleton instance of the key pool
+bing_key_pool = BingSearchKeyPool()
+
+
+def initialize_bing_key_pool_from_env(
+    keys_env_var: str = "BING_SEARCH_KEYS",
+    single_key_env_var: str = "BING_SEARCH_KEY",
+    max_wait_env_var: str = "BING_SEARCH_KEY_MAX_WAIT",
+) -> BingSearchKeyPool:
+    """
+    Initialize the key pool from environment variables.
+
+    `BING_SEARCH_KEYS` holds a JSON array whose items are either a key string or an
+    object with "BING_SEARCH_KEY" and an optional "RATE_LIMIT_PER_SECOND". When it is
+    not set, the single `BING_SEARCH_KEY` is used.
+
+    Args:
+        keys_env_var: Environment variable containing the JSON array of keys
+        single_key_env_var: Environment variable containing a single key
+        max_wait_env_var: Environment variable containing the maximum wait for a key in seconds
+
+    Returns:
+        The initialized key pool
+    """
+    key_configs: List[SearchKeyConfig] = []
+    keys_str = os.environ.get(keys_env_var, "").strip()
+    if keys_str:
+        try:
+            keys_data = json.loads(keys_str)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in {keys_env_var}: {str(e)}")
+        if not isinstance(keys_data, list):
+            raise ValueError(f"{keys_env_var} must contain a JSON array")
+
+        for idx, key_data in enumerate(keys_data):
+            try:
+                if isinstance(key_data, str):
+                    key_configs.append(SearchKeyConfig(api_key=key_data))
+                else:
+                    key_configs.append(
+                        SearchKeyConfig(
+                            api_key=key_data["BING_SEARCH_KEY"],
+                            rate_limit_per_second=key_data.get("RATE_LIMIT_PER_SECOND", DEFAULT_RATE_LIMIT_PER_SECOND),
+                        )
+                    )
+            except Exception as e:
+                logger.warning(f"Error parsing Bing Search key config {idx}: {str(e)}")
+    else:
+        api_key = os.environ.get(single_key_env_var, "").strip()
+        if api_key:
+            key_configs.append(SearchKeyConfig(api_key=api_key))
+
+    if not key_configs:
+        raise ValueError(
+            f"{single_key_env_var} environment variable is not set. "
+            "Please obtain an API key from Azure Portal."
+        )
+
+    max_wait = os.environ.get(max_wait_env_var)
+    bing_key_pool.initialize(key_configs, max_wait=float(max_wait) if max_wait else None)
+    return bing_key_pool
@@ -0,0 +1,16 @@
+"""
+Team run checkpoints.
+
+This module provides a local store for team state saved after each agent turn, so that
+interrupted runs can be resumed from the last completed turn instead of starting over.
+"""
+
+from .teamCheckpointStore import (
+    TeamCheckpointStore,
+    team_checkpoint_store,
+)
+
+__all__ = [
+    "TeamCheckpointStore",
+    "team_checkpoint_store",
+]
\ No newline at end of file
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Mapping, Optional
+
+logger = logging.getLogger("team_checkpoint_store")
+
+DEFAULT_CHECKPOINT_DIR = ".checkpoints"
+DEFAULT_CHECKPOINT_TTL = 24 * 60 * 60
+
+
+class TeamCheckpointStore:
+    """
+    Local file store for in-progress team run checkpoints.
+
+    Each checkpoint is a JSON document holding the team state from `save_state()`
+    together with the task that started the run, so that a retried request or a
+    reconnecting session can `load_state()` and continue from the last completed turn.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CHECKPOINT_DIR, ttl_seconds: int = DEFAULT_CHECKPOINT_TTL):
+        self._directory = directory
+        self._ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def make_key(team_name: str, owner: str, task: str) -> str:
+        """
+        Build the checkpoint key of a run.
+
+        Args:
+            team_name: Name of the agent team running the task
+            owner: Identifier of the user or chat thread that owns the run
+            task: The task content that started the run
+
+        Returns:
+            str: A stable key for the run
+        """
+        digest = hashlib.sha256()
+        for part in (team_name, owner, task):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.json")
+
+    def _is_expired(self, checkpoint: Mapping[str, Any]) -> bool:
+        return time.time() - checkpoint.get("updated_at", 0) > self._ttl_seconds
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Discarding unreadable checkpoint {path}: {str(e)}")
+            self._remove(path)
+            return None
+
+        if self._is_expired(checkpoint):
+            self._remove(path)
+            return None
+        return checkpoint
+
+    def _write(self, key: str, checkpoint: Mapping[str, Any]) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        # Atomic replace so a crash mid-write never leaves a truncated checkpoint
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _thread_index_path(self, thread_id: str) -> str:
+        digest = hashlib.sha256(thread_id.encode("utf-8")).hexdigest()
+        return os.path.join(self._directory, "threads", f"{digest}.key")
+
+    def _write_thread_index(self, thread_id: str, key: str) -> None:
+        path = self._thread_index_path(thread_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(key)
+        os.replace(temp_path, path)
+
+    def _find_latest(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        # The thread index points to the checkpoint saved last in the thread, so a lookup
+        # reads one small file and one checkpoint instead of every checkpoint of every user
+        index_path = self._thread_index_path(thread_id)
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                key = f.read().strip()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Discarding unreadable checkpoint index {index_path}: {str(e)}")
+            self._remove(index_path)
+            return None
+
+        checkpoint = self._read(self._path(key))
+        if checkpoint is None or checkpoint.get("thread_id") != thread_id:
+            # Completed, expired or deleted since
+            self._remove(index_path)
+            return None
+        return checkpoint
+
+    def _save(self, key: str, checkpoint: Mapping[str, Any]) -> None:
+        self._write(key, checkpoint)
+        if checkpoint.get("thread_id"):
+            self._write_thread_index(checkpoint["thread_id"], key)
+
+    async def save(self, key: str, state: Mapping[str, Any], **metadata: Any) -> None:
+        """
+        Save the team state of a run.
+
+        Args:
+            key: The checkpoint key from make_key()
+            state: The team state returned by `save_state()`
+            **metadata: Additional fields stored with the checkpoint (team name, task, turns...);
+                a `thread_id` makes the checkpoint the one find_latest() returns for that thread
+        """
+        checkpoint = {**metadata, "key": key, "state": state, "updated_at": time.time()}
+        await asyncio.to_thread(self._save, key, checkpoint)
+
+    async def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Load the checkpoint of a run, or None if there is no unexpired checkpoint."""
+        return await asyncio.to_thread(self._read, self._path(key))
+
+    async def find_latest(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Return the checkpoint saved last in a chat thread, or None if that run has completed."""
+        return await asyncio.to_thread(self._find_latest, thread_id)
+
+    async def delete(self, key: str) -> None:
+        """Delete the checkpoint of a run once it has completed."""
+        await asyncio.to_thread(self._remove, self._path(key))
+
+
+# Create a singleton instance of the checkpoint store
+team_checkpoint_store = TeamCheckpointStore(
+    directory=os.environ.get("TEAM_CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR),
+    ttl_seconds=int(os.environ.get("TEAM_CHECKPOINT_TTL", DEFAULT_CHECKPOINT_TTL)),
+)
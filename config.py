@@ -12,6 +12,7 @@ from roundRobin import (
     AzureOpenAIRoundRobinClient,
     initialize_client_manager_from_env,
 )
+from scheduler import initialize_team_run_scheduler_from_env
 
 load_dotenv()
 
@@ -21,6 +22,20 @@ CATCH_UP_AND_EXPLORE_BY_AI_AGENT = "Catch-up And Explore Agent Team"
 
 CURRENT_AGENT_TEAM_NAME = "Current Agent Team Name"
 
+CURRENT_CANCELLATION_TOKEN = "Current Cancellation Token"
+
+CURRENT_CHECKPOINT_KEY = "Current Checkpoint Key"
+
+# Set when the user stops the current run, whose checkpoint is then dropped instead of resumed
+CURRENT_RUN_STOPPED = "Current Run Stopped"
+
+# Scheduler tier of each agent team. Both teams drive the advanced deployment for
+# content creation and review, so they share its concurrency budget.
+TEAM_RUN_TIERS = {
+    OPEN_TOPIC_CLASS_GENERATION_AGENT: "advance",
+    CATCH_UP_AND_EXPLORE_BY_AI_AGENT: "advance",
+}
+
 AZURE_OPENAI_API_KEY = os.environ.get("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = os.environ.get("AZURE_OPENAI_ENDPOINT")
 
@@ -61,6 +76,12 @@ if USE_ROUND_ROBIN:
         print("Falling back to standard Azure OpenAI client")
         USE_ROUND_ROBIN = False
 
+# Write the sections of open topic lessons in parallel instead of in one conversation
+USE_PARALLEL_SECTION_GENERATION = os.environ.get("USE_PARALLEL_SECTION_GENERATION", "false").lower() == "true"
+
+# Configure the team run concurrency limits (TEAM_RUN_TIER_LIMITS / TEAM_RUN_DEFAULT_LIMIT)
+initialize_team_run_scheduler_from_env()
+
 
 def get_model_client(**kwargs: AzureOpenAIClientConfigurationConfigModel):
     if USE_ROUND_ROBIN:
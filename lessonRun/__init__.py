@@ -0,0 +1,23 @@
+"""
+Lesson run helpers.
+
+This module provides what the Chainlit app and the HTTP API share around a team run:
+cancellation of the team stream, the markdown and PDF artifacts of the generated lesson,
+and the start and shutdown of the process-wide pools.
+"""
+
+from .lessonRunHelpers import (
+    cancellable_stream,
+    close_shared_resources,
+    md_to_pdf,
+    save_lesson_artifacts,
+    start_shared_resources,
+)
+
+__all__ = [
+    "cancellable_stream",
+    "close_shared_resources",
+    "md_to_pdf",
+    "save_lesson_artifacts",
+    "start_shared_resources",
+]
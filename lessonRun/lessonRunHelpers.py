@@ -0,0 +1,219 @@
+import asyncio
+import os
+import traceback
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from autogen_core import CancellationToken
+
+from agents.file_processor.converter import file_conversion_pool
+from agents.tools.html_to_markdown import html_conversion_pool
+from agents.tools.http_client import http_client_pool
+from agents.tools.image_mirror import image_mirror
+from agents.tools.local_search import USE_LOCAL_SEARCH, local_search_index
+
+
+async def cancellable_stream(stream, cancellation_token: CancellationToken):
+    """Iterate a team stream, cancelling the team run as soon as the consumer is cancelled.
+
+    The team's own cleanup waits for every in-flight agent turn to finish, so the
+    cancellation token has to be cancelled before the stream is unwound. Otherwise
+    LLM requests and tool calls keep running for a consumer that is already gone.
+    """
+    while True:
+        next_message = asyncio.ensure_future(anext(stream))
+        try:
+            msg = await asyncio.shield(next_message)
+        except StopAsyncIteration:
+            return
+        except asyncio.CancelledError:
+            cancellation_token.cancel()
+            try:
+                # Let the team abort its in-flight model and tool calls
+                await next_message
+            except BaseException:
+                pass
+            raise
+        yield msg
+
+
+async def start_shared_resources():
+    """Start the resources shared by every team run of the process.
+
+    Starts the file conversion workers in the background, so the first uploads do not
+    wait for MarkItDown to load, and adds the curated teaching materials (poems, poet
+    biographies, idiom stories...) to the local search index.
+    """
+    file_conversion_pool.prewarm()
+
+    corpus_dir = os.environ.get("LOCAL_SEARCH_CORPUS_DIR", "corpus")
+    if USE_LOCAL_SEARCH and os.path.isdir(corpus_dir):
+        await asyncio.to_thread(local_search_index.index_corpus, corpus_dir)
+
+
+async def close_shared_resources():
+    """Close the HTTP connection pools and stop the HTML conversion, thumbnail and file conversion pools."""
+    await http_client_pool.aclose()
+    html_conversion_pool.shutdown()
+    image_mirror.shutdown()
+    file_conversion_pool.shutdown()
+
+
+def _artifact_stem(run_id: Optional[str]) -> str:
+    # The run ID keeps runs finishing in the same second from overwriting each other's files
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    return f"course_materials_{timestamp}_{run_id or uuid.uuid4().hex}"
+
+
+def save_lesson_artifacts(content: str, run_id: Optional[str] = None) -> Tuple[str, str]:
+    """Save a generated lesson as markdown and PDF under the public directory.
+
+    Args:
+        content: The markdown of the lesson
+        run_id: The ID of the run, part of the file names; a random one if None
+
+    Returns:
+        Tuple[str, str]: The paths of the markdown and PDF files, relative to the working directory
+    """
+    # Clean up content before saving
+    if "TERMINATE" in content:
+        content = content.split("TERMINATE")[0].strip()
+
+    # Create unique names for the files of this run
+    stem = _artifact_stem(run_id)
+
+    # Save markdown to public/md directory
+    os.makedirs("public/md", exist_ok=True)
+    md_filename = f"public/md/{stem}.md"
+    with open(md_filename, "w", encoding="utf-8") as md_file:
+        md_file.write(content)
+
+    # Generate PDF
+    pdf_file = md_to_pdf(content, stem=stem)
+    return md_filename, pdf_file
+
+
+def md_to_pdf(md: str, stem: Optional[str] = None) -> str:
+    import base64
+    import os  # Import os at the beginning of the function
+    import re
+    import urllib.request
+    from io import BytesIO
+
+    os.makedirs("public/pdfs", exist_ok=True)
+    os.makedirs("public/fonts", exist_ok=True)
+
+    stem = stem or _artifact_stem(None)
+
+    filename = f"public/pdfs/{stem}.pdf"
+
+    # Clean up the content
+    content = md
+    
+    # Ensure we have content
+    if not content:
+        content = "# 无内容 \n\n请检查生成过程，内容生成失败。"
+
+    # Add a title if there isn't one
+    if not content.startswith('# '):
+        content = f"# 中国小学语文教学内容\n\n{content}"
+    
+    # Download a Chinese font if we don't have one already
+    chinese_font_path = "public/fonts/NotoSansSC-Regular.ttf"
+    if not os.path.exists(chinese_font_path):
+        try:
+            print("Downloading Chinese font...")
+            # Fix: Updated URL to direct download link instead of GitHub blob page
+            font_url = "https://github.com/jsntn/webfonts/raw/master/NotoSansSC-Regular.ttf"
+            urllib.request.urlretrieve(font_url, chinese_font_path)
+            print(f"Downloaded font to {chinese_font_path}")
+        except Exception as font_error:
+            print(f"Error downloading font: {str(font_error)}")
+            # Create a fallback font
+            chinese_font_path = None
+    
+    # Create PDF with reportlab
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+
+        # Try to register the Chinese font
+        has_chinese_font = False
+        if chinese_font_path and os.path.exists(chinese_font_path):
+            try:
+                pdfmetrics.registerFont(TTFont("NotoSansSC", chinese_font_path))
+                has_chinese_font = True
+            except Exception as font_register_error:
+                print(f"Error registering font: {str(font_register_error)}")
+        
+        # Create a basic PDF with title
+        c = canvas.Canvas(filename, pagesize=A4)
+        width, height = A4
+        
+        # Draw a title - use Chinese font if available
+        font_name = "NotoSansSC" if has_chinese_font else "Helvetica-Bold"
+        c.setFont(font_name, 16)
+        c.drawString(50, height - 50, "中国小学语文教学内容")
+        
+        # Draw content
+        font_name = "NotoSansSC" if has_chinese_font else "Helvetica"
+        c.setFont(font_name, 10)
+        y_position = height - 80
+        line_height = 14
+        
+        # Simplify content to plain text - use 'content' instead of undefined 'plain_text'
+        plain_text = content  # Initialize plain_text with content
+        plain_text = re.sub(r'#+ (.*)', r'\1', plain_text)  # Headers to plain text
+        plain_text = re.sub(r'\*\*(.*?)\*\*', r'\1', plain_text)  # Remove bold
+        plain_text = re.sub(r'\*(.*?)\*', r'\1', plain_text)  # Remove italics
+        
+        # Add text by lines
+        for line in plain_text.split('\n'):
+            if not line.strip():
+                y_position -= line_height * 0.5
+                continue
+            
+            # Check if we need a new page
+            if y_position < 50:
+                c.showPage()
+                c.setFont(font_name, 10)
+                y_position = height - 50
+            
+            # Simple word wrap with better handling for Chinese text
+            if len(line) * 5 > width - 100:  # Rough estimate of line width
+                # For Chinese text, we need shorter chunks
+                chunk_size = 40 if has_chinese_font else 80
+                chunks = [line[i:i+chunk_size] for i in range(0, len(line), chunk_size)]
+                for chunk in chunks:
+                    c.drawString(50, y_position, chunk)
+                    y_position -= line_height
+            else:
+                c.drawString(50, y_position, line)
+                y_position -= line_height
+        
+        c.save()
+        print(f"Successfully created PDF with reportlab: {filename}")
+        
+        # If we couldn't display Chinese characters, add a note to the markdown file
+        if not has_chinese_font:
+            md_note_filename = f"public/md/{stem}_no_chinese_font.md"
+            with open(md_note_filename, "w", encoding="utf-8") as f:
+                f.write(content)
+            print(f"Created fallback markdown file with full content: {md_note_filename}")
+        
+        return filename
+        
+    except Exception as reportlab_error:
+        print(f"ReportLab failed: {str(reportlab_error)}")
+        print(traceback.format_exc())
+        
+        # Last resort: PDF-named text file
+        print("PDF generation failed, creating a text file with .pdf extension")
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write("# 中国小学语文教学内容\n\n")
+            f.write(content)
+        print(f"Created text file with PDF extension: {filename}")
+        return filename
@@ -0,0 +1,18 @@
+"""
+Team run scheduler.
+
+This module provides process-wide admission control for team runs. It caps the number
+of concurrent runs per tier and queues the rest fairly across users and sessions.
+"""
+
+from .teamRunScheduler import (
+    TeamRunScheduler,
+    initialize_team_run_scheduler_from_env,
+    team_run_scheduler,
+)
+
+__all__ = [
+    "TeamRunScheduler",
+    "initialize_team_run_scheduler_from_env",
+    "team_run_scheduler",
+]
\ No newline at end of file
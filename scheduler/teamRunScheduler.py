@@ -0,0 +1,290 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from autogen_core import CancellationToken
+
+logger = logging.getLogger("team_run_scheduler")
+
+# Callback invoked while a run is waiting for a slot: (queue position, eta in seconds)
+QueueUpdateCallback = Callable[[int, int], Awaitable[None]]
+
+DEFAULT_TIER_LIMIT = 4
+DEFAULT_RUN_DURATION = 180.0
+
+
+class _Waiter:
+    """A queued team run waiting for a slot in its tier."""
+
+    def __init__(self, user_id: str, session_id: str):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+
+
+class _TierState:
+    """
+    Concurrency accounting and the fair wait queue for a single tier.
+
+    Waiters are grouped by user, then by session. Slots are handed out round-robin
+    across users, and round-robin across the sessions of each user, so one teacher
+    opening many tabs cannot starve everybody else.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiting: "OrderedDict[str, OrderedDict[str, Deque[_Waiter]]]" = OrderedDict()
+        self.avg_duration = DEFAULT_RUN_DURATION
+        self.completed_runs = 0
+
+    def has_waiters(self) -> bool:
+        return bool(self.waiting)
+
+    def enqueue(self, waiter: _Waiter) -> None:
+        sessions = self.waiting.setdefault(waiter.user_id, OrderedDict())
+        sessions.setdefault(waiter.session_id, deque()).append(waiter)
+
+    def remove(self, waiter: _Waiter) -> None:
+        sessions = self.waiting.get(waiter.user_id)
+        if sessions is None:
+            return
+        queue = sessions.get(waiter.session_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        if not queue:
+            del sessions[waiter.session_id]
+        if not sessions:
+            del self.waiting[waiter.user_id]
+
+    def pop_next(self) -> Optional[_Waiter]:
+        """Pop the next waiter in round-robin order, rotating the user and session."""
+        while self.waiting:
+            user_id, sessions = next(iter(self.waiting.items()))
+            session_id, queue = next(iter(sessions.items()))
+            waiter = queue.popleft()
+
+            # Rotate the session and the user to the back of their queues
+            del sessions[session_id]
+            if queue:
+                sessions[session_id] = queue
+            del self.waiting[user_id]
+            if sessions:
+                self.waiting[user_id] = sessions
+
+            if not waiter.future.done():
+                return waiter
+        return None
+
+    def ordered_waiters(self) -> List[_Waiter]:
+        """Return the waiters in the order pop_next() would serve them."""
+        ring = deque(
+            deque(deque(queue) for queue in sessions.values())
+            for sessions in self.waiting.values()
+        )
+        order: List[_Waiter] = []
+        while ring:
+            sessions = ring.popleft()
+            queue = sessions.popleft()
+            order.append(queue.popleft())
+            if queue:
+                sessions.append(queue)
+            if sessions:
+                ring.append(sessions)
+        return order
+
+    def record_duration(self, duration: float) -> None:
+        # Exponential moving average keeps the ETA responsive to recent load
+        self.completed_runs += 1
+        if self.completed_runs == 1:
+            self.avg_duration = duration
+        else:
+            self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+
+
+class TeamRunScheduler:
+    """
+    Process-wide admission control for team runs.
+
+    Each tier has a cap on the number of concurrently running teams. Runs beyond the
+    cap wait in a queue that is served fairly across users and sessions, so a burst
+    of requests degrades into waiting instead of exhausting the LLM quota.
+    """
+
+    def __init__(
+        self,
+        tier_limits: Optional[Dict[str, int]] = None,
+        default_limit: int = DEFAULT_TIER_LIMIT,
+        update_interval: float = 1.0,
+    ):
+        self._tier_limits: Dict[str, int] = dict(tier_limits or {})
+        self._default_limit = default_limit
+        self._update_interval = update_interval
+        self._tiers: Dict[str, _TierState] = {}
+
+    def configure(self, tier_limits: Dict[str, int], default_limit: Optional[int] = None) -> None:
+        """
+        Update the per-tier concurrency limits.
+
+        Args:
+            tier_limits: Mapping of tier name to the maximum number of concurrent runs
+            default_limit: Limit for tiers that are not listed in tier_limits
+        """
+        self._tier_limits.update(tier_limits)
+        if default_limit is not None:
+            self._default_limit = default_limit
+        for tier, state in self._tiers.items():
+            state.limit = self._limit_for(tier)
+            self._dispatch(state)
+
+    def _limit_for(self, tier: str) -> int:
+        return max(1, self._tier_limits.get(tier, self._default_limit))
+
+    def _tier(self, tier: str) -> _TierState:
+        state = self._tiers.get(tier)
+        if state is None:
+            state = _TierState(self._limit_for(tier))
+            self._tiers[tier] = state
+        return state
+
+    def _dispatch(self, state: _TierState) -> None:
+        """Hand free slots to the next waiters."""
+        while state.active < state.limit:
+            waiter = state.pop_next()
+            if waiter is None:
+                return
+            state.active += 1
+            waiter.future.set_result(None)
+
+    def _release(self, state: _TierState) -> None:
+        state.active -= 1
+        self._dispatch(state)
+
+    def _queue_status(self, state: _TierState, waiter: _Waiter) -> Tuple[int, int]:
+        try:
+            position = state.ordered_waiters().index(waiter) + 1
+        except ValueError:
+            position = 1
+        eta = math.ceil(position / state.limit) * state.avg_duration
+        return position, int(eta)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return the current load of every tier."""
+        return {
+            tier: {
+                "limit": state.limit,
+                "active": state.active,
+                "waiting": len(state.ordered_waiters()),
+                "avg_duration": round(state.avg_duration, 1),
+            }
+            for tier, state in self._tiers.items()
+        }
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        tier: str,
+        user_id: str,
+        session_id: str,
+        on_queue_update: Optional[QueueUpdateCallback] = None,
+        cancellation_token: Optional[CancellationToken] = None,
+    ):
+        """
+        Acquire a run slot in the given tier, waiting in the fair queue if necessary.
+
+        Args:
+            tier: The tier whose concurrency limit applies to this run
+            user_id: Identifier of the user that owns the run
+            session_id: Identifier of the session that owns the run
+            on_queue_update: Optional coroutine called periodically with the queue position and ETA
+            cancellation_token: Optional token that aborts the wait when cancelled
+
+        Raises:
+            asyncio.CancelledError: If the wait is cancelled before a slot is granted
+        """
+        state = self._tier(tier)
+
+        if state.active < state.limit and not state.has_waiters():
+            state.active += 1
+        else:
+            waiter = _Waiter(user_id, session_id)
+            state.enqueue(waiter)
+            if cancellation_token is not None:
+                cancellation_token.link_future(waiter.future)
+            logger.info(f"Queued team run for user {user_id} in tier {tier}")
+            try:
+                while not waiter.future.done():
+                    if on_queue_update is not None:
+                        position, eta = self._queue_status(state, waiter)
+                        try:
+                            await on_queue_update(position, eta)
+                        except Exception as e:
+                            logger.warning(f"Error reporting queue position: {str(e)}")
+                    await asyncio.wait({waiter.future}, timeout=self._update_interval)
+                waiter.future.result()
+            except BaseException:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # The slot was granted just before the wait was aborted
+                    self._release(state)
+                else:
+                    waiter.future.cancel()
+                    state.remove(waiter)
+                raise
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            state.record_duration(time.monotonic() - start)
+            self._release(state)
+
+
+# Create a singleton instance of the scheduler
+team_run_scheduler = TeamRunScheduler()
+
+
+def initialize_team_run_scheduler_from_env(
+    limits_env_var: str = "TEAM_RUN_TIER_LIMITS",
+    default_limit_env_var: str = "TEAM_RUN_DEFAULT_LIMIT",
+) -> TeamRunScheduler:
+    """
+    Configure the scheduler from environment variables.
+
+    Args:
+        limits_env_var: Environment variable containing a JSON object of tier name to limit
+        default_limit_env_var: Environment variable containing the limit for unlisted tiers
+
+    Returns:
+        The configured scheduler
+    """
+    tier_limits: Dict[str, int] = {}
+    limits_str = os.environ.get(limits_env_var)
+    if limits_str:
+        try:
+            limits_data = json.loads(limits_str)
+            if not isinstance(limits_data, dict):
+                raise ValueError(f"{limits_env_var} must contain a JSON object")
+            tier_limits = {str(k): int(v) for k, v in limits_data.items()}
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Invalid {limits_env_var}, using defaults: {str(e)}")
+
+    default_limit = None
+    default_str = os.environ.get(default_limit_env_var)
+    if default_str:
+        try:
+            default_limit = int(default_str)
+        except ValueError:
+            logger.warning(f"Invalid {default_limit_env_var}: {default_str}")
+
+    team_run_scheduler.configure(tier_limits, default_limit)
+    return team_run_scheduler